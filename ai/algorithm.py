@@ -1,24 +1,136 @@
 from quoridor.constants import *
+from quoridor.instrumentation import STATS
+from quoridor.geometry import geometry
+from quoridor.history import pawn_move, wall_move, move_code, code_move, mirror_code, NO_MOVE
+from ai.transposition import canonical_hash, EXACT, LOWER, UPPER
 import random
+import time
+
+
+class SearchCancelled(Exception):  # raised inside the search when it is stopped from another thread
+    pass
+
+
+class Deadline:
+    """
+    Time limit that can be passed to the search as its stop event
+    """
+    def __init__(self, seconds):
+        self.end = time.perf_counter() + seconds
+
+    def is_set(self):
+        return time.perf_counter() >= self.end
+
+
+def legal_moves(game):
+    """
+    :param game: Game
+    :return: List of all legal moves (quoridor.history.Move) of the player whose turn it is
+    """
+    x = game.turn == BLACK
+    pos = game.board.pieces[x].pos
+    moves = [pawn_move(x, pos, end) for end in sorted(game.board.pawn_moves(pos))]
+    if game.walls_remaining[x]:
+        moves += [wall_move(x, wall) for wall in game.board.free_slots() if game.board.can_place(wall)]
+    return moves
+
+
+def search_moves(game):
+    """
+    :param game: Game
+    :return: List of the moves (quoridor.history.Move) minimax tries: the pawn moves, then the legal walls (vertical
+    walls only after the 10th turn), without the mirror twins if the position is symmetric
+    """
+    x = game.turn == BLACK
+    pos = game.board.pieces[x].pos
+    moves = [pawn_move(x, pos, end) for end in game.board.pawn_moves(pos)]
+    if game.walls_remaining[x]:
+        moves += [wall_move(x, wall) for wall in game.board.free_slots()
+                  if (wall[1] == 0 or game.turns > 10) and game.board.can_place(wall)]
+    if game.board.symmetric():
+        moves = [move for move in moves if not mirror_twin(game, move)]
+    return moves
+
+
+def mirror_twin(game, move):
+    """
+    In a position that is its own mirror image (Board.symmetric) a move and its mirror image lead to mirror images of
+    the same position, which have the same value, so only one of them has to be searched
+
+    :param game: Game in a symmetric position
+    :param move: Move
+    :return: True if move is the mirror image of another move that is searched instead (pawn moves to the right half of
+    the board, walls whose mirror image has a lower slot)
+    """
+    if move.wall is None:
+        return move.end[0] * 2 > game.rows - 1
+    geo = game.board.geometry
+    return geo.mirror_slots[geo.slot_index[move.wall]] < geo.slot_index[move.wall]
+
+
+def table_code(code, rows, mirrored):
+    """
+    :return: Move code turned from the orientation of the position to the one of its transposition table entry or back
+    (the entry is stored under the canonical form, see ai.transposition.canonical_hash)
+    """
+    return mirror_code(code, rows) if mirrored else code
+
+
+def child(game, move):
+    """:return: Copy of game after move"""
+    new_game = game.clone()
+    new_game.turns = game.turns
+    new_game.apply(move)
+    return new_game
 
 
 class AI:
 
-    ALL_WALLS_HORIZONTAL = *((i,j) for i in range(ROWS-1) for j in range(1,ROWS)),  # tuple of all horizontal placements
-    ALL_WALLS_VERTICAL = *((i,j) for i in range(1,ROWS) for j in range(ROWS-1)),  # tuple of all vertical placements
+    transposition = None  # ai.transposition.TranspositionTable shared by the search processes (None - not used)
+    tablebase = None  # ai.tablebase.Tablebase of a small board that answers its positions exactly (None - not used)
+    ALL_WALLS_HORIZONTAL = geometry(ROWS).walls_horizontal  # tuple of all horizontal placements (default board)
+    ALL_WALLS_VERTICAL = geometry(ROWS).walls_vertical  # tuple of all vertical placements (default board)
 
-    def __init__(self, typ=0):
+    def __init__(self, typ=0, analysis=None):
+        """
+        :param typ: 0 - random simple ai, 1 - minimax, 2-6 - the simple ais
+        :param analysis: ai.analysis.AnalysisCache (or path of its file, which is read now) that remembers the minimax
+        moves between sessions (None - every position is searched)
+        """
         if typ not in range(7):  # if the user enters a number other than the range 0-6
             raise ValueError
         self.type = typ
+        if isinstance(analysis, str):
+            from ai.analysis import AnalysisCache
+            analysis = AnalysisCache(analysis)
+        self.analysis = analysis
         if typ == 1:
             print('You have selected Minimax, the best performing AI. Take in mind it may take several seconds to make'
                   'a decision')
 
-    def do(self, game):
+    def do(self, game, stop=None):
+        """
+        Do the move of the AI
+
+        :param game: Game
+        :param stop: threading.Event that cancels the minimax search when set (raises SearchCancelled)
+        :return: Game after the move
+        """
         ais = [0, self.pick_move, self.greediest_ai, self.random_ai, self.hesitant_ai, self.greedy_ai, self.passive_ai]
-        if self.type != 0:
-            game = ais[self.type](game)
+        if self.type == 1:
+            with STATS.timer('search'):
+                move = AI.tablebase.best_move(game) if AI.tablebase is not None else None
+                if move is not None:  # solved position
+                    game = child(game, move)
+                elif self.analysis is None:
+                    game = self.pick_move(game, stop)
+                else:
+                    game = self.analysed_move(game, stop)
+            STATS.end_move('pick_move', turn=game.turns)
+        elif self.type != 0:
+            with STATS.timer('search'):
+                game = ais[self.type](game)
+            STATS.end_move(ais[self.type].__name__, turn=game.turns)
         else:
             self.type = random.randint(2,6)
             self.do(game)
@@ -52,38 +164,56 @@ class AI:
         :param game: Game
         """
         piece = game.board.pieces[1].pos  # position of black piece
-        game.select((piece[0] * TILE_WIDTH, piece[1] * TILE_HEIGHT + MARGIN))  # select black piece
-        possible_moves = game.board.possible_moves()
-        best_path = game.board.BFS_SP(BLACK, possible_moves)
+        game.select(game.pixel(piece))  # select black piece
+        best_path = game.board.goal_path(BLACK)
         chosen = best_path[1]
-        game.select((chosen[0] * TILE_WIDTH, chosen[1] * TILE_HEIGHT + MARGIN))
+        game.select(game.pixel(chosen))
 
     @staticmethod
-    def minimax(game, depth, maximizing_player):
+    def minimax(game, depth, maximizing_player, stop=None, max_depth=2):
         """
         Minimax Algorithm
 
         :param game: Game that is being checked
         :param depth: How many recursions have been done
         :param maximizing_player: True if white, False if white
+        :param stop: threading.Event (or Deadline), the search raises SearchCancelled once it is set
+        :param max_depth: Depth at which the positions are evaluated
         :return: Best minimax value, game after the best minimax value has been done
         """
+        STATS.count('nodes')
+        if stop is not None and stop.is_set():
+            raise SearchCancelled()
+        table = AI.transposition
+        if table is not None:
+            key, mirrored = canonical_hash(game)  # a position and its mirror image share an entry
+            entry = table.probe(key)
+            if entry is not None and entry[1] == EXACT and entry[0] >= max_depth - depth:  # searched as deep before
+                move = code_move(table_code(entry[3], game.rows, mirrored), game)
+                if depth or move is not None:  # the root needs the best move, it's searched if the entry has none
+                    STATS.count('tt_hits')
+                    return entry[2], child(game, move) if depth == 0 else None
         x = game.winner()
         if x is not None:
             return float('inf') if x == WHITE else float('-inf'), game
-        if depth == 2:  # If depth has reached 2 or if the game is over
+        if depth == max_depth:  # If depth has reached max_depth
             return game.evaluate(), game
         best = float('-inf') if maximizing_player else float('inf')  # min value if maximizing, max if minimizing
         best_move = None
-        piece = game.board.pieces[game.turn == BLACK].pos  # position of piece that is moving
-        game.select((piece[0] * TILE_WIDTH, piece[1] * TILE_HEIGHT + MARGIN))  # select piece to get valid moves
+        symmetric = game.board.symmetric()  # the mirror twins of moves don't have to be searched (see mirror_twin)
+        x = game.turn == BLACK
+        piece = game.board.pieces[x].pos  # position of piece that is moving
+        game.select(game.pixel(piece))  # select piece to get valid moves
         for move in game.valid_moves:  # For every move in the valid moves
+            if symmetric and mirror_twin(game, pawn_move(x, piece, move)):
+                continue
             new_game = game.clone()  # Create copy of game
+            new_game.turns = game.turns  # the vertical walls are tried by the amount of turns (like child)
             piece = new_game.board.pieces[new_game.turn == BLACK].pos  # position of piece that is moving
-            new_game.select((piece[0] * TILE_WIDTH, piece[1] * TILE_HEIGHT + MARGIN))
+            new_game.select(new_game.pixel(piece))
             new_game.move(move)  # move piece to current valid move
             # noinspection PyUnresolvedReferences
-            value = AI.minimax(new_game, depth + 1, not maximizing_player)[0]  # recursion, does minimax
+            value = AI.minimax(new_game, depth + 1, not maximizing_player, stop, max_depth)[0]  # recursion
             if maximizing_player:  # minimax
                 best = max(best, value)
             else:
@@ -91,35 +221,135 @@ class AI:
             if best == value:
                 best_move = new_game  # if the current value is the best value, the best move is the move that was done
         if game.walls_remaining[not maximizing_player]:  # if there are any walls left for the current player
-            for wall in AI.ALL_WALLS_HORIZONTAL:  # for each possible wall
-                if game.board.can_place((wall, 0)):
-                    new_game = game.clone()
-                    new_game.place_ai(wall, 0)
-                    value = AI.minimax(new_game, depth + 1, not maximizing_player)[0]
-                else:
+            for wall in game.board.free_slots():  # for each wall that isn't crossing the placed walls
+                if wall[1] == 1 and game.turns <= 10:
+                    continue  # vertical walls are only checked after the 10th turn
+                if symmetric and mirror_twin(game, wall_move(x, wall)) or not game.board.can_place(wall):
                     continue
+                new_game = game.clone()
+                new_game.turns = game.turns
+                new_game.place_ai(*wall)
+                value = AI.minimax(new_game, depth + 1, not maximizing_player, stop, max_depth)[0]
                 if maximizing_player:
                     best = max(best, value)
                 else:
                     best = min(best, value)
                 if best == value:
                     best_move = new_game
-            if game.turns > 10:
-                for wall in AI.ALL_WALLS_VERTICAL:
-                    new_game = game.clone()
-                    if new_game.board.can_place((wall, 1)):
-                        new_game.place_ai(wall, 1)
-                        value = AI.minimax(new_game, depth + 1, not maximizing_player)[0]
-                    else:
-                        continue
-                    if maximizing_player:
-                        best = max(best, value)
-                    else:
-                        best = min(best, value)
-                    if best == value:
-                        best_move = new_game
+        if table is not None:
+            code = move_code(best_move.last_move, game.rows) if best_move else NO_MOVE
+            table.store(key, max_depth - depth, EXACT, best, table_code(code, game.rows, mirrored))
+        return best, best_move
+
+    @staticmethod
+    def alphabeta(game, depth, alpha, beta, maximizing_player, stop=None, max_depth=2, ordering=None):
+        """
+        Minimax with alpha-beta pruning over the same moves as minimax (search_moves, with the children built by child
+        so they keep the amount of turns like minimax's), so it finds the same value while skipping the moves that can't
+        change it. The better the moves are ordered, the more is skipped.
+
+        :param game: Game that is being checked
+        :param depth: How many recursions have been done
+        :param alpha: Value white is already sure to get (-inf at the root)
+        :param beta: Value black is already sure to get (inf at the root)
+        :param maximizing_player: True if white, False if black
+        :param stop: threading.Event (or Deadline), the search raises SearchCancelled once it is set
+        :param max_depth: Depth at which the positions are evaluated
+        :param ordering: ai.ordering.MoveOrdering that orders the moves and learns from the cutoffs (None - the moves
+        are tried in the order of search_moves)
+        :return: Best value (only a bound if it's not between alpha and beta), game after the best move
+        """
+        STATS.count('nodes')
+        if stop is not None and stop.is_set():
+            raise SearchCancelled()
+        table = AI.transposition
+        hash_move = None
+        if table is not None:
+            key, mirrored = canonical_hash(game)
+            entry = table.probe(key)
+            if entry is not None:
+                hash_move = table_code(entry[3], game.rows, mirrored)
+                if entry[0] >= max_depth - depth and (entry[1] == EXACT or entry[1] == LOWER and entry[2] >= beta or
+                                                      entry[1] == UPPER and entry[2] <= alpha):
+                    move = code_move(hash_move, game)
+                    if depth or move is not None:  # the root needs the best move, it's searched if the entry has none
+                        STATS.count('tt_hits')
+                        return entry[2], child(game, move) if depth == 0 else None
+        x = game.winner()
+        if x is not None:
+            return float('inf') if x == WHITE else float('-inf'), game
+        if depth == max_depth:
+            return game.evaluate(), game
+        moves = search_moves(game)
+        if ordering is not None:
+            moves = ordering.order(game, moves, depth, hash_move)
+        low, high = alpha, beta
+        best = float('-inf') if maximizing_player else float('inf')
+        best_move = None
+        for i, move in enumerate(moves):
+            new_game = child(game, move)
+            value = AI.alphabeta(new_game, depth + 1, alpha, beta, not maximizing_player, stop, max_depth, ordering)[0]
+            if best_move is None or (value > best if maximizing_player else value < best):
+                best, best_move = value, new_game
+            if maximizing_player:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:  # the other player won't let the game get here
+                STATS.count('cutoffs')
+                if i == 0:
+                    STATS.count('first_cutoffs')
+                if ordering is not None:
+                    ordering.cutoff(game, move, depth, max_depth - depth, i)
+                break
+        if table is not None:
+            bound = UPPER if best <= low else LOWER if best >= high else EXACT
+            code = move_code(best_move.last_move, game.rows) if best_move else NO_MOVE
+            table.store(key, max_depth - depth, bound, best, table_code(code, game.rows, mirrored))
         return best, best_move
 
+    @staticmethod
+    def search(game, max_depth=2, stop=None, ordering=None):
+        """
+        Iterative deepening: minimax to depth 1, 2, ... max_depth until stop is set.
+
+        :param game: Game to analyse (the player whose turn it is moves)
+        :param max_depth: Deepest search
+        :param stop: threading.Event or Deadline. The result of the deepest search that finished is returned
+        :param ordering: ai.ordering.MoveOrdering - search with alpha-beta pruning (AI.alphabeta) using it, its killer
+        moves and history carry over from one depth to the next (None - plain minimax)
+        :return: Tuple (depth, score, principal variation as a list of Moves). depth is 0 if no search finished. A
+        position of AI.tablebase isn't searched: depth is the amount of plies to the end (0 for a draw)
+        """
+        if AI.tablebase is not None:
+            result = AI.tablebase.search(game)
+            if result is not None:
+                return result
+        result = (0, game.evaluate(), [])
+        if game.winner() is not None:
+            return result
+        for depth in range(1, max_depth + 1):
+            try:
+                score, position = AI._root(game, stop, depth, ordering)
+                line = []
+                for d in range(depth - 1, -1, -1):  # follow the best moves, searching one ply shallower each time
+                    if position is None:
+                        break
+                    line.append(position.last_move)
+                    if d == 0 or position.winner() is not None:
+                        break
+                    position = AI._root(position, stop, d, ordering)[1]
+            except SearchCancelled:
+                break
+            result = (depth, score, line)
+        return result
+
+    @staticmethod
+    def _root(game, stop, max_depth, ordering):
+        if ordering is None:
+            return AI.minimax(game, 0, game.turn == WHITE, stop, max_depth)
+        return AI.alphabeta(game, 0, float('-inf'), float('inf'), game.turn == WHITE, stop, max_depth, ordering)
+
     @staticmethod
     def greediest_ai(game):
         if AI.place_wall_above(game):
@@ -161,5 +391,20 @@ class AI:
 
     @staticmethod
     @timeit
-    def pick_move(game):
-        return AI.minimax(game, 0, False)[1]
+    def pick_move(game, stop=None):
+        return AI.minimax(game, 0, False, stop)[1]
+
+    @timeit
+    def analysed_move(self, game, stop=None):
+        """
+        pick_move, answered from the analysis cache if the position was searched before (in this or an earlier session)
+
+        :return: Game after the move
+        """
+        entry = self.analysis.get(game, 2)
+        if entry is not None:
+            return child(game, entry[2])
+        score, new_game = AI.minimax(game, 0, False, stop)
+        if new_game is not None and new_game is not game:  # not a finished game
+            self.analysis.put(game, 2, score, new_game.last_move)
+        return new_game
@@ -0,0 +1,163 @@
+import sqlite3
+from queue import Queue, Empty
+from threading import Thread
+from quoridor.cache import LRUCache
+from quoridor.history import move_code, code_move, mirror_code, NO_MOVE
+from quoridor.instrumentation import STATS
+from ai.transposition import canonical_hash, KEY_MASK
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS positions (
+    key INTEGER PRIMARY KEY,  -- analysis_key() of the position, as a signed 64 bit number
+    depth INTEGER NOT NULL,  -- depth of the search
+    score REAL NOT NULL,  -- value of the position for white
+    move INTEGER NOT NULL,  -- code of the best move (quoridor.history.move_code) in the canonical position
+    used INTEGER NOT NULL  -- clock of the last time the entry was stored or used, the lowest is evicted first
+);
+CREATE INDEX IF NOT EXISTS positions_used ON positions (used);'''
+
+
+VERSION = 1  # user_version of files whose keys are analysis_key(), entries of older files are deleted
+
+
+def analysis_key(game):
+    """
+    :return: Tuple (key, mirrored): 64 bit digest of the canonical form of the position of game (ai.transposition.
+    canonical_hash, a position and its mirror image share an entry), and True if the canonical form is the mirror
+    image. The digest is of the packed position, so the keys stored in a file stay valid in other Python versions.
+    Vertical walls are only searched after the 10th turn, so the key also tells whether that turn has passed
+    """
+    return canonical_hash(game)
+
+
+def signed(key):
+    """:return: The 64 bit key as the signed number SQLite stores"""
+    return key - 2**64 if key >= 2**63 else key
+
+
+class AnalysisCache:
+    """
+    Results of searches (depth, score and best move of a position) kept in an SQLite file, so positions that were
+    analysed in earlier sessions (the same openings over and over) aren't searched again.
+
+    The entries of the file are read into memory when the cache is created (the most recently used ones, up to
+    max_entries). Lookups only use memory. New results and uses of entries are written to the file by a background
+    thread, so a move never waits for the disk. The file keeps at most max_entries entries, the least recently used are
+    deleted. Several processes can use the same file.
+    """
+    def __init__(self, path='analysis.sqlite3', max_entries=200000):
+        """
+        :param path: Path of the SQLite file (created if it doesn't exist)
+        :param max_entries: Most entries kept in memory and in the file
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = LRUCache('analysis', max_entries=max_entries)  # key -> (depth, score, move code)
+        self.queue = Queue()  # (key, depth, score, move code) to write, or key of a used entry. None - close
+        self.clock = 0  # 'used' of the next write
+        self.hits = self.misses = 0
+        self.loaded = self.stored = self.written = self.evicted = 0
+        self.load()
+        self.writer = Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute('PRAGMA journal_mode=WAL')  # the reads of other processes don't wait for the writes
+        db.executescript(SCHEMA)
+        if db.execute('PRAGMA user_version').fetchone()[0] < VERSION:  # keys of an older version
+            with db:
+                db.execute('DELETE FROM positions')
+                db.execute(f'PRAGMA user_version = {VERSION}')
+        return db
+
+    def load(self):
+        """Read the most recently used entries of the file into memory"""
+        db = self.connect()
+        try:
+            self.clock = db.execute('SELECT COALESCE(MAX(used), 0) FROM positions').fetchone()[0] + 1
+            rows = db.execute('SELECT key, depth, score, move FROM positions ORDER BY used DESC LIMIT ?',
+                              (self.max_entries,)).fetchall()
+        finally:
+            db.close()
+        for key, depth, score, move in reversed(rows):  # the most recently used one ends up last in the LRU order
+            self.entries.put(key & KEY_MASK, (depth, score, move))
+        self.loaded = len(rows)
+
+    def get(self, game, depth):
+        """
+        :param game: Game in which the player whose turn it is moves
+        :param depth: Depth of the search that would be done
+        :return: Tuple (depth, score, best Move) if the position was searched at least as deep before, None otherwise
+        """
+        key, mirrored = analysis_key(game)
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth or entry[2] == NO_MOVE:
+            self.misses += 1
+            return None
+        self.hits += 1
+        STATS.count('analysis_hits')
+        self.queue.put(key)
+        return entry[0], entry[1], code_move(mirror_code(entry[2], game.rows) if mirrored else entry[2], game)
+
+    def put(self, game, depth, score, move):
+        """
+        Add the result of a search of game (written to the file in the background)
+
+        :param move: Best Move found
+        """
+        key, mirrored = analysis_key(game)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > depth:  # keep the deeper result
+            return
+        code = move_code(move, game.rows)
+        entry = (depth, score, mirror_code(code, game.rows) if mirrored else code)
+        self.entries.put(key, entry)
+        self.stored += 1
+        self.queue.put((key, *entry))
+
+    def _write(self):
+        db = self.connect()
+        closing = False
+        while not closing:
+            batch = [self.queue.get()]
+            while True:  # write everything that is waiting in one transaction
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            if None in batch:
+                closing = True
+                batch.remove(None)
+            rows, used = [], []
+            for item in batch:
+                self.clock += 1
+                if isinstance(item, tuple):
+                    rows.append((signed(item[0]), *item[1:], self.clock))
+                else:
+                    used.append((self.clock, signed(item)))
+            try:
+                with db:
+                    db.executemany('INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?)', rows)
+                    db.executemany('UPDATE positions SET used = ? WHERE key = ?', used)
+                    excess = db.execute('SELECT COUNT(*) FROM positions').fetchone()[0] - self.max_entries
+                    if excess > 0:
+                        db.execute('DELETE FROM positions WHERE key IN '
+                                   '(SELECT key FROM positions ORDER BY used LIMIT ?)', (excess,))
+                        self.evicted += excess
+                self.written += len(rows)
+            except sqlite3.Error as e:  # the analysis is only an optimisation, the game goes on without it
+                print(f'Analysis cache: {e}')
+        db.close()
+
+    def close(self):
+        """
+        Write what is waiting and stop the writer
+        """
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+
+    def summary(self):
+        """:return: One line summary for the console"""
+        return (f'Analysis cache {self.path}: {self.loaded} positions loaded, {self.hits} hits / {self.misses} misses, '
+                f'{self.stored} results stored, {self.written} written, {self.evicted} evicted')
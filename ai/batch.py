@@ -0,0 +1,131 @@
+"""
+Headless batch analysis of positions.
+
+Reads one position per line from a file or stdin: the moves from the start of the game, separated by spaces, in the
+notation of quoridor.history.move_text (an empty line is the start position). Every position is analysed by a pool of
+worker processes with AI.search under a time budget, and one JSON line per position is written in input order:
+
+{"id": 0, "best": "e8", "score": 0.0, "pv": ["e8", "e2"], "depth": 2, "nodes": 4379, "seconds": 2.9}
+
+Only a bounded amount of positions is read ahead of the output, so memory stays flat for any input size.
+
+Usage: python -m ai.batch [input] [--workers 4] [--time 5] [--depth 2] [--rows 9] [--walls 10] [--weights weights.json]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # stdout is the JSON lines
+from multiprocessing import Pool
+from quoridor.constants import *
+from quoridor.game import Game
+from quoridor.history import move_text, parse_move
+from ai.algorithm import AI, Deadline
+
+_config = {}  # settings of the worker process (set by init_worker)
+
+
+def load(line, rows=ROWS, walls=WALLS):
+    """
+    :param line: Moves from the start of the game separated by spaces
+    :return: Game after the moves. Raises ValueError if a move is illegal
+    """
+    game = Game(rows=rows, walls=walls)
+    for text in line.split():
+        play(game, text)
+    return game
+
+
+def play(game, text):
+    """
+    Do one move in game
+
+    :param text: Move in the notation of quoridor.history.move_text
+    :return: The move. Raises ValueError if it's illegal
+    """
+    move = parse_move(text, game)
+    if game.winner() is not None:
+        raise ValueError(f'{text}: the game is over')
+    if move.wall is None:
+        if move.end not in game.board.pawn_moves(move.start):
+            raise ValueError(f'{text}: illegal pawn move')
+    elif not game.walls_remaining[move.piece] or not game.board.can_place(move.wall):
+        raise ValueError(f'{text}: illegal wall')
+    game.apply(move)
+    return move
+
+
+def score_json(score):
+    """:return: score for JSON (infinity as the strings "inf", "-inf")"""
+    if math.isinf(score):
+        return 'inf' if score > 0 else '-inf'
+    return round(score, 3)
+
+
+def init_worker(config):
+    _config.update(config)
+    if config.get('weights'):
+        Game.load_weights(config['weights'])  # evaluation weights written by ai.tuning
+    STATS.enable()  # counts the nodes of every analysis, no lines are exported
+
+
+def analyse(index, line):
+    """
+    Analyse one position (runs in a worker process)
+
+    :return: Dict of the result, written as a JSON line
+    """
+    start = time.perf_counter()
+    try:
+        game = load(line, _config['rows'], _config['walls'])
+    except (ValueError, IndexError, KeyError) as e:
+        return {'id': index, 'error': str(e)}
+    depth, score, line = AI.search(game, _config['depth'], Deadline(_config['time']))
+    record = STATS.end_move('batch')
+    return {'id': index, 'best': move_text(line[0]) if line else None, 'score': score_json(score),
+            'pv': [move_text(move) for move in line], 'depth': depth, 'nodes': record['counters'].get('nodes', 0),
+            'seconds': round(time.perf_counter() - start, 3)}
+
+
+def run(lines, out, workers, config):
+    """
+    Analyse every line of lines and write the results to out in the same order
+
+    :param lines: Iterable of input lines (read lazily)
+    :param out: File the JSON lines are written to
+    :param workers: Amount of worker processes
+    :param config: Dict of rows, walls, depth and time (seconds per position)
+    """
+    ahead = workers * 4  # positions being analysed or waiting to be written
+    with Pool(workers, initializer=init_worker, initargs=(config,)) as pool:
+        pending = deque()
+        for index, line in enumerate(lines):
+            pending.append(pool.apply_async(analyse, (index, line)))
+            if len(pending) >= ahead:
+                out.write(json.dumps(pending.popleft().get()) + '\n')
+        while pending:
+            out.write(json.dumps(pending.popleft().get()) + '\n')
+        out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('input', nargs='?', help='file of move lists (default: stdin)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--time', type=float, default=5, help='seconds per position')
+    parser.add_argument('--depth', type=int, default=2, help='deepest search')
+    parser.add_argument('--rows', type=int, default=ROWS, help='size of the board')
+    parser.add_argument('--walls', type=int, default=WALLS, help='walls per player')
+    parser.add_argument('--weights', help='file of evaluation weights (ai.tuning)')
+    args = parser.parse_args()
+    config = {'rows': args.rows, 'walls': args.walls, 'depth': args.depth, 'time': args.time, 'weights': args.weights}
+    lines = open(args.input) if args.input else sys.stdin
+    with lines:
+        run((line.rstrip('\n') for line in lines), sys.stdout, args.workers, config)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+from collections import defaultdict, deque
+from quoridor.constants import *
+from quoridor.geometry import STEPS
+from quoridor.history import move_code
+
+
+class MoveOrdering:
+    """
+    Orders the moves of a position so a pruning search (AI.alphabeta) finds the best one first and can cut off early.
+    One object is used for a whole search (all iterations of an iterative deepening), it learns from the cutoffs.
+
+    Moves are tried in this order:
+    1. the best move of the transposition table entry of the position (hash move)
+    2. the killer moves of the ply (the last two moves that caused a cutoff in another position of the same ply)
+    3. the other moves by history (sum of depth^2 of the cutoffs the move caused anywhere in the search), then by a
+       static score: the steps a pawn move gains on the shortest path, and for walls how many steps longer the
+       opponent's shortest path gets (minus how many steps longer the own one gets)
+
+    Any search can use it: call order() before trying the moves of a position and cutoff() when a move causes a
+    cutoff. The fraction of cutoffs that happened on the first move tried measures how good the ordering is.
+    """
+    KILLERS = 2  # killer moves per ply
+
+    def __init__(self):
+        self.killers = []  # ply -> list of the move codes of the killer moves, newest first
+        self.history = defaultdict(int)  # (piece, move code) -> sum of depth^2 of its cutoffs
+        self.cutoffs = self.first_cutoffs = 0
+        self.ordered = 0  # positions that were ordered
+
+    def order(self, game, moves, ply, hash_move=None):
+        """
+        :param game: Game whose moves are ordered (the player whose turn it is moves)
+        :param moves: List of quoridor.history.Move
+        :param ply: Distance from the root of the search
+        :param hash_move: Move code of the best move found for the position before (None - no hash move)
+        :return: List of moves, the most promising first
+        """
+        self.ordered += 1
+        rows = game.rows
+        piece = game.turn == BLACK
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        scores = self.static_scores(game, moves)
+        keys = []
+        for i, move in enumerate(moves):
+            code = move_code(move, rows)
+            keys.append((code == hash_move, code in killers, self.history.get((piece, code), 0), scores[i], -i))
+        return [moves[i] for i in sorted(range(len(moves)), key=keys.__getitem__, reverse=True)]
+
+    def cutoff(self, game, move, ply, depth, index):
+        """
+        Learn from a move that caused a cutoff
+
+        :param game: Game in which the move was tried
+        :param move: quoridor.history.Move
+        :param ply: Distance from the root of the search
+        :param depth: Remaining depth of the search below the position
+        :param index: How many moves were tried before it (0 - it was the first one)
+        """
+        self.cutoffs += 1
+        if index == 0:
+            self.first_cutoffs += 1
+        code = move_code(move, game.rows)
+        self.history[(game.turn == BLACK, code)] += depth * depth
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if code not in killers:
+            killers.insert(0, code)
+            del killers[self.KILLERS:]
+
+    def first_cutoff_rate(self):
+        """:return: Fraction of the cutoffs that happened on the first move (0 if there were none)"""
+        return self.first_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def stats(self):
+        """:return: Dict of the positions ordered, cutoffs, first move cutoffs and their fraction"""
+        return {'ordered': self.ordered, 'cutoffs': self.cutoffs, 'first_cutoffs': self.first_cutoffs,
+                'first_cutoff_rate': self.first_cutoff_rate(), 'history': len(self.history)}
+
+    @staticmethod
+    def static_scores(game, moves):
+        """
+        :return: List of the static score of every move: steps gained on the own shortest path by a pawn move, steps
+        added to the opponent's shortest path minus steps added to the own one by a wall
+        """
+        board = game.board
+        color = game.turn
+        other = BLACK if color == WHITE else WHITE
+        walls = MoveOrdering.path_walls(board, board.goal_path(other))
+        if walls:
+            before = len(board.goal_path(other)) - len(board.goal_path(color))
+        distances = None
+        scores = []
+        for move in moves:
+            if move.wall is None:
+                if distances is None:  # steps from every tile to the goal, once per position
+                    distances = MoveOrdering.goal_distances(board, board.goals[color == BLACK])
+                scores.append(distances.get(move.start, 0) - distances.get(move.end, 0))
+            elif move.wall in walls:  # only walls that cut the opponent's path can make it longer
+                board.place_wall(move.wall)
+                try:
+                    scores.append(len(board.goal_path(other)) - len(board.goal_path(color)) - before)
+                except TypeError:  # no path, the wall is illegal
+                    scores.append(float('-inf'))
+                board.unplace_wall(move.wall)
+            else:
+                scores.append(0)
+        return scores
+
+    @staticmethod
+    def goal_distances(board, goal):
+        """
+        :param board: Board
+        :param goal: Goal tiles of the player
+        :return: Dict of tile -> steps to the goal (breadth first search from the goal over Board.neighbours, jumps
+        only matter near the pawns)
+        """
+        distances = {pos: 0 for pos in goal}
+        queue = deque(goal)
+        while queue:
+            pos = queue.popleft()
+            for near in board.neighbours(pos):
+                if near not in distances:
+                    distances[near] = distances[pos] + 1
+                    queue.append(near)
+        return distances
+
+    @staticmethod
+    def path_walls(board, path):
+        """
+        :param board: Board
+        :param path: Shortest path of a pawn (list of tiles, or inf if there is none)
+        :return: Set of the free wall slots (pos, dir) that block a step of the path
+        """
+        if not isinstance(path, list):
+            return set()
+        geo = board.geometry
+        mask = 0
+        for (x, y), (nx, ny) in zip(path, path[1:]):
+            step = (nx - x, ny - y)
+            if step in STEPS:  # jumps over the other pawn can't be blocked by one wall
+                mask |= geo.blockers[(x, y, STEPS.index(step))]
+        mask &= board.free_mask
+        walls = set()
+        while mask:
+            low = mask & -mask
+            walls.add(geo.slots[low.bit_length() - 1])
+            mask ^= low
+        return walls
@@ -0,0 +1,116 @@
+import time
+from threading import Thread, Event
+from quoridor.constants import *
+from quoridor.profiler import PROFILER
+from ai.algorithm import SearchCancelled, legal_moves, child
+from ai.worker import AIWorker
+
+
+class PonderingWorker(AIWorker):
+    """
+    AIWorker that also thinks during the opponent's turn. ponder() guesses the opponent's best replies (by the
+    evaluation of the position after each reply) and searches the AI's answer to each of them in the background. When
+    the opponent then plays one of them, start() answers immediately from the finished search, or waits for the search
+    that is already running instead of starting over.
+    """
+
+    PREDICTIONS = 3  # amount of replies searched while pondering
+
+    def __init__(self, ai):
+        super().__init__(ai)
+        self.pondered = {}  # game key -> (game after the AI's answer, seconds the search took)
+        self.pondering = None  # key of the predicted position being searched right now
+        self.pondering_thread = None  # thread of the pondering searches (only a search of the AI's move once wanted)
+        self.started = 0  # time the current pondering search started
+        self.wanted = None  # key of the real position when it's the one being searched
+        self.hits = self.misses = 0
+        self.saved = []  # seconds of thinking saved in each hit
+
+    def ponder(self, game):
+        """
+        Start searching the answers to the opponent's likely replies
+
+        :param game: Game in which it's the opponent's turn
+        """
+        self.cancel()
+        copy = game.clone()
+        copy.turns = game.turns
+        with self.lock:
+            self.pondered = {}
+            self.stop = Event()
+            self.pondering_thread = Thread(target=self._ponder, args=(copy, self.stop), daemon=True)
+        self.pondering_thread.start()
+
+    def predict(self, game):
+        """
+        :return: The PREDICTIONS best replies of the player whose turn it is in game, as games after the reply
+        """
+        sign = 1 if game.turn == WHITE else -1  # white maximizes the evaluation, black minimizes it
+        games = [child(game, move) for move in legal_moves(game)]
+        games.sort(key=lambda g: -sign * g.evaluate())
+        return games[:PonderingWorker.PREDICTIONS]
+
+    def _ponder(self, game, stop):
+        for reply in self.predict(game):
+            key = reply.key()
+            with self.lock:
+                if stop.is_set():
+                    return
+                self.pondering, self.started = key, time.perf_counter()
+            try:
+                with PROFILER.span('ponder'):
+                    result = self.ai.do(reply, stop)
+            except SearchCancelled:
+                return
+            except Exception as e:
+                with self.lock:
+                    if not stop.is_set():
+                        self.pondering = None  # start() searches the position itself unless it is waiting for this one
+                        if self.wanted == key:
+                            self.error, self.wanted = e, None
+                return
+            with self.lock:
+                if stop.is_set():
+                    return
+                self.pondered[key] = (result, time.perf_counter() - self.started)
+                self.pondering = None
+                if self.wanted == key:  # the opponent played this reply while it was searched
+                    self.result, self.wanted = result, None
+                    return
+
+    def start(self, game):
+        """
+        Start thinking about the move in game, using the pondered searches when the opponent's move was predicted.
+        """
+        key = game.key()
+        with self.lock:
+            if key in self.pondered:  # answer was already found
+                self.stop.set()  # no need to keep pondering the other replies
+                self.result, seconds = self.pondered.pop(key)
+                self.thread = None
+            elif key == self.pondering:  # answer is being searched, let the search finish
+                seconds = time.perf_counter() - self.started
+                self.wanted = key
+                self.thread = self.pondering_thread  # it is the search of the AI's move now, see thinking()
+            else:
+                seconds = None
+        if seconds is None:
+            self.misses += 1
+            super().start(game)
+            return
+        self.hits += 1
+        self.saved.append(seconds)
+        print(f'Predicted move, saved {seconds:.2f}s of thinking.')
+
+    def cancel(self):
+        with self.lock:
+            self.wanted = self.pondering = self.pondering_thread = None
+        super().cancel()
+
+    def summary(self):
+        """:return: Hit rate of the predictions and the thinking time they saved"""
+        moves = self.hits + self.misses
+        if not moves:
+            return 'Pondering: no moves.'
+        return (f'Pondering: {self.hits}/{moves} moves predicted ({self.hits / moves:.0%}), '
+                f'{sum(self.saved):.2f}s saved ({sum(self.saved) / moves:.2f}s per move).')
@@ -0,0 +1,332 @@
+"""
+Engine service: the AI in its own process, used over a line protocol on stdin/stdout or a local socket.
+
+Every request is one line "<session> <command> [arguments]" and is answered by one line that starts with the session:
+
+    <session> new [rows] [walls]       new game in the session               -> <session> ok
+    <session> position [moves...]      the game after moves from the start   -> <session> ok
+    <session> position hex <data>      the game of Game.to_bytes().hex()     -> <session> ok
+    <session> move <move>              play one more move                    -> <session> ok
+    <session> go [depth N] [time S]    search the position of the session    -> <session> bestmove e8 score 0.0 depth 2
+                                                                                nodes 4379 time 2.91 pv e8 e2
+    <session> quit                     forget the session                    -> <session> ok
+    * stats                            statistics of the service             -> * stats requests 3 batches 2 ...
+
+Moves are in the notation of quoridor.history.move_text. A session is created by its first request (9*9 board, 10
+walls) and belongs to its connection. Errors are answered with "<session> error <message>". The answers to "go" come
+when the search is done, so answers of different sessions can come in any order.
+
+Searches run in a pool of worker processes that live as long as the service, so their caches stay warm between
+requests, and they share one transposition table. Searches requested within --linger seconds of each other are sent to
+the pool together as a batch (one task per worker), and a position that is requested more than once in a batch with
+the same limits is searched once. With --analysis the results are also kept in an analysis cache file
+(ai.analysis.AnalysisCache): a position that was searched at least as deep before, in this or an earlier run of the
+service, is answered from it without a search (nodes 0, and the pv is only the best move). With --tablebase the
+positions of a small board that the tablebase has (ai.tablebase) are answered exactly, depth is the plies to the end.
+With --weights the positions are evaluated with the weights of a file written by ai.tuning.
+
+Usage: python -m ai.service [--port 49560] [--host localhost] [--workers 4] [--depth 2] [--time 5] [--linger 0.005]
+                            [--analysis analysis.sqlite3] [--tablebase tablebase-5x5-1.qtb] [--weights weights.json]
+"""
+import argparse
+import os
+import socketserver
+import struct
+import sys
+import time
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # stdout is the protocol
+from multiprocessing import Pool
+from queue import Queue, Empty
+from threading import Thread, Lock
+from quoridor.constants import *
+from quoridor.game import Game, HEADER
+from quoridor.history import move_text, move_code, code_move, NO_MOVE
+from ai.algorithm import AI, Deadline
+from ai.analysis import AnalysisCache
+from ai.batch import load, play, score_json
+from ai.tablebase import Tablebase
+from ai.transposition import TranspositionTable
+
+
+SIZES = range(5, 14, 2)  # rows of the boards the service plays on
+
+
+def check_size(rows, walls):
+    """
+    Raise ValueError unless a game with rows*rows tiles and walls per player can be played: an odd size of SIZES, so
+    the pawns start on a middle column, and not more walls than fit on the board
+    """
+    if rows not in SIZES:
+        raise ValueError(f'rows must be odd, {SIZES.start} to {SIZES.stop - 1}')
+    if not 0 <= walls <= (rows - 1) ** 2 // 2:
+        raise ValueError(f'walls must be 0 to {(rows - 1) ** 2 // 2}')
+
+
+def init_worker(table, tablebase=None, weights=None):
+    AI.transposition = table  # shared by all workers
+    if tablebase is not None:
+        AI.tablebase = Tablebase(tablebase)  # memory mapped, the workers share the pages of the file
+    if weights is not None:
+        Game.load_weights(weights)
+    STATS.enable()  # counts the nodes of every search, no lines are exported
+
+
+def search(data, depth, seconds):
+    """
+    Search one position (runs in a worker process)
+
+    :param data: Game.to_bytes() of the position
+    :return: Dict of the best move (text and code), score, principal variation, depth, nodes and seconds
+    """
+    start = time.perf_counter()
+    game = Game.from_bytes(data)
+    depth, score, line = AI.search(game, depth, Deadline(seconds))
+    record = STATS.end_move('service')
+    return {'best': move_text(line[0]) if line else 'none', 'score': score_json(score), 'depth': depth,
+            'nodes': record['counters'].get('nodes', 0), 'time': round(time.perf_counter() - start, 3),
+            'pv': [move_text(move) for move in line], 'code': move_code(line[0], game.rows) if line else NO_MOVE,
+            'value': score}
+
+
+def search_many(positions):
+    """:return: List of the results of search for every (data, depth, seconds) in positions"""
+    return [search(*position) for position in positions]
+
+
+class Engine:
+    """
+    Pool of worker processes that searches the positions of all connections
+    """
+    def __init__(self, workers=os.cpu_count(), linger=0.005, batch=64, entries=2**20, analysis=None, tablebase=None,
+                 weights=None):
+        """
+        :param workers: Amount of worker processes
+        :param linger: Seconds a search waits for others to be sent to the pool with
+        :param batch: Most searches sent to the pool together
+        :param entries: Entries of the shared transposition table
+        :param analysis: ai.analysis.AnalysisCache that answers positions searched before (None - search everything)
+        :param tablebase: Path of an ai.tablebase file whose positions the workers answer without a search
+        :param weights: Path of a file of evaluation weights written by ai.tuning (None - the default evaluation)
+        """
+        self.analysis = analysis
+        self.workers = workers
+        self.linger = linger
+        self.batch = batch
+        self.table = TranspositionTable(entries)
+        self.pool = Pool(workers, initializer=init_worker, initargs=(self.table, tablebase, weights))
+        self.requests = Queue()  # (data, depth, seconds, reply) of the searches that weren't sent yet, None - close
+        self.counts = {'requests': 0, 'batches': 0, 'searches': 0, 'deduplicated': 0, 'analysed': 0, 'pending': 0}
+        self.lock = Lock()  # of counts
+        self.dispatcher = Thread(target=self._dispatch, daemon=True)
+        self.dispatcher.start()
+
+    def search(self, game, depth, seconds, reply):
+        """
+        Search game in the pool
+
+        :param reply: Function called with the result dict of search() (or an Exception) once it's done
+        """
+        entry = self.analysis.get(game, depth) if self.analysis is not None else None
+        with self.lock:
+            self.counts['requests'] += 1
+            self.counts['analysed' if entry else 'pending'] += 1
+        if entry is not None:
+            best = move_text(entry[2])
+            reply({'best': best, 'score': score_json(entry[1]), 'depth': entry[0], 'nodes': 0, 'time': 0.0,
+                   'pv': [best]})
+            return
+        self.requests.put((game.to_bytes(), depth, seconds, reply))
+
+    def _dispatch(self):
+        while True:
+            first = self.requests.get()
+            if first is None:
+                return
+            batch = [first]
+            end = time.perf_counter() + self.linger
+            while len(batch) < self.batch:
+                try:
+                    request = self.requests.get(timeout=max(0.0, end - time.perf_counter()))
+                except Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)  # close after this batch
+                    break
+                batch.append(request)
+            replies = {}  # (data, depth, seconds) -> replies waiting for it
+            for data, depth, seconds, reply in batch:
+                replies.setdefault((data, depth, seconds), []).append(reply)
+            positions = list(replies)
+            with self.lock:
+                self.counts['batches'] += 1
+                self.counts['searches'] += len(positions)
+                self.counts['deduplicated'] += len(batch) - len(positions)
+            for i in range(min(self.workers, len(positions))):  # one task per worker
+                chunk = positions[i::self.workers]
+                self.pool.apply_async(search_many, (chunk,), callback=lambda results, chunk=chunk: self._answer(
+                    replies, chunk, results), error_callback=lambda e, chunk=chunk: self._answer(
+                    replies, chunk, [e] * len(chunk)))
+
+    def _answer(self, replies, positions, results):
+        for position, result in zip(positions, results):
+            if self.analysis is not None and not isinstance(result, Exception) and result['code'] != NO_MOVE:
+                game = Game.from_bytes(position[0])
+                self.analysis.put(game, result['depth'], result['value'], code_move(result['code'], game))
+            for reply in replies[position]:
+                with self.lock:
+                    self.counts['pending'] -= 1
+                reply(result)
+
+    def stats(self):
+        """:return: Text of the counts of requests, batches, searches and deduplicated searches"""
+        with self.lock:
+            return ' '.join(f'{name} {count}' for name, count in self.counts.items())
+
+    def close(self):
+        """
+        Wait for the searches that were requested and stop the workers
+        """
+        self.requests.put(None)
+        self.dispatcher.join()
+        self.pool.close()
+        self.pool.join()
+        self.table.close()
+        if self.analysis is not None:
+            self.analysis.close()
+
+
+class Connection:
+    """
+    Sessions of one client (stdin/stdout or a socket) and the handling of its requests
+    """
+    def __init__(self, engine, write, depth=2, seconds=5):
+        """
+        :param engine: Engine that searches
+        :param write: Function that sends text to the client
+        :param depth: Depth of a search without a depth limit
+        :param seconds: Seconds of a search without a time limit
+        """
+        self.engine = engine
+        self.write = write
+        self.depth = depth
+        self.seconds = seconds
+        self.sessions = {}  # name -> Game
+        self.lock = Lock()  # answers of searches are sent from the pool's thread
+
+    def send(self, line):
+        with self.lock:
+            try:
+                self.write(line + '\n')
+            except (OSError, ValueError):  # the client left before the answer
+                pass
+
+    def handle(self, line):
+        """
+        Handle one request line (see the protocol at the top of the module)
+        """
+        words = line.split()
+        if not words:
+            return
+        name, command, args = words[0], words[1] if len(words) > 1 else '', words[2:]
+        try:
+            if name == '*' and command == 'stats':
+                self.send('* stats ' + self.engine.stats())
+                return
+            game = self.sessions.get(name)
+            if game is None or command == 'new':
+                rows = int(args[0]) if command == 'new' and args else ROWS
+                walls = int(args[1]) if command == 'new' and len(args) > 1 else WALLS
+                check_size(rows, walls)
+                game = self.sessions[name] = Game(rows=rows, walls=walls)
+            if command == 'new':
+                pass
+            elif command == 'position':
+                if args[:1] == ['hex']:
+                    data = bytes.fromhex(args[1])
+                    check_size(*HEADER.unpack_from(data)[:2])
+                    position = Game.from_bytes(data)
+                    if len(data) != len(position.to_bytes()):
+                        raise ValueError(f'position of {len(data)} bytes, {len(position.to_bytes())} expected')
+                    self.sessions[name] = position
+                else:
+                    self.sessions[name] = load(' '.join(args), game.rows, game.walls)
+            elif command == 'move':
+                play(game, args[0])
+            elif command == 'go':
+                limits = dict(zip(args[::2], args[1::2]))
+                depth, seconds = int(limits.get('depth', self.depth)), float(limits.get('time', self.seconds))
+                self.engine.search(game, depth, seconds, lambda result: self.answer(name, result))
+                return
+            elif command == 'quit':
+                del self.sessions[name]
+            else:
+                raise ValueError(f'unknown command {command!r}')
+        except (ValueError, IndexError, KeyError, struct.error) as e:
+            self.send(f'{name} error {e}')
+            return
+        self.send(f'{name} ok')
+
+    def answer(self, name, result):
+        """Send the result of a search of session name"""
+        if isinstance(result, Exception):
+            self.send(f'{name} error {result}')
+            return
+        self.send(f'{name} bestmove {result["best"]} score {result["score"]} depth {result["depth"]} '
+                  f'nodes {result["nodes"]} time {result["time"]} pv {" ".join(result["pv"])}'.rstrip())
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        connection = Connection(self.server.engine, self.write, **self.server.limits)
+        for line in self.rfile:
+            connection.handle(line.decode('UTF-8', 'replace'))
+
+    def write(self, text):
+        self.wfile.write(text.encode('UTF-8'))
+        self.wfile.flush()
+
+
+class Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, engine, limits):
+        super().__init__(address, Handler)
+        self.engine = engine
+        self.limits = limits  # depth and seconds of searches without limits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, help='listen on this local port (default: stdin/stdout)')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--depth', type=int, default=2, help='depth of a go without a depth')
+    parser.add_argument('--time', type=float, default=5, help='seconds of a go without a time')
+    parser.add_argument('--linger', type=float, default=0.005, help='seconds a search waits to be batched')
+    parser.add_argument('--batch', type=int, default=64, help='most searches in a batch')
+    parser.add_argument('--analysis', help='file of the analysis cache (default: no analysis cache)')
+    parser.add_argument('--tablebase', help='tablebase file of a small board (ai.tablebase)')
+    parser.add_argument('--weights', help='file of evaluation weights (ai.tuning)')
+    args = parser.parse_args()
+    engine = Engine(args.workers, args.linger, args.batch,
+                    analysis=AnalysisCache(args.analysis) if args.analysis else None, tablebase=args.tablebase,
+                    weights=args.weights)
+    limits = {'depth': args.depth, 'seconds': args.time}
+    try:
+        if args.port is None:
+            connection = Connection(engine, lambda text: (sys.stdout.write(text), sys.stdout.flush()), **limits)
+            for line in sys.stdin:
+                connection.handle(line)
+        else:
+            with Server((args.host, args.port), engine, limits) as server:
+                print(f'Engine service on {args.host}:{args.port}', file=sys.stderr)
+                server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.close()
+
+
+if __name__ == '__main__':
+    main()
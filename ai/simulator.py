@@ -0,0 +1,386 @@
+"""
+Lockstep simulator of the heuristic AIs over a batch of games.
+
+The games of a batch are kept as NumPy arrays instead of Game objects: the pawn positions, the walls remaining, for
+every row of every board bit masks of the tiles a pawn can leave in each direction (which is all that is needed of the
+walls), and the distance of every tile to the goal row of each player. All the games that aren't over make their move
+at the same time, so a turn of the whole batch is a few dozen array operations. Only horizontal walls are placed, so
+a pawn can always walk along a row: the distances are worked out row by row from the goal row for all the games
+together, done again for a player only in the games where walls were placed since its last step, and a shortest path
+step just compares the distances of the tiles the pawn can move to (the jumps are only worked out in the games where
+the pawns are next to each other). Walls are checked like Board.can_place does it, with the other pawn as an obstacle
+that can be jumped, so the replays through Game (--check) accept every move: a wall is legal if every row boundary
+between each pawn and its goal row still has a gap the pawn can use, and the few games where that doesn't settle it
+are searched from each pawn.
+
+The policies are the ones of the simple AIs (AI.greediest_ai, random_ai, hesitant_ai, greedy_ai and passive_ai): with
+some chance the player tries to place a horizontal wall right in front of the opponent's pawn (AI.place_wall_above, and
+the same in front of the black pawn when white plays it), first at the pawn's column and then one to the left, and
+otherwise moves one step along its shortest path. Ties between equally short steps are broken in the order of
+MOVE_ORDER (up, left, right, down), where AI.go_shortest_path takes whichever step the breadth first search finds
+first, so single games differ from the Game ones while the statistics of the policies are the same.
+
+Usage: python -m ai.simulator [--games 10000] [--white passive] [--black greedy] [--rows 9] [--walls 10] [--seed 0]
+                              [--check 20]
+"""
+import argparse
+import time
+import numpy as np
+from quoridor.constants import *
+from quoridor.geometry import STEPS, SIDES, MOVE_ORDER, LEFT, UP, RIGHT, DOWN
+from quoridor.history import pawn_move, wall_move
+
+POLICIES = {'greediest': 1, 'greedy': 2 / 3, 'random': 1 / 2, 'hesitant': 1 / 4, 'passive': 0}
+# name of the simple ai -> chance that it tries to place a wall in front of the opponent
+NONE, PAWN, WALL = range(3)  # kinds of recorded moves
+FAR = 255  # distance of a move that isn't possible
+GOALS = (0, -1)  # goal row of white and black
+
+
+class Simulator:
+    """
+    Batch of games between two heuristic policies, played in lockstep (white moves in all the games, then black...).
+    The arrays have the game as their last axis, so the rows of all the boards are contiguous.
+    """
+    def __init__(self, games, white='passive', black='greedy', rows=ROWS, walls=WALLS, seed=None, max_plies=None,
+                 record=False):
+        """
+        :param games: Amount of games
+        :param white: Policy of white (name in POLICIES), or a sequence of one policy per game
+        :param black: Policy of black, the same way
+        :param seed: Seed of the random choices (None - random)
+        :param max_plies: Plies after which unfinished games stop (None - 4 * rows * rows)
+        :param record: True to keep every move, see moves()
+        """
+        self.games = games
+        self.rows = rows
+        self.walls = walls
+        self.rng = np.random.default_rng(seed)
+        self.chance = np.stack([self._chances(white), self._chances(black)])  # [player, game]: chance of a wall
+        self.max_plies = 4 * rows * rows if max_plies is None else max_plies
+        full = (1 << rows) - 1
+        free = np.full((4, rows, games), full, dtype=np.uint16)  # bit x of [d, y, game]: (x, y) can step to d
+        free[LEFT] &= full - 1  # left border
+        free[RIGHT] &= full >> 1  # right border
+        free[UP, 0] = 0  # top border
+        free[DOWN, rows - 1] = 0  # bottom border
+        self.free = free
+        self.distance = np.stack([self._distances(free, GOALS[0]), self._distances(free, GOALS[1])])
+        # [player, y, x, game]: steps from (x, y) to the goal row of the player, ignoring the pawns
+        self.stale = np.zeros((2, games), dtype=bool)  # [player, game]: a wall was placed since distance was searched
+        self.x = np.full((2, games), (rows - 1) // 2, dtype=np.int64)  # column of the white and black pawn
+        self.y = np.array([[rows - 1], [0]], dtype=np.int64).repeat(games, axis=1)  # row of the white and black pawn
+        self.walls_remaining = np.full((2, games), walls, dtype=np.int64)
+        self.winner = np.full(games, -1, dtype=np.int64)  # 0 - white, 1 - black, -1 - not over
+        self.plies = np.zeros(games, dtype=np.int64)  # plies until the game was won
+        self.ply = 0
+        self.record = [] if record else None  # per ply: arrays (kind, x, y) of the move of every game
+
+    def _chances(self, policy):
+        if isinstance(policy, str):
+            return np.full(self.games, POLICIES[policy], dtype=float)
+        return np.array([POLICIES[name] for name in policy], dtype=float)
+
+    def run(self):
+        """
+        Play until all the games are over or max_plies plies were played
+
+        :return: self
+        """
+        while self.ply < self.max_plies and (self.winner < 0).any():
+            self.step()
+        return self
+
+    def step(self):
+        """
+        One ply: the player whose turn it is moves in every game that isn't over
+        """
+        me, other = self.ply % 2, 1 - self.ply % 2  # white moves on even plies
+        active = np.flatnonzero(self.winner < 0)
+        kind = np.full(self.games, NONE, dtype=np.int8)
+        tx = np.zeros(self.games, dtype=np.int64)
+        ty = np.zeros(self.games, dtype=np.int64)
+        chance = self.rng.random(len(active)) < self.chance[me, active]
+        trying = active[(self.walls_remaining[me, active] > 0) & chance]
+        row = self.y[other, trying] + (0 if me else 1)  # in front of the opponent: above white, below black
+        for shift in (0, 1):  # at the opponent's column, then one to the left
+            if not len(trying):
+                break
+            col = self.x[other, trying] - shift
+            placed = self._place(trying, col, row, me)
+            kind[trying[placed]], tx[trying[placed]], ty[trying[placed]] = WALL, col[placed], row[placed]
+            trying, row = trying[~placed], row[~placed]
+        moving = active[kind[active] == NONE]
+        if len(moving):
+            x, y = self._step(moving, me)
+            self.x[me, moving], self.y[me, moving] = x, y
+            kind[moving], tx[moving], ty[moving] = PAWN, x, y
+            won = moving[y == (0 if me == 0 else self.rows - 1)]
+            self.winner[won] = me
+            self.plies[won] = self.ply + 1
+        if self.record is not None:
+            self.record.append((kind, tx, ty))
+        self.ply += 1
+
+    def _place(self, games, x, y, me):
+        """
+        Place a horizontal wall at (x[i], y[i]) in games[i] for player me if it's legal
+
+        :return: Bool array, True where the wall was placed
+        """
+        rows = self.rows
+        ok = (x >= 0) & (x <= rows - 2) & (y >= 1) & (y <= rows - 1)  # the slot is on the board
+        cy = np.clip(y, 1, rows - 1)
+        bits = np.uint16(3) << np.clip(x, 0, rows - 2).astype(np.uint16)  # the two tiles below the wall
+        above = self.free[UP, cy, games]
+        # Only horizontal walls are ever placed, so a wall can't cross another one, and it overlaps one if a tile below
+        # it can't step up already. Without pawns a wall would only cut the board in two if it closed the last gap of
+        # its row, but like Board.can_place the pawns are obstacles too, so the games _crossable can't settle are
+        # searched
+        ok &= (above & bits == bits) & (above & ~bits != 0)
+        candidates = games[ok]
+        free = self.free[..., candidates]
+        index = np.arange(len(candidates))
+        free[UP, cy[ok], index] &= ~bits[ok]  # top side of (x, y) and (x + 1, y)
+        free[DOWN, cy[ok] - 1, index] &= ~bits[ok]  # bottom side of (x, y - 1) and (x + 1, y - 1)
+        legal = self._crossable(free, candidates, 0) & self._crossable(free, candidates, 1)
+        unsure = np.flatnonzero(~legal)
+        if len(unsure):
+            legal[unsure] = self._reaches(free[..., unsure], candidates[unsure], 0) & \
+                self._reaches(free[..., unsure], candidates[unsure], 1)
+        placed = candidates[legal]
+        self.free[..., placed] = free[..., legal]
+        self.walls_remaining[me, placed] -= 1
+        self.stale[:, placed] = True
+        ok[np.flatnonzero(ok)[~legal]] = False
+        return ok
+
+    def _crossable(self, free, games, player):
+        """
+        With only horizontal walls every row is connected (the other pawn can be jumped over), so the pawn of player
+        surely reaches its goal row if each row boundary on the way has a gap it can use. That is any gap, except the
+        one beside the other pawn on its far side: the pawn can only go through it jumping over the other pawn, from
+        the side when the other pawn is at the border of the board, or straight when it comes from the near side
+        through the gap there
+
+        :param free: Step masks of games
+        :param player: 0 - white, 1 - black
+        :return: Bool array, True where every boundary has a gap the pawn can use (False doesn't mean the goal can't be
+        reached, see _reaches)
+        """
+        rows = self.rows
+        index = np.arange(len(games))
+        x, y = self.x[player, games], self.y[player, games]
+        ox, oy = self.x[1 - player, games], self.y[1 - player, games]
+        bit = np.uint16(1) << ox.astype(np.uint16)
+        gaps = free[UP].copy()  # bit x of [y, game]: (x, y) can step up, the gap between rows y - 1 and y
+        if GOALS[player] == 0:  # white goes up, the far side of the other pawn is above it
+            far, near, beyond = oy, np.minimum(oy + 1, rows - 1), y > oy
+        else:
+            far, near, beyond = np.minimum(oy + 1, rows - 1), oy, y < oy
+        usable = (ox == 0) | (ox == rows - 1) | beyond & (gaps[near, index] & bit != 0)
+        gaps[far, index] &= np.where(usable, np.uint16((1 << rows) - 1), ~bit)
+        closed = gaps == 0
+        closed[0] = False  # there is no row above the top row
+        closed = np.cumsum(closed, axis=0)  # [y, game]: closed boundaries from the top down to row y
+        if GOALS[player] == 0:
+            return closed[y, index] == 0
+        return closed[-1] == closed[y, index]
+
+    @staticmethod
+    def _expand(reach, free):
+        """:return: The tiles of reach (rows of bit masks) and every tile one step away from them"""
+        out = reach | ((reach & free[LEFT]) >> 1) | ((reach & free[RIGHT]) << 1)
+        out[:-1] |= (reach & free[UP])[1:]
+        out[1:] |= (reach & free[DOWN])[:-1]
+        return out
+
+    def _reaches(self, free, games, player):
+        """
+        :param free: Step masks of games
+        :param player: 0 - white, 1 - black
+        :return: Bool array, True where the pawn of player can reach its goal row the way Board.can_place searches it:
+        the tile of the other pawn can't be entered, the pawn jumps over it or beside it instead (Board.pawn_moves)
+        """
+        rows = self.rows
+        index = np.arange(len(games))
+        x, y = self.x[player, games], self.y[player, games]
+        ox, oy = self.x[1 - player, games], self.y[1 - player, games]
+        inside = lambda px, py: (px >= 0) & (px < rows) & (py >= 0) & (py < rows)
+        column = lambda px: np.clip(px, 0, rows - 1).astype(np.uint16)
+        row = lambda py: np.clip(py, 0, rows - 1)
+        can = lambda d, px, py: inside(px, py) & (free[d, row(py), index] >> column(px) & 1).astype(bool)
+        reach = np.zeros((rows, len(games)), dtype=np.uint16)
+        reach[y, index] = np.uint16(1) << x.astype(np.uint16)
+        other = np.zeros_like(reach)
+        other[oy, index] = np.uint16(1) << ox.astype(np.uint16)
+        beyond = (free[:, oy, index] >> ox.astype(np.uint16) & 1).astype(bool)  # [d, game]: other pawn can step to d
+        jumps = []  # (x, y, valid, to) of every tile next to the other pawn: stepping from it toward the other pawn
+        for d in range(4):  # jumps to the tiles whose bits are set in the rows to
+            dx, dy = STEPS[d]
+            nx, ny = ox - dx, oy - dy
+            valid = can(d, nx, ny)
+            to = np.zeros_like(reach)
+            straight = valid & beyond[d]
+            to[row(oy + dy), index] |= np.where(straight, np.uint16(1) << column(ox + dx), np.uint16(0))
+            for side in SIDES[d]:  # wall or border behind the other pawn
+                sx, sy = STEPS[side]
+                diagonal = valid & ~straight & beyond[side]
+                to[row(oy + sy), index] |= np.where(diagonal, np.uint16(1) << column(ox + sx), np.uint16(0))
+            jumps.append((column(nx), row(ny), valid, to))
+        goal = GOALS[player]
+        done = reach[goal] != 0
+        row_of = ((1 << rows) - 1) & ~other  # [y, game]: every tile of the row but the other pawn's
+        while True:
+            grown = self._expand(reach, free) & ~other
+            grown = np.where(grown != 0, row_of, grown)  # without vertical walls a row is connected (see _crossable)
+            for nx, ny, valid, to in jumps:
+                grown |= np.where(valid & (grown[ny, index] >> nx & 1).astype(bool), to, np.uint16(0))
+            done |= grown[goal] != 0
+            if done.all() or (grown == reach).all():
+                return done
+            reach = grown
+
+    def _distances(self, free, goal):
+        """
+        Only horizontal walls are placed, so a pawn can walk along any row, and the shortest way to the goal row never
+        turns back: the distance of (x, y) is 1 + the least |x - c| + distance of (c, y') over the gaps c between row y
+        and the next row y' toward the goal. The rows are done one after the other from the goal row, all games at
+        once, the least over c by a sweep over the columns from each side
+
+        :param free: Step masks of some games
+        :param goal: Goal row
+        :return: Array [y, x, game] of the distances from every tile to the goal row (tiles that can't reach it are
+        never needed: the pawns always can, and so can the tiles they can move to)
+        """
+        rows = self.rows
+        toward, order = (UP, range(1, rows)) if goal == 0 else (DOWN, range(rows - 2, -1, -1))
+        closed = (free[toward][:, None, :] >> np.arange(rows, dtype=np.uint16)[:, None] & 1 ^ 1).astype(np.int16)
+        closed *= rows * rows  # [y, x, game]: 0 if (x, y) can step toward the goal row, more than any distance if not
+        distance = np.zeros((rows, rows, free.shape[2]), dtype=np.int16)
+        for y in order:
+            row = distance[y]
+            np.add(distance[y - 1 if goal == 0 else y + 1], closed[y], out=row)
+            for x in range(1, rows):  # through a gap at x or to its left
+                np.minimum(row[x], row[x - 1] + 1, out=row[x])
+            for x in range(rows - 2, -1, -1):  # or to its right
+                np.minimum(row[x], row[x + 1] + 1, out=row[x])
+            row += 1
+        return np.minimum(distance, FAR).astype(np.uint8)
+
+    def _step(self, games, me):
+        """
+        :return: Arrays x, y of the tile every pawn of player me in games moves to: the legal move (including jumps
+        over the other pawn) to the tile closest to the goal row
+        """
+        stale = games[self.stale[me, games]]
+        if len(stale):  # walls were placed since the player's last step
+            self.distance[me, ..., stale] = np.moveaxis(self._distances(self.free[..., stale], GOALS[me]), -1, 0)
+            self.stale[me, stale] = False
+        x, y = self.x[me, games], self.y[me, games]
+        ox, oy = self.x[1 - me, games], self.y[1 - me, games]
+        can = (self.free[:, y, games] >> x.astype(np.uint16) & 1).astype(bool)  # [d, game]: the pawn can step to d
+        tx, ty = self._closest(games, me, [(x + STEPS[d][0], y + STEPS[d][1], can[d]) for d in MOVE_ORDER])
+        near = np.flatnonzero(np.abs(x - ox) + np.abs(y - oy) == 1)  # the other pawn may be in the way
+        if not len(near):
+            return tx, ty
+        x, y, ox, oy, can, games = x[near], y[near], ox[near], oy[near], can[:, near], games[near]
+        other = (self.free[:, oy, games] >> ox.astype(np.uint16) & 1).astype(bool)  # and the other pawn
+        targets = []  # (x, y, valid) of every candidate move, in the order ties are broken
+        for d in MOVE_ORDER:
+            dx, dy = STEPS[d]
+            ok = can[d]
+            nx, ny = x + dx, y + dy
+            blocked = ok & (nx == ox) & (ny == oy)  # the other pawn is in the way
+            jump = blocked & other[d]
+            targets.append((np.where(jump, ox + dx, nx), np.where(jump, oy + dy, ny), ok & (~blocked | jump)))
+            for side in SIDES[d]:  # wall or border behind the other pawn: move diagonally to its sides
+                sx, sy = STEPS[side]
+                targets.append((ox + sx, oy + sy, blocked & ~jump & other[side]))
+        tx[near], ty[near] = self._closest(games, me, targets)
+        return tx, ty
+
+    def _closest(self, games, me, targets):
+        """
+        :param targets: List of (x, y, valid) arrays of the candidate moves in games, in the order ties are broken
+        :return: Arrays x, y of the valid candidate closest to the goal row of player me in every game
+        """
+        valid = np.array([t[2] for t in targets])  # [move, game]
+        tx = np.where(valid, np.array([t[0] for t in targets]), 0)
+        ty = np.where(valid, np.array([t[1] for t in targets]), 0)
+        best = np.argmin(np.where(valid, self.distance[me, ty, tx, games], FAR), axis=0)
+        index = np.arange(len(games))
+        return tx[best, index], ty[best, index]
+
+    def results(self):
+        """:return: Dict of the amount of games, white wins, black wins, unfinished games and mean plies of a win"""
+        won = self.winner >= 0
+        return {'games': self.games, 'white': int((self.winner == 0).sum()), 'black': int((self.winner == 1).sum()),
+                'unfinished': int((~won).sum()), 'mean_plies': float(self.plies[won].mean()) if won.any() else 0.0,
+                'walls_used': float((self.walls - self.walls_remaining).sum(axis=0).mean())}
+
+    def moves(self, game):
+        """
+        :param game: Index of a game (the simulator has to be created with record=True)
+        :return: List of the moves of the game (quoridor.history.Move)
+        """
+        x, y = [(self.rows - 1) // 2] * 2, [self.rows - 1, 0]
+        moves = []
+        for ply, (kind, tx, ty) in enumerate(self.record):
+            me = ply % 2
+            if kind[game] == PAWN:
+                moves.append(pawn_move(me, (x[me], y[me]), (int(tx[game]), int(ty[game]))))
+                x[me], y[me] = int(tx[game]), int(ty[game])
+            elif kind[game] == WALL:
+                moves.append(wall_move(me, ((int(tx[game]), int(ty[game])), 0)))
+        return moves
+
+
+def check(simulator, games):
+    """
+    Replay games through Game and check that every move is legal there
+
+    :return: Amount of games checked (raises ValueError at the first illegal move)
+    """
+    from quoridor.game import Game
+    for i in range(min(games, simulator.games)):
+        game = Game(rows=simulator.rows, walls=simulator.walls)
+        for move in simulator.moves(i):
+            if move.wall is None:
+                legal = move.end in game.board.pawn_moves(move.start)
+            else:
+                legal = game.walls_remaining[move.piece] > 0 and game.board.can_place(move.wall)
+            if not legal or game.winner() is not None:
+                raise ValueError(f'game {i}: illegal move {move}')
+            game.apply(move)
+        winner = game.winner()
+        if (winner == WHITE) != (simulator.winner[i] == 0) or (winner is None) != (simulator.winner[i] < 0):
+            raise ValueError(f'game {i}: different winner')
+    return min(games, simulator.games)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--white', default='passive', choices=POLICIES)
+    parser.add_argument('--black', default='greedy', choices=POLICIES)
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--walls', type=int, default=WALLS)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--check', type=int, default=0, help='replay this many games through Game to check them')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    simulator = Simulator(args.games, args.white, args.black, args.rows, args.walls, args.seed,
+                          record=args.check > 0).run()
+    seconds = time.perf_counter() - start
+    r = simulator.results()
+    print(f'{r["games"]} games {args.white} (white) vs {args.black} (black) in {seconds:.2f} s '
+          f'({r["games"] / seconds:.0f} games/s)')
+    print(f'white wins {r["white"] / r["games"]:.1%}, black wins {r["black"] / r["games"]:.1%}, unfinished '
+          f'{r["unfinished"]}, {r["mean_plies"]:.1f} plies per game, {r["walls_used"]:.1f} walls used per game')
+    if args.check:
+        print(f'{check(simulator, args.check)} games replayed through Game, all moves legal')
+
+
+if __name__ == '__main__':
+    main()
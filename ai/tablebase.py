@@ -0,0 +1,500 @@
+"""
+Retrograde solver and tablebase of small boards.
+
+Every position of a small board (pawns, walls, walls remaining and turn) is solved exactly: the player whose turn it is
+wins in n plies, loses in n plies, or it's a draw (neither player can force a win, the pawns go around in circles).
+Walls are never removed, so the positions are solved in layers, from the most walls placed down to none. The positions
+of one wall state (the walls on the board and the walls remaining) only lead to each other by pawn moves, and to
+positions with one more wall, which are solved already. Inside a wall state the values are found backwards from the
+finished games (retrograde analysis) in order of plies, so the distances are exact.
+
+The wall states of a layer are solved by a pool of processes. The solver writes into a work file (one byte per position
+and one byte per wall state that tells it's done), so an interrupted run goes on where it stopped. At the end the values
+are bit packed into the tablebase file, which Tablebase memory maps: a probe reads a few bytes of it and the processes
+that use the same file share it.
+
+The rules are the ones of quoridor.board.Board: pawns jump over each other (or beside each other if a wall or the border
+is behind), and a wall can only be placed if both pawns still have a way to their goal rows, the other pawn being an
+obstacle (Board.can_place). Positions that can't happen in a game (both pawns on one tile, a pawn walled off from its
+goal row, the player to move has already won) are stored as unknown.
+
+Usage: python -m ai.tablebase [--rows 5] [--walls 1] [--workers 4] [--output tablebase-5x5-1.qtb] [--probe "c2 c4 ..."]
+"""
+import argparse
+import mmap
+import os
+import resource
+import struct
+import time
+from collections import defaultdict
+from multiprocessing import Pool
+import numpy as np
+from quoridor.constants import *
+from quoridor.geometry import geometry, MOVE_ORDER, SIDES
+from quoridor.history import move_text
+
+HEADER = struct.Struct('<4sBBBI')  # magic, rows, walls, bits per value, amount of wall states
+MAGIC, WORK_MAGIC = b'QTB1', b'QTBW'  # tablebase file, work file of the solver
+UNKNOWN, DRAW = 0, 1  # values of positions. 2 + n: the player to move wins (n odd) or loses (n even) in n plies
+MAX_VALUE = 255  # values are solved in bytes
+
+_solver = None  # Solver of the worker process (set by init_worker)
+
+
+def wall_states(rows, walls):
+    """
+    :param rows: Size of the board
+    :param walls: Walls of each player at the start
+    :return: List of every wall state (wall mask, white walls remaining, black walls remaining), the most walls placed
+    first. Walls that conflict with each other are never in one mask
+    """
+    geo = geometry(rows)
+    layers = [[0]]  # walls placed -> masks
+    for placed in range(1, 2 * walls + 1):
+        masks = set()
+        for mask in layers[-1]:
+            free = geo.free_slots(mask) >> mask.bit_length()  # only higher slots, every mask is made once
+            slot = mask.bit_length()
+            while free:
+                if free & 1:
+                    masks.add(mask | 1 << slot)
+                free >>= 1
+                slot += 1
+        layers.append(sorted(masks))
+    states = []
+    for placed in range(2 * walls, -1, -1):
+        for mask in layers[placed]:
+            for white in range(max(0, placed - walls), min(placed, walls) + 1):  # walls placed by white
+                states.append((mask, walls - white, walls - placed + white))
+    return states
+
+
+def decode(value):
+    """
+    :param value: Value of a position in the tablebase
+    :return: Tuple (result, plies) for the player to move: ('win', n), ('loss', n), ('draw', None), or None if the
+    position is unknown
+    """
+    if value == UNKNOWN:
+        return None
+    if value == DRAW:
+        return 'draw', None
+    plies = value - 2
+    return 'win' if plies % 2 else 'loss', plies
+
+
+class Rules:
+    """
+    Moves of quoridor.board.Board on tuples of cell indexes, fast enough to go through every position of a small board
+    """
+    def __init__(self, rows):
+        geo = geometry(rows)
+        self.rows = rows
+        self.geometry = geo
+        self.cells = len(geo.cells)
+        self.near = tuple(tuple(None if near is None else geo.cell_index[near] for near in geo.neighbours[pos])
+                          for pos in geo.cells)  # cell -> neighbour cell in every direction (None - border)
+        self.goals = (frozenset(geo.cell_index[(x, 0)] for x in range(rows)),
+                      frozenset(geo.cell_index[(x, rows - 1)] for x in range(rows)))  # goal cells of white and black
+
+    def open_sides(self, mask):
+        """
+        :param mask: Mask of the placed walls
+        :return: Tuple of cell -> tuple of 4 bools, True if a pawn can step from the cell in that direction
+        """
+        geo = self.geometry
+        blocked = set()
+        for slot in range(len(geo.slots)):
+            if mask >> slot & 1:
+                blocked.update((geo.cell_index[(x, y)], side) for x, y, side in geo.blocked[slot])
+        return tuple(tuple(self.near[cell][d] is not None and (cell, d) not in blocked for d in range(4))
+                     for cell in range(self.cells))
+
+    def targets(self, sides, cell, occupied):
+        """
+        The moves of one tile, like Board.pawn_moves
+
+        :param sides: open_sides() of the walls
+        :param cell: Cell the pawn moves from
+        :param occupied: Cells of both pawns
+        :return: Set of the cells the pawn can move to
+        """
+        near = self.near
+        moves = set()
+        for d in MOVE_ORDER:
+            if not sides[cell][d]:  # wall or border in direction d
+                continue
+            step = near[cell][d]
+            if step not in occupied:
+                moves.add(step)
+            elif sides[step][d]:  # jump over the other pawn
+                moves.add(near[step][d])
+            else:  # wall or border behind it, move diagonally to its sides
+                moves.update(near[step][side] for side in SIDES[d] if sides[step][side])
+        return moves
+
+    def reaches(self, sides, cell, goal, occupied):
+        """
+        Board.DFS: can the pawn in cell get to its goal row (both pawns are obstacles, they don't move)
+
+        :param goal: Goal cells of the pawn
+        """
+        seen, stack = {cell}, [cell]
+        while stack:
+            for near in self.targets(sides, stack.pop(), occupied):
+                if near in goal:
+                    return True
+                if near not in seen:
+                    seen.add(near)
+                    stack.append(near)
+        return False
+
+    def region(self, sides, goal):
+        """
+        :return: Set of the cells from which the goal can be reached without pawns in the way. A pawn that isn't in it
+        can never get there, the position can't happen in a game
+        """
+        seen, stack = set(goal), [*goal]
+        while stack:
+            cell = stack.pop()
+            for d in range(4):
+                if sides[cell][d] and self.near[cell][d] not in seen:  # steps are the same both ways
+                    seen.add(self.near[cell][d])
+                    stack.append(self.near[cell][d])
+        return seen
+
+
+class Solver:
+    """
+    Retrograde analysis of every position of a rows*rows board with walls walls per player, into a work file
+    """
+    def __init__(self, rows, walls, path, write=True):
+        """
+        :param path: Path of the work file (created if it doesn't exist, continued if it does)
+        :param write: False in the worker processes, which only read the solved layers
+        """
+        self.rows, self.walls = rows, walls
+        self.rules = Rules(rows)
+        self.states = wall_states(rows, walls)
+        self.index = {state: i for i, state in enumerate(self.states)}  # wall state -> index
+        cells = self.rules.cells
+        self.size = cells * cells * 2  # positions per wall state
+        header = HEADER.pack(WORK_MAGIC, rows, walls, 8, len(self.states))
+        length = HEADER.size + len(self.states) * (1 + self.size)
+        if write and not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(header)
+                f.truncate(length)
+        with open(path, 'rb') as f:
+            if f.read(HEADER.size) != header or os.path.getsize(path) != length:
+                raise ValueError(f'{path} is the work file of another board')
+        data = np.memmap(path, dtype=np.uint8, mode='r+' if write else 'r', offset=HEADER.size)
+        self.done = data[:len(self.states)]  # wall state -> 1 if it's solved
+        self.values = data[len(self.states):]  # values of the positions, wall state by wall state
+        self.data = data
+
+    def position(self, white, black, turn):
+        """:return: Index of a position inside its wall state (white, black - cell indexes, turn - 0 white 1 black)"""
+        return (white * self.rules.cells + black) * 2 + turn
+
+    def solve(self, workers=os.cpu_count(), path=None):
+        """
+        Solve every wall state that isn't solved yet, layer by layer
+
+        :param workers: Amount of processes (1 - solve in this process)
+        :param path: Path of the work file for the workers
+        """
+        start = time.perf_counter()
+        layers = defaultdict(list)  # walls placed -> wall states
+        for i, (mask, white, black) in enumerate(self.states):
+            layers[2 * self.walls - white - black].append(i)
+        pool = Pool(workers, initializer=init_worker, initargs=(self.rows, self.walls, path)) if workers > 1 else None
+        try:
+            for placed in sorted(layers, reverse=True):
+                todo = [i for i in layers[placed] if not self.done[i]]
+                print(f'layer of {placed} walls: {len(layers[placed])} wall states, {len(todo)} to solve')
+                solved = 0
+                layer_start = time.perf_counter()
+                results = pool.imap_unordered(solve_state, todo, 8) if pool else map(self.solve_state, todo)
+                for i, values in results:
+                    self.values[i * self.size:(i + 1) * self.size] = np.frombuffer(values, dtype=np.uint8)
+                    self.done[i] = 1
+                    solved += 1
+                    if solved % 256 == 0 or solved == len(todo):
+                        self.data.flush()
+                        self.progress(solved, len(todo), time.perf_counter() - layer_start)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        self.data.flush()
+        print(f'solved in {time.perf_counter() - start:.1f} s')
+
+    def progress(self, solved, total, seconds):
+        """Print the progress of a layer and the memory used"""
+        rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss +
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 2**10  # KB on Linux
+        print(f'  {solved}/{total} wall states, {solved * self.size / max(seconds, 1e-9):.0f} positions/s, '
+              f'{seconds:.1f} s, peak memory {rss:.0f} MB (solver and workers)')
+
+    def solve_state(self, i):
+        """
+        Retrograde analysis of the positions of one wall state. The wall states with one more wall must be solved
+
+        :param i: Index of the wall state
+        :return: Tuple (i, bytes of the values of its positions)
+        """
+        mask, *remaining = self.states[i]
+        rules, cells, geo = self.rules, self.rules.cells, self.rules.geometry
+        sides = rules.open_sides(mask)
+        regions = (rules.region(sides, rules.goals[0]), rules.region(sides, rules.goals[1]))
+        free = geo.free_slots(mask)
+        walls = {slot: rules.open_sides(mask | 1 << slot) for slot in range(len(geo.slots)) if free >> slot & 1}
+        children = [None, None]  # player -> slot -> offset of the wall state after the player places that wall
+        for turn in (0, 1):
+            if remaining[turn]:
+                after = [*remaining]
+                after[turn] -= 1
+                children[turn] = {slot: self.index[(mask | 1 << slot, *after)] * self.size for slot in walls}
+        values = bytearray(self.size)
+        playing = bytearray(self.size)  # 1 - the game isn't over in the position and it can happen
+        moves = [0] * self.size  # moves of the position that aren't known to lose yet
+        parents = defaultdict(list)  # position -> positions that have a pawn move to it
+        losses = defaultdict(list)  # plies -> positions solved as lost in that many plies
+        wins = defaultdict(list)  # plies -> positions with a move to a position won in that many plies by the opponent
+        for white in range(cells):
+            for black in range(cells):
+                if white == black or white not in regions[0] or black not in regions[1]:
+                    continue
+                won = (white in rules.goals[0], black in rules.goals[1])
+                occupied = (white, black)
+                legal = None  # walls that can be placed (the same for both turns)
+                for turn in (0, 1):
+                    node = self.position(white, black, turn)
+                    if won[0] or won[1]:
+                        if not won[turn] and won[1 - turn]:  # the opponent has just won
+                            values[node] = 2
+                            losses[0].append(node)
+                        continue
+                    playing[node] = 1
+                    for target in rules.targets(sides, occupied[turn], occupied):
+                        pawns = (target, black) if turn == 0 else (white, target)
+                        parents[self.position(*pawns, 1 - turn)].append(node)
+                        moves[node] += 1
+                    if children[turn] is None:
+                        continue
+                    if legal is None:
+                        legal = [slot for slot, after in walls.items() if
+                                 rules.reaches(after, white, rules.goals[0], occupied) and
+                                 rules.reaches(after, black, rules.goals[1], occupied)]
+                    for slot in legal:
+                        value = int(self.values[children[turn][slot] + self.position(white, black, 1 - turn)])
+                        moves[node] += 1
+                        if value >= 2:  # draws never resolve the position
+                            (wins if value % 2 else losses)[value - 2].append(~node)  # ~: the child is outside
+        plies = 0
+        while plies <= max(max(losses, default=0), max(wins, default=0)):
+            for group, won in ((losses, False), (wins, True)):
+                for node in group.pop(plies, ()):
+                    if node < 0:  # value of a wall move to an already solved wall state
+                        self._resolve(values, moves, losses, wins, ~node, plies, won)
+                        continue
+                    for parent in parents[node]:
+                        self._resolve(values, moves, losses, wins, parent, plies, won)
+            plies += 1
+        for node in range(self.size):
+            if playing[node] and not values[node]:  # never resolved: a draw
+                values[node] = DRAW
+        return i, bytes(values)
+
+    @staticmethod
+    def _resolve(values, moves, losses, wins, node, plies, won):
+        """
+        A move of node leads to a position whose player to move wins (won) or loses in plies
+        """
+        if values[node]:
+            return
+        if not won:  # the first losing position found for the opponent is the fastest win
+            if plies + 3 > MAX_VALUE:
+                raise ValueError('Distance to win does not fit in a byte')
+            values[node] = plies + 3
+            wins[plies + 1].append(node)
+        else:
+            moves[node] -= 1
+            if not moves[node]:  # every move loses, the last one found is the slowest loss
+                values[node] = plies + 3
+                losses[plies + 1].append(node)
+
+    def pack(self, output):
+        """
+        Write the tablebase file: HEADER, the wall states (mask bytes, white and black walls remaining), then the values
+        of all positions with as few bits as the largest value needs
+
+        :return: Bits per value
+        """
+        geo = self.rules.geometry
+        mask_bytes = (len(geo.slots) + 7) // 8
+        bits = max(int(self.values.max()), 1).bit_length()
+        chunk = 8 * max(1, 2**20 // self.size)  # wall states packed at once (a multiple of 8 ends on a whole byte)
+        with open(output, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self.rows, self.walls, bits, len(self.states)))
+            for mask, white, black in self.states:
+                f.write(mask.to_bytes(mask_bytes, 'little') + bytes((white, black)))
+            for start in range(0, len(self.values), chunk * self.size):
+                values = np.asarray(self.values[start:start + chunk * self.size]).reshape(-1, 1)
+                f.write(np.packbits(np.unpackbits(values, axis=1, bitorder='little')[:, :bits],
+                                    bitorder='little').tobytes())
+        return bits
+
+    def close(self):
+        self.data.flush()
+        self.data._mmap.close()
+
+
+def init_worker(rows, walls, path):
+    global _solver
+    _solver = Solver(rows, walls, path, write=False)
+
+
+def solve_state(i):
+    return _solver.solve_state(i)
+
+
+class Tablebase:
+    """
+    Memory mapped tablebase file written by Solver.pack. Answers positions of its board size and wall count
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.rows, self.walls, self.bits, count = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a tablebase')
+        geo = geometry(self.rows)
+        mask_bytes = (len(geo.slots) + 7) // 8
+        self.index = {}  # wall state -> index
+        offset = HEADER.size
+        for i in range(count):
+            mask = int.from_bytes(self.data[offset:offset + mask_bytes], 'little')
+            self.index[(mask, self.data[offset + mask_bytes], self.data[offset + mask_bytes + 1])] = i
+            offset += mask_bytes + 2
+        self.offset = offset * 8  # bit of the first value
+        self.size = len(geo.cells) ** 2 * 2  # positions per wall state
+        self.probes = self.hits = 0
+
+    def value(self, game):
+        """
+        :return: Value of the position of game (UNKNOWN if the tablebase isn't of its board or doesn't have it)
+        """
+        self.probes += 1
+        if game.rows != self.rows or game.walls != self.walls:
+            return UNKNOWN
+        board = game.board
+        state = self.index.get((board.wall_mask, *game.walls_remaining))
+        if state is None:
+            return UNKNOWN
+        cells = board.geometry.cell_index
+        position = (cells[board.pieces[0].pos] * len(cells) + cells[board.pieces[1].pos]) * 2 + (game.turn == BLACK)
+        bit = self.offset + (state * self.size + position) * self.bits
+        word = int.from_bytes(self.data[bit >> 3:(bit >> 3) + 2], 'little')
+        value = word >> (bit & 7) & (1 << self.bits) - 1
+        if value != UNKNOWN:
+            self.hits += 1
+        return value
+
+    def probe(self, game):
+        """
+        :return: Tuple (result, plies) of the player whose turn it is in game (see decode), None if it isn't known
+        """
+        return decode(self.value(game))
+
+    def best_move(self, game):
+        """
+        :return: Move that wins the fastest, loses the slowest, or keeps the draw. None if the position isn't known
+        """
+        from ai.algorithm import legal_moves, child
+        value = self.value(game)
+        if value == UNKNOWN or game.winner() is not None:
+            return None
+        best, best_value = None, None
+        for move in legal_moves(game):
+            after = self.value(child(game, move))  # value for the opponent
+            if value == DRAW:
+                better = after == DRAW
+            elif value % 2:  # win: the opponent loses the fastest
+                better = after >= 2 and after % 2 == 0 and (best_value is None or after < best_value)
+            else:  # loss: the opponent wins the slowest
+                better = after >= 2 and (best_value is None or after > best_value)
+            if better:
+                best, best_value = move, after
+                if value == DRAW:
+                    break
+        return best
+
+    def search(self, game, max_plies=20):
+        """
+        The result of AI.search for a position of the tablebase
+
+        :param max_plies: Longest principal variation
+        :return: Tuple (plies to the end or 0 for a draw, score for white, principal variation as a list of Moves), None
+        if the position isn't known
+        """
+        result = self.probe(game)
+        if result is None or game.winner() is not None:
+            return None
+        from ai.algorithm import child
+        line, position = [], game
+        while len(line) < max_plies and position.winner() is None:
+            move = self.best_move(position)
+            if move is None:
+                break
+            line.append(move)
+            position = child(position, move)
+        if result[0] == 'draw':
+            return 0, 0.0, line
+        white_wins = (result[0] == 'win') == (game.turn == WHITE)
+        return result[1], float('inf') if white_wins else float('-inf'), line
+
+    def close(self):
+        self.data.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=5)
+    parser.add_argument('--walls', type=int, default=1, help='walls of each player')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='solver processes')
+    parser.add_argument('--output', help='tablebase file (default: tablebase-<rows>x<rows>-<walls>.qtb)')
+    parser.add_argument('--probe', help='only look up the position after these moves in an existing tablebase')
+    args = parser.parse_args()
+    output = args.output or f'tablebase-{args.rows}x{args.rows}-{args.walls}.qtb'
+    if args.probe is not None:
+        from ai.batch import load
+        tablebase = Tablebase(output)
+        game = load(args.probe, tablebase.rows, tablebase.walls)
+        result = tablebase.search(game)
+        if result is None:
+            print('unknown position')
+        else:
+            plies, score, line = result
+            print(f'{tablebase.probe(game)} score {score} pv {" ".join(move_text(move) for move in line)}')
+        tablebase.close()
+        return
+    work = output + '.work'
+    solver = Solver(args.rows, args.walls, work)
+    print(f'{args.rows}x{args.rows} board, {args.walls} walls each: {len(solver.states)} wall states, '
+          f'{len(solver.states) * solver.size} positions, {int(solver.done.sum())} wall states solved before')
+    solver.solve(args.workers, work)
+    counts = np.bincount(solver.values, minlength=256)
+    bits = solver.pack(output)
+    wins, losses = int(counts[3::2].sum()), int(counts[2::2].sum())
+    print(f'{wins} wins, {losses} losses, {int(counts[DRAW])} draws, {int(counts[UNKNOWN])} unknown, longest '
+          f'{int(np.flatnonzero(counts)[-1]) - 2} plies')
+    print(f'{output}: {os.path.getsize(output)} bytes, {bits} bits per position')
+    solver.close()
+    os.remove(work)
+
+
+if __name__ == '__main__':
+    main()
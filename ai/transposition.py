@@ -0,0 +1,135 @@
+import struct
+from hashlib import blake2b
+from multiprocessing import Lock, shared_memory, resource_tracker
+
+ENTRY = struct.Struct('<QBBdH')  # key, depth, bound, score, best move code -> 20 bytes
+EXACT, LOWER, UPPER = 1, 2, 3  # bound of the score of an entry
+KEY_MASK = 2**64 - 1
+
+
+def digest(data, vertical):
+    """
+    :param data: Packed position (Game.to_bytes)
+    :param vertical: True if vertical walls are searched in the position (after the 10th turn), the moves and so the
+    results of the search depend on it
+    :return: 64 bit digest of the position, the same in every process and Python version. 0 is never returned, it
+    marks an empty entry
+    """
+    return int.from_bytes(blake2b(data + bytes((vertical,)), digest_size=8).digest(), 'little') or 1
+
+
+def position_hash(game):
+    """:return: digest() of the position of game"""
+    return digest(game.to_bytes(ply=False), game.turns > 10)
+
+
+def canonical_hash(game):
+    """
+    :return: Tuple (hash, mirrored): digest() of the canonical form of the position (Game.canonical_bytes), the same
+    for a position and its mirror image, and True if the canonical form is the mirror image (the move codes stored
+    under the hash are mirrored too, see quoridor.history.mirror_code)
+    """
+    data, mirrored = game.canonical_bytes()
+    return digest(data, game.turns > 10), mirrored
+
+
+class TranspositionTable:
+    """
+    Fixed size hash table in shared memory that several processes can probe and store into. Each entry is packed in
+    20 bytes (ENTRY) and the index of a key is its low bits. The entries are split between a fixed amount of locks
+    (striped locks) so processes only wait for each other when they touch the same stripe.
+
+    The table can be passed to processes as an argument (multiprocessing.Process, Pool initializer), the child attaches
+    to the same shared memory and locks.
+    """
+    def __init__(self, entries=2**20, stripes=64, name=None, locks=None):
+        """
+        :param entries: Amount of entries, rounded up to a power of 2
+        :param stripes: Amount of locks
+        :param name: Name of existing shared memory to attach to (None - create new table)
+        :param locks: Locks of the existing table (when attaching)
+        """
+        self.entries = 1 << max(entries - 1, 1).bit_length()
+        self.owner = name is None  # the process that created the table has to unlink it
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=self.entries * ENTRY.size)
+            self.memory.buf[:] = bytes(self.entries * ENTRY.size)  # all keys 0 -> all entries empty
+            self.locks = tuple(Lock() for _ in range(stripes))
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.memory._name, 'shared_memory')  # only the owner may free the memory
+            self.locks = locks
+        self.buf = self.memory.buf
+        self.probes = self.hits = self.stores = self.collisions = 0  # statistics of this process
+
+    def __getstate__(self):
+        return {'entries': self.entries, 'name': self.memory.name, 'locks': self.locks}
+
+    def __setstate__(self, state):
+        self.__init__(state['entries'], name=state['name'], locks=state['locks'])
+
+    def _slot(self, key):
+        index = key & (self.entries - 1)
+        return index * ENTRY.size, self.locks[index % len(self.locks)]
+
+    def probe(self, key):
+        """
+        :param key: position_hash() or canonical_hash() of the position
+        :return: Tuple (depth, bound, score, move code) if the position is in the table, None otherwise
+        """
+        offset, lock = self._slot(key)
+        with lock:
+            entry = ENTRY.unpack_from(self.buf, offset)
+        self.probes += 1
+        if entry[0] != key:
+            return None
+        self.hits += 1
+        return entry[1:]
+
+    def store(self, key, depth, bound, score, move):
+        """
+        Store the result of a search. An entry of another position is replaced (always-replace scheme); an entry of the
+        same position is only replaced by a search that was at least as deep.
+
+        :param key: position_hash() or canonical_hash() of the position
+        :param depth: Depth that was searched from the position
+        :param bound: EXACT, LOWER or UPPER
+        :param score: Score of the position
+        :param move: Code of the best move (quoridor.history.move_code)
+        """
+        offset, lock = self._slot(key)
+        with lock:
+            old_key, old_depth = struct.unpack_from('<QB', self.buf, offset)
+            if old_key == key and old_depth > depth:
+                return
+            ENTRY.pack_into(self.buf, offset, key, depth, bound, score, move)
+        self.stores += 1
+        if old_key and old_key != key:
+            self.collisions += 1
+
+    def clear(self):
+        for lock in self.locks:
+            lock.acquire()
+        self.buf[:] = bytes(self.entries * ENTRY.size)
+        for lock in self.locks:
+            lock.release()
+
+    def usage(self):
+        """:return: Fraction of the entries that are used"""
+        used = sum(1 for offset in range(0, self.entries * ENTRY.size, ENTRY.size)
+                   if struct.unpack_from('<Q', self.buf, offset)[0])
+        return used / self.entries
+
+    def stats(self):
+        """:return: Dict of the probe hit rate and collisions of this process"""
+        return {'probes': self.probes, 'hits': self.hits, 'hit_rate': self.hits / self.probes if self.probes else 0.0,
+                'stores': self.stores, 'collisions': self.collisions}
+
+    def close(self):
+        """
+        Detach from the shared memory. The process that created the table also frees it
+        """
+        self.buf = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
@@ -0,0 +1,190 @@
+"""
+Tuning of the weights of the evaluation (Game.evaluate) on the outcomes of games.
+
+The games are read from a file, one per line as moves separated by spaces like ai.batch (games that don't end with a
+winner are skipped), or played by the simulator of the heuristic AIs (ai.simulator) with a random policy for each side
+of every game. Worker processes replay the games through Game and return the features (quoridor.game.FEATURES) of
+every position, which are collected into NumPy arrays in batches. The weights are fitted by logistic regression, the
+chance that white wins a position being 1 / (1 + exp(-features @ weights)), with Newton steps on all positions at once
+and a little L2 regularisation. Every fifth game is held out to compare the fitted weights with the default ones
+(scaled to fit just as well) on games the fit didn't see.
+
+The weights are written as JSON, scaled so that one step of the path difference is worth 1 like in the default formula
+(the logistic scale is kept as "scale"), and read by evaluate with main.py --weights, ai.batch --weights or
+ai.service --weights. Analysis caches (ai.analysis) remember the moves of the weights they were searched with.
+
+Usage: python -m ai.tuning [input] [--games 2000] [--output weights.json] [--workers 4] [--rows 9] [--walls 10]
+                           [--l2 0.001] [--seed 0]
+"""
+import argparse
+import json
+import os
+import random
+import time
+from multiprocessing import Pool
+import numpy as np
+from quoridor.constants import *
+from quoridor.game import Game, FEATURES, DEFAULT_WEIGHTS
+from ai.batch import play
+from ai.simulator import Simulator, POLICIES
+
+_config = {}  # settings of the worker process (set by init_worker)
+BATCH = 4096  # rows of the feature arrays collected at once
+
+
+def init_worker(config):
+    _config.update(config)
+
+
+def game_features(index, moves):
+    """
+    Replay one game (runs in a worker process)
+
+    :param moves: Line of moves separated by spaces, or list of quoridor.history.Move
+    :return: Tuple (index, array of the features of every position before the end, 1 if white won / 0 if black won /
+    None if nobody won, error or None)
+    """
+    game = Game(rows=_config['rows'], walls=_config['walls'])
+    rows = []
+    try:
+        for move in moves.split() if isinstance(moves, str) else moves:
+            try:
+                rows.append(game.features())
+            except TypeError:  # the other pawn blocks the only way of a pawn, evaluate gives it no value either
+                pass
+            if isinstance(move, str):
+                play(game, move)
+            else:
+                game.apply(move)
+    except (ValueError, IndexError, KeyError) as e:
+        return index, None, None, str(e)
+    winner = game.winner()
+    return index, np.array(rows, dtype=np.float32).reshape(-1, len(FEATURES)), \
+        None if winner is None else int(winner == WHITE), None
+
+
+def self_play(games, rows, walls, seed=None, batch=1000):
+    """
+    :return: Generator of the moves (list of quoridor.history.Move) of games played by the simulator with a random
+    policy for each side
+    """
+    rng = random.Random(seed)
+    names = list(POLICIES)
+    for start in range(0, games, batch):
+        n = min(batch, games - start)
+        white = [rng.choice(names) for _ in range(n)]
+        black = [rng.choice(names) for _ in range(n)]
+        simulator = Simulator(n, white, black, rows, walls, rng.randrange(2**32), record=True).run()
+        for i in range(n):
+            yield simulator.moves(i)
+
+
+def collect(games, workers, config):
+    """
+    :param games: Iterable of games (lines or lists of moves)
+    :return: Tuple (features, outcomes, test) of all positions of the games that were won: array [position, feature],
+    array [position] of 1 where white won and bool array [position] of the held out positions (every fifth game)
+    """
+    features, outcomes, test = [], [], []
+    chunk, labels, held = [], [], []  # the current batch
+    count = 0
+    with Pool(workers, initializer=init_worker, initargs=(config,)) as pool:
+        for index, x, y, error in pool.imap(_game_features, enumerate(games), chunksize=16):
+            if error:
+                print(f'game {index}: {error}')
+                continue
+            if y is None or not len(x):
+                continue
+            chunk.append(x)
+            labels.append(np.full(len(x), y, dtype=np.float32))
+            held.append(np.full(len(x), index % 5 == 4))
+            count += len(x)
+            if count >= BATCH:
+                features.append(np.concatenate(chunk))
+                outcomes.append(np.concatenate(labels))
+                test.append(np.concatenate(held))
+                chunk, labels, held, count = [], [], [], 0
+    if chunk:
+        features.append(np.concatenate(chunk))
+        outcomes.append(np.concatenate(labels))
+        test.append(np.concatenate(held))
+    if not features:
+        return np.zeros((0, len(FEATURES)), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool)
+    return np.concatenate(features), np.concatenate(outcomes), np.concatenate(test)
+
+
+def _game_features(args):
+    return game_features(*args)
+
+
+def fit(x, y, l2=1e-3, iterations=50):
+    """
+    Logistic regression by Newton's method
+
+    :param x: Array [position, feature]
+    :param y: Array [position] of the outcomes (0 or 1)
+    :param l2: Weight of the L2 regularisation (keeps features that never change at 0)
+    :return: Array of the weights
+    """
+    x = x.astype(np.float64)
+    weights = np.zeros(x.shape[1])
+    for _ in range(iterations):
+        p = 1 / (1 + np.exp(-(x @ weights)))
+        gradient = x.T @ (p - y) / len(y) + l2 * weights
+        hessian = (x * (p * (1 - p))[:, None]).T @ x / len(y) + l2 * np.eye(len(weights))
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.abs(step).max() < 1e-9:
+            break
+    return weights
+
+
+def loss(x, y, weights):
+    """:return: Tuple (mean log loss, fraction of the positions whose winner the sign of the value predicts)"""
+    z = x.astype(np.float64) @ weights
+    return float(np.mean(np.logaddexp(0, z) - y * z)), float(np.mean((z > 0) == (y > 0.5)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('input', nargs='?', help='file of games (default: games played by the simulator)')
+    parser.add_argument('--games', type=int, default=2000, help='games played by the simulator')
+    parser.add_argument('--output', default='weights.json', help='file the weights are written to')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--rows', type=int, default=ROWS, help='size of the board')
+    parser.add_argument('--walls', type=int, default=WALLS, help='walls per player')
+    parser.add_argument('--l2', type=float, default=1e-3, help='weight of the L2 regularisation')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    config = {'rows': args.rows, 'walls': args.walls}
+    start = time.perf_counter()
+    if args.input:
+        with open(args.input) as f:
+            x, y, test = collect((line.rstrip('\n') for line in f), args.workers, config)
+    else:
+        x, y, test = collect(self_play(args.games, args.rows, args.walls, args.seed), args.workers, config)
+    print(f'{len(y)} positions ({test.sum()} held out) in {time.perf_counter() - start:.1f} s, '
+          f'white wins {y.mean() if len(y) else 0:.1%}')
+    if not (~test).any() or not test.any():
+        print('Not enough positions')
+        return
+    names = list(FEATURES)
+    weights = fit(x[~test], y[~test], args.l2)
+    default = np.array([DEFAULT_WEIGHTS.get(name, 0.0) for name in names])
+    scale = fit((x[~test] @ default)[:, None], y[~test], args.l2)[0]  # the default formula, scaled to fit
+    print(f'{"held out":<10}{"log loss":>10}{"accuracy":>10}')
+    for name, w in (('default', default * scale), ('tuned', weights)):
+        test_loss, accuracy = loss(x[test], y[test], w)
+        print(f'{name:<10}{test_loss:>10.4f}{accuracy:>10.1%}')
+    unit = weights[names.index('path')] if weights[names.index('path')] > 0 else 1.0  # value of one path step
+    result = {'weights': {name: round(float(w / unit), 6) for name, w in zip(names, weights)},
+              'scale': round(float(unit), 6), 'positions': int(len(y)), 'loss': loss(x[test], y[test], weights)[0],
+              'default_loss': loss(x[test], y[test], default * scale)[0]}
+    print(' '.join(f'{name} {w:+.3f}' for name, w in result['weights'].items()))
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=1)
+    print(f'Weights written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
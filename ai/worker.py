@@ -0,0 +1,77 @@
+from threading import Thread, Event, Lock
+from quoridor.profiler import PROFILER
+from ai.algorithm import SearchCancelled
+
+
+class AIWorker:
+    """
+    Runs the AI on a copy of the game in a background thread so the window keeps handling events while the AI thinks.
+    """
+    def __init__(self, ai):
+        self.ai = ai  # AI engine
+        self.thread = None  # thread of the current search (None if no search was started)
+        self.stop = Event()  # set to cancel the current search
+        self.result = None  # game after the AI's move, once the search finished
+        self.error = None  # exception of a search that failed, raised by take() in place of the result
+        self.lock = Lock()  # so a search can't publish its result while it is being cancelled
+
+    def start(self, game):
+        """
+        Start thinking about the move in game. Any search that is still running is cancelled.
+
+        :param game: Game in which it's the AI's turn (it is copied, the search never changes it)
+        """
+        self.cancel()
+        copy = game.clone()
+        copy.turns = game.turns
+        self.stop = Event()
+        self.thread = Thread(target=self._run, args=(copy, self.stop), daemon=True)
+        self.thread.start()
+
+    def _run(self, game, stop):
+        try:
+            with PROFILER.span('search'):
+                result = self.ai.do(game, stop)
+        except SearchCancelled:
+            return
+        except Exception as e:  # posted like a result, the window would wait for the move forever otherwise
+            with self.lock:
+                if not stop.is_set():
+                    self.error = e
+            return
+        with self.lock:
+            if not stop.is_set():  # the result of a cancelled search is never used
+                self.result = result
+
+    def thinking(self):
+        """:return: True while a search of the AI's move is running (not while pondering on the opponent's turn)"""
+        return self.thread is not None and not self.ready()
+
+    def ready(self):
+        """:return: True if the search finished (or failed) and its result wasn't taken yet"""
+        return self.result is not None or self.error is not None
+
+    def take(self):
+        """
+        :return: The game after the AI's move (None if not ready). Raises the exception of the search if it failed.
+        The worker is idle afterwards
+        """
+        result, error, self.result, self.error, self.thread = self.result, self.error, None, None, None
+        if error is not None:
+            raise error
+        return result
+
+    def ponder(self, game):
+        """
+        Called when it's the opponent's turn. This worker doesn't think on the opponent's time (see PonderingWorker)
+        """
+        pass
+
+    def cancel(self):
+        """
+        Stop the current search. Doesn't wait for the thread, it exits at the next node it visits.
+        """
+        with self.lock:
+            self.stop.set()
+            self.thread = None
+            self.result = self.error = None
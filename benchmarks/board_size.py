@@ -0,0 +1,71 @@
+"""
+How the engine scales with the size of the board.
+
+For every size the benchmark plays the same kind of mid-game position (both pawns a few steps from their start and
+some walls placed by the simple AIs) and times possible_moves(), can_place() over every wall slot and one minimax
+move (AI.minimax from the root, like AI.pick_move).
+
+Usage: python -m benchmarks.board_size [--sizes 5,7,9,11,13] [--walls 10] [--no-search]
+"""
+import argparse
+import random
+import time
+from quoridor.constants import *
+from quoridor.game import Game
+from ai.algorithm import AI
+
+
+def midgame(rows, walls, seed=0):
+    """
+    :return: Game after rows//2 turns of each player on a rows*rows board. White walks its shortest path and black
+    plays greedy_ai (which also places walls)
+    """
+    random.seed(seed)
+    game = Game(rows=rows, walls=walls)
+    for _ in range(rows // 2 * 2):
+        if game.turn == WHITE:  # the simple AIs only play black, so white is moved along its shortest path
+            path = game.board.BFS_SP(WHITE)
+            game.select(game.pixel(game.board.pieces[0].pos))
+            game.select(game.pixel(path[1]))
+        else:
+            AI.greedy_ai(game)
+        game.select((0, 0))
+    return game
+
+
+def timed(func, repeat):
+    """:return: Average seconds per call of func over repeat calls"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench(rows, walls, search=True):
+    game = midgame(rows, walls)
+    board = game.board
+    slots = board.geometry.slots
+    result = {'rows': rows, 'slots': len(slots),
+              'possible_moves_us': timed(board.possible_moves, 200) * 1e6,
+              'can_place_all_ms': timed(lambda: [board.can_place(wall) for wall in slots], 5) * 1e3}
+    if search:
+        game.turn = BLACK
+        result['pick_move_s'] = timed(lambda: AI.minimax(game, 0, False), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='5,7,9,11,13', help='comma separated board sizes')
+    parser.add_argument('--walls', type=int, default=WALLS, help='walls per player')
+    parser.add_argument('--no-search', action='store_true', help='skip timing the minimax move')
+    args = parser.parse_args()
+    print(f'{"rows":>5}{"slots":>7}{"possible_moves (us)":>22}{"can_place x all (ms)":>23}{"pick_move (s)":>16}')
+    for rows in map(int, args.sizes.split(',')):
+        r = bench(rows, args.walls, not args.no_search)
+        print(f'{r["rows"]:>5}{r["slots"]:>7}{r["possible_moves_us"]:>22.1f}{r["can_place_all_ms"]:>23.2f}'
+              f'{r.get("pick_move_s", float("nan")):>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
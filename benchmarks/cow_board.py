@@ -0,0 +1,75 @@
+"""
+Copy on write boards (Board.clone) compared to copying every tile, the way Board.clone worked before.
+
+Times clone() and clone() followed by a move, and measures the memory every retained position costs when a line of
+positions is kept (history, search tree): every position is a clone of the one before with one move applied.
+
+Usage: python -m benchmarks.cow_board [--rows 9] [--repeat 2000] [--positions 2000]
+"""
+import argparse
+import tracemalloc
+from quoridor.constants import *
+from quoridor.board import Board
+from quoridor.history import wall_move, pawn_move
+from benchmarks.board_size import midgame, timed
+
+
+def full_clone(board):
+    """:return: Copy of board with its own tiles (Board.clone before copy on write)"""
+    a = Board(board.rows)
+    for i in range(len(board.board)):
+        for j in range(len(board.board[i])):
+            a.board[i][j]['occupied'] = board.board[i][j]['occupied']
+            a.board[i][j]['pos'] = board.board[i][j]['pos']
+            a.board[i][j]['walls'] = [*board.board[i][j]['walls']]
+    a.wall_mask = board.wall_mask
+    a.free_mask = board.free_mask
+    a.pieces = (board.pieces[0].clone(), board.pieces[1].clone())
+    return a
+
+
+def play(board, move):
+    if move.wall is None:
+        board.move(board.pieces[move.piece], move.end)
+    else:
+        board.place_wall(move.wall)
+
+
+def retained(board, moves, copy):
+    """:return: Bytes allocated per position when every position of the line is kept"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    positions = [board]
+    for move in moves:
+        board = copy(board)
+        play(board, move)
+        positions.append(board)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size / len(moves)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--positions', type=int, default=2000, help='length of the retained line of positions')
+    args = parser.parse_args()
+    game = midgame(args.rows, WALLS)
+    board = game.board
+    step = pawn_move(1, board.pieces[1].pos, sorted(board.pawn_moves(board.pieces[1].pos))[0])
+    wall = wall_move(1, board.free_slots()[0])
+    moves = [step, wall] * (args.positions // 2)  # alternate moves that change columns (copied on write)
+    copies = [('full copy', lambda b: full_clone(b)), ('copy on write', lambda b: b.clone())]
+    print(f'{args.rows}x{args.rows} board')
+    print(f'{"":<15}{"clone us":>10}{"+ move us":>11}{"+ wall us":>11}{"KB/position":>13}')
+    for name, copy in copies:
+        clone = timed(lambda: copy(board), args.repeat)
+        moved = timed(lambda: play(copy(board), step), args.repeat)
+        walled = timed(lambda: play(copy(board), wall), args.repeat)
+        size = retained(board, moves, copy)
+        print(f'{name:<15}{clone * 1e6:>10.1f}{moved * 1e6:>11.1f}{walled * 1e6:>11.1f}{size / 1024:>13.2f}')
+
+
+if __name__ == '__main__':
+    main()
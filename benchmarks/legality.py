@@ -0,0 +1,73 @@
+"""
+Wall legality (Board.can_place) compared to the depth first searches it replaced.
+
+For every mid-game position the benchmark checks all the wall slots of the board three ways: placing the wall and
+searching both pawns depth first on a graph of the whole board (can_place before the moves were generated per tile),
+the same on the moves generated per tile, and can_place, which accepts the walls that don't cut a shortest path
+without a search and searches best first toward the goal row for the others. can_place is timed from cold caches (the
+shortest paths are searched once per position) and warm. It checks that all agree and prints how many of the walls
+that fit on the board needed a search.
+
+Usage: python -m benchmarks.legality [--positions 8] [--rows 9] [--repeat 20]
+"""
+import argparse
+from quoridor import cache
+from quoridor.constants import *
+from benchmarks.board_size import midgame, timed
+
+
+def dfs_legal(board, wall, graph):
+    """:return: True if wall can be placed, by depth first searches (on a graph of the whole board if graph)"""
+    if not board.can_place_tech(wall):
+        return False
+    board.place_wall(wall)
+    moves = board._possible_moves() if graph else None
+    legal = board.DFS(WHITE, moves) and board.DFS(BLACK, moves)
+    board.unplace_wall(wall)
+    return legal
+
+
+def cold(board, slots):
+    """:return: can_place of every slot, starting without cached paths"""
+    cache.PATHS.clear()
+    cache.CUTS.clear()
+    return [board.can_place(wall) for wall in slots]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--positions', type=int, default=8, help='amount of mid-game positions')
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    searches = {
+        'graph dfs': lambda board, slots: [dfs_legal(board, wall, True) for wall in slots],
+        'dfs': lambda board, slots: [dfs_legal(board, wall, False) for wall in slots],
+        'cold': cold,
+        'warm': lambda board, slots: [board.can_place(wall) for wall in slots],
+    }
+    totals = dict.fromkeys(searches, 0.0)
+    print(f'{"position":>8}{"legal":>7}{"searched":>10}' + ''.join(f'{name + " ms":>13}' for name in searches))
+    for seed in range(args.positions):
+        board = midgame(args.rows, WALLS, seed).board
+        slots = board.geometry.slots
+        results = {name: search(board, slots) for name, search in searches.items()}
+        if any(result != results['dfs'] for result in results.values()):
+            print(f'position {seed}: the searches disagree')
+        white, black = board.path_cuts()
+        searched = sum(bool((white | black) >> board.geometry.slot_index[wall] & 1)
+                       for wall in slots if board.can_place_tech(wall))
+        line = f'{seed:>8}{sum(results["dfs"]):>7}{searched:>10}'
+        for name, search in searches.items():
+            seconds = timed(lambda: search(board, slots), args.repeat)
+            totals[name] += seconds
+            line += f'{seconds * 1e3:>13.2f}'
+        print(line)
+    print()
+    for name, seconds in totals.items():
+        print(f'{name:>10}: {seconds / args.positions * 1e3:.2f} ms per position, '
+              f'{totals["graph dfs"] / seconds:.1f}x graph dfs, {totals["dfs"] / seconds:.1f}x dfs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Memory used by the objects of the engine, measured with tracemalloc.
+
+Prints the size of one Game (with its Board and Pawns), the memory every retained clone costs, and the peak memory and
+time of one full minimax move (AI.minimax from the root, like AI.pick_move) from the mid-game position of
+benchmarks.board_size, once with the caches (emptied first) and once without them.
+
+Usage: python -m benchmarks.memory [--rows 9] [--clones 10000]
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from quoridor.constants import *
+from quoridor import cache
+from ai.algorithm import AI
+from benchmarks.board_size import midgame
+
+
+def size(obj):
+    """:return: Bytes of obj and its __dict__ (if it has one)"""
+    return sys.getsizeof(obj) + (sys.getsizeof(obj.__dict__) if hasattr(obj, '__dict__') else 0)
+
+
+def traced(func):
+    """:return: (result of func, bytes still allocated after it, peak bytes while it ran, seconds)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--clones', type=int, default=10000, help='amount of retained clones')
+    args = parser.parse_args()
+    game = midgame(args.rows, WALLS)
+    print(f'Game {size(game)} bytes, Board {size(game.board)} bytes, Pawn {size(game.board.pieces[0])} bytes')
+    _, current, _, seconds = traced(lambda: [game.clone() for _ in range(args.clones)])
+    print(f'{args.clones} clones: {current / args.clones:.0f} bytes and {seconds / args.clones * 1e6:.1f} us each')
+    game.turn = BLACK
+    limits = [c.max_entries for c in cache.CACHES]
+    for name, entries in (('cached', limits), ('no caches', [0] * len(limits))):  # without caches only the search
+        for c, limit in zip(cache.CACHES, entries):  # itself is measured
+            c.clear()
+            c.configure(max_entries=limit)
+        _, _, peak, seconds = traced(lambda: AI.minimax(game, 0, False))
+        print(f'minimax move ({name}): peak {peak / 2**20:.1f} MB, {seconds:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
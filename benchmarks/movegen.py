@@ -0,0 +1,68 @@
+"""
+Moves of one pawn (Board.pawn_moves) compared to the graph of the whole board (Board.possible_moves).
+
+For a few mid-game positions the benchmark times the moves of the pawn to move taken from a graph built for the
+position (the graph is cached, so this is the cost of a position that isn't cached yet), pawn_moves and the jump-free
+neighbours, then the searches that used the graph: can_place() over every free wall slot (depth first search) and the
+shortest paths of both pawns (breadth first search), once on the graph and once generating the moves of each tile when
+the search reaches it. It checks that both give the same moves, legal walls and paths.
+
+Usage: python -m benchmarks.movegen [--positions 4] [--rows 9] [--repeat 200]
+"""
+import argparse
+from quoridor.constants import *
+from benchmarks.board_size import midgame, timed
+
+
+def legal_walls(board, graph):
+    """:return: List of the free slots where a wall can be placed, searching on whole-board graphs if graph"""
+    legal = []
+    for wall in board.free_slots():
+        board.place_wall(wall)
+        moves = board._possible_moves() if graph else None
+        if board.DFS(WHITE, moves) and board.DFS(BLACK, moves):
+            legal.append(wall)
+        board.unplace_wall(wall)
+    return legal
+
+
+def paths(board, graph):
+    """:return: Shortest paths of white and black, searching on a whole-board graph if graph"""
+    moves = board._possible_moves() if graph else None
+    return board.BFS_SP(WHITE, moves), board.BFS_SP(BLACK, moves)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--positions', type=int, default=4, help='amount of mid-game positions')
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    totals = {}
+    print(f'{"position":>8}{"us":>15}{"graph":>10}{"on demand":>11}{"speedup":>9}')
+    for seed in range(args.positions):
+        board = midgame(args.rows, WALLS, seed).board
+        pos = board.pieces[0].pos
+        if board.pawn_moves(pos) != board._possible_moves()[pos] or legal_walls(board, True) != \
+                legal_walls(board, False) or paths(board, True) != paths(board, False):
+            print(f'position {seed}: the graph and the moves on demand disagree')
+        results = [('pawn moves', timed(lambda: board._possible_moves()[pos], args.repeat),
+                    timed(lambda: board.pawn_moves(pos), args.repeat * 10)),
+                   ('neighbours', timed(lambda: board._possible_moves()[pos], args.repeat),
+                    timed(lambda: board.neighbours(pos), args.repeat * 10)),
+                   ('can_place all', timed(lambda: legal_walls(board, True), max(1, args.repeat // 50)),
+                    timed(lambda: legal_walls(board, False), max(1, args.repeat // 50))),
+                   ('both paths', timed(lambda: paths(board, True), args.repeat),
+                    timed(lambda: paths(board, False), args.repeat))]
+        for name, graph, demand in results:
+            totals.setdefault(name, [0.0, 0.0])
+            totals[name][0] += graph
+            totals[name][1] += demand
+            print(f'{seed:>8}{name:>15}{graph * 1e6:>10.1f}{demand * 1e6:>11.1f}{graph / demand:>8.1f}x')
+    print()
+    for name, (graph, demand) in totals.items():
+        print(f'{name:>14}: {graph / demand:.1f}x faster on demand')
+
+
+if __name__ == '__main__':
+    main()
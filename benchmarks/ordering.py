@@ -0,0 +1,74 @@
+"""
+How much move ordering helps the pruning search.
+
+For every mid-game position the benchmark searches to the same depth with plain minimax, with alpha-beta in the
+order the moves are generated, with alpha-beta ordered by ai.ordering.MoveOrdering and with the iterative deepening
+of AI.search using the ordering (which also counts the shallower searches and following the principal variation,
+but orders with the killer moves and history they learned). It prints the nodes and seconds of each search, checks
+that all of them find the same value and prints the fraction of cutoffs that happened on the first move tried.
+
+Usage: python -m benchmarks.ordering [--positions 4] [--depth 2] [--rows 9] [--turns 12]
+"""
+import argparse
+import time
+from quoridor import cache
+from quoridor.constants import *
+from quoridor.instrumentation import STATS
+from ai.algorithm import AI
+from ai.ordering import MoveOrdering
+from benchmarks.board_size import midgame
+
+
+def measure(func):
+    """:return: Tuple (value, nodes, cutoffs, first move cutoffs, seconds) of one search"""
+    for c in cache.CACHES:  # every search starts from cold caches
+        c.clear()
+    STATS.end_move('reset')
+    start = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - start
+    counters = STATS.end_move('search')['counters']
+    return value, counters.get('nodes', 0), counters.get('cutoffs', 0), counters.get('first_cutoffs', 0), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--positions', type=int, default=4, help='amount of mid-game positions')
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--turns', type=int, default=None,
+                        help='turn counter of the positions (vertical walls are only searched after turn 10)')
+    args = parser.parse_args()
+    STATS.enable()
+    searches = {
+        'minimax': lambda game, ordering: AI.minimax(game, 0, game.turn == WHITE, None, args.depth)[0],
+        'alphabeta': lambda game, ordering: AI.alphabeta(game, 0, float('-inf'), float('inf'), game.turn == WHITE,
+                                                         None, args.depth)[0],
+        'ordered': lambda game, ordering: AI.alphabeta(game, 0, float('-inf'), float('inf'), game.turn == WHITE,
+                                                       None, args.depth, ordering)[0],
+        'deepening': lambda game, ordering: AI.search(game, args.depth, None, ordering)[1],
+    }
+    totals = {name: [0, 0, 0, 0.0] for name in searches}  # nodes, cutoffs, first move cutoffs, seconds
+    print(f'{"position":>8}{"search":>11}{"value":>8}{"nodes":>9}{"cutoffs":>9}{"first":>8}{"seconds":>9}')
+    for seed in range(args.positions):
+        game = midgame(args.rows, WALLS, seed)
+        if args.turns is not None:
+            game.turns = args.turns
+        values = set()
+        for name, func in searches.items():
+            value, nodes, cutoffs, first, seconds = measure(lambda: func(game, MoveOrdering()))
+            values.add(value)
+            for i, n in enumerate((nodes, cutoffs, first, seconds)):
+                totals[name][i] += n
+            rate = f'{first / cutoffs:.0%}' if cutoffs else '-'
+            print(f'{seed:>8}{name:>11}{value:>8.1f}{nodes:>9}{cutoffs:>9}{rate:>8}{seconds:>9.2f}')
+        if len(values) != 1:
+            print(f'position {seed}: the searches disagree on the value {sorted(values)}')
+    print()
+    for name, (nodes, cutoffs, first, seconds) in totals.items():
+        rate = f'{first / cutoffs:.1%}' if cutoffs else '-'
+        print(f'{name:>11}: {nodes} nodes, {seconds:.2f} s, first move cutoffs {rate}')
+
+
+if __name__ == '__main__':
+    main()
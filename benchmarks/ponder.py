@@ -0,0 +1,132 @@
+"""
+Headless check of the pondering AI (main.py --ponder) through the moves of the window.
+
+Plays a few turns against the minimax AI the way Main.main does it, without a window on screen: after every AI move the
+worker ponders on the human's time, the human then plays the reply the AI predicted best (a hit) or the one it
+predicted worst (a miss) in turns, and Main.ai_move is called every frame until the AI moved. It checks that the AI
+isn't shown as thinking on the human's turn, that ai_move starts exactly one search per AI turn and that every AI turn
+ends with a move, and prints how long each took. With --failures it checks instead that a pondering search that fails
+is searched again by start() when nobody waited for it, and is the error of the AI's move when start() waited for it.
+
+Usage: python -m benchmarks.ponder [--turns 4] [--think 3] [--timeout 60] [--failures]
+"""
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import argparse
+import sys
+import time
+from quoridor.game import Game
+from quoridor.history import History
+from ai.algorithm import AI, legal_moves, child
+from ai.ponder import PonderingWorker
+from main import Main
+
+
+class FailingAI:
+    """AI whose first searches raise RuntimeError"""
+    def __init__(self, failures, delay=0.0):
+        """
+        :param failures: Amount of searches that fail
+        :param delay: Seconds every search waits before it starts
+        """
+        self.failures = failures
+        self.delay = delay
+        self.ai = AI(1)
+
+    def do(self, game, stop=None):
+        time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('search failed')
+        return self.ai.do(game, stop)
+
+
+def wait(worker, timeout):
+    """:return: True if the worker's search finished (or failed) within timeout seconds"""
+    began = time.perf_counter()
+    while not worker.ready():
+        if time.perf_counter() - began > timeout:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def check_failures(game, timeout):
+    """:return: Amount of failures of the two failing pondering searches"""
+    failures = 0
+    worker = PonderingWorker(FailingAI(1))
+    worker.ponder(game)
+    time.sleep(0.5)  # the first prediction fails and the pondering stops
+    worker.start(worker.predict(game)[0])
+    try:
+        moved = wait(worker, timeout) and worker.take() is not None
+    except RuntimeError:
+        moved = False
+    print(f'failed pondering, nobody waiting: {"searched again" if moved else "no move"}')
+    failures += not moved
+    worker = PonderingWorker(FailingAI(1, delay=0.5))
+    worker.ponder(game)
+    time.sleep(0.1)  # start() waits for the pondering search of the reply
+    worker.start(worker.predict(game)[0])
+    try:
+        raised = wait(worker, timeout) and worker.take() is None
+    except RuntimeError:
+        raised = True
+    print(f'failed pondering, start() waiting: {"error of the move" if raised else "no error"}')
+    failures += not raised
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--turns', type=int, default=4, help='AI moves played')
+    parser.add_argument('--think', type=float, default=3, help='seconds the human thinks about each move')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds an AI move may take')
+    parser.add_argument('--failures', action='store_true', help='check pondering searches that fail')
+    args = parser.parse_args()
+    if args.failures:
+        failures = check_failures(Game(), args.timeout)
+        print('ok' if not failures else f'{failures} failures')
+        sys.exit(1 if failures else 0)
+    window = Main(3, ponder=True)
+    window.ai = AI(1)
+    window.worker = worker = PonderingWorker(window.ai)
+    window.game.init()
+    window.history = History(window.game)
+    starts = []
+    start = worker.start
+    worker.start = lambda game: starts.append(game.key()) or start(game)
+    failures = 0
+    for turn in range(args.turns):
+        if worker.thinking():
+            print(f'turn {turn}: thinking on the human\'s turn')
+            failures += 1
+        game = window.game
+        replies = worker.predict(game) if turn % 2 == 0 else [child(game, move) for move in legal_moves(game)[-1:]]
+        window.game = replies[0]  # the human's move
+        window.history.push(window.game.last_move, window.game)
+        starts.clear()
+        began = time.perf_counter()
+        while not window.ai_move():
+            if time.perf_counter() - began > args.timeout:
+                break
+            time.sleep(0.01)
+        seconds = time.perf_counter() - began
+        if window.game.turn == replies[0].turn or len(starts) != 1:  # the ai didn't move, or searched twice
+            print(f'turn {turn}: no move after {seconds:.1f} s, {len(starts)} searches started')
+            failures += 1
+            break
+        print(f'turn {turn}: {"best" if turn % 2 == 0 else "worst"} predicted reply answered with '
+              f'{window.game.last_move} in {seconds:.2f} s')
+        window.history.push(window.game.last_move, window.game)
+        worker.ponder(window.game)  # think about the answers while the human plays
+        time.sleep(args.think)
+    worker.cancel()
+    print(worker.summary())
+    print('ok' if not failures else f'{failures} failures')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
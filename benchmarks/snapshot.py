@@ -0,0 +1,29 @@
+"""
+Speed of the packed snapshots (Game.to_bytes / Game.from_bytes) compared to Game.clone().
+
+Usage: python -m benchmarks.snapshot [--rows 9] [--repeat 2000]
+"""
+import argparse
+from quoridor.constants import *
+from quoridor.game import Game
+from benchmarks.board_size import midgame, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+    game = midgame(args.rows, WALLS)
+    data = game.to_bytes()
+    results = [('clone()', timed(game.clone, args.repeat)),
+               ('to_bytes()', timed(game.to_bytes, args.repeat)),
+               ('from_bytes()', timed(lambda: Game.from_bytes(data), args.repeat)),
+               ('round trip', timed(lambda: Game.from_bytes(game.to_bytes()), args.repeat))]
+    print(f'{args.rows}x{args.rows} board, snapshot of {len(data)} bytes')
+    for name, seconds in results:
+        print(f'{name:<14}{seconds * 1e6:>10.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Stress test of the shared transposition table.
+
+Several processes store and probe random keys from one shared key space at the same time. Every entry is derived
+from its key, so a probe that returns a torn or mixed entry is counted as corrupted (must stay 0). Prints throughput,
+hit rate, collisions and usage. With --search the processes instead run minimax on the same positions (each starting
+from a different one) sharing the table, and the tt hit rates and search times are printed.
+
+Usage: python -m benchmarks.transposition [--processes 4] [--ops 200000] [--entries 65536] [--keys 200000] [--search]
+"""
+import argparse
+import random
+import time
+from multiprocessing import Process, Queue
+from ai.transposition import TranspositionTable, EXACT, KEY_MASK
+
+
+def entry_of(key):
+    """:return: (depth, score, move) that the stress test stores for key"""
+    return key % 7, float(key % 1000) / 10, key % 0xFFFF
+
+
+def stress(table, seed, ops, keys, results):
+    rng = random.Random(seed)
+    corrupted = 0
+    start = time.perf_counter()
+    for _ in range(ops):
+        key = (rng.randrange(keys) * 0x9E3779B97F4A7C15 & KEY_MASK) or 1  # spread the keys over the table
+        if rng.random() < 0.5:
+            depth, score, move = entry_of(key)
+            table.store(key, depth, EXACT, score, move)
+        else:
+            entry = table.probe(key)
+            if entry is not None and (entry[0], entry[2], entry[3]) != entry_of(key):
+                corrupted += 1
+    results.put({**table.stats(), 'seconds': time.perf_counter() - start, 'corrupted': corrupted})
+
+
+def search(table, positions, results):
+    from ai.algorithm import AI
+    from benchmarks.board_size import midgame
+    AI.transposition = table
+    start = time.perf_counter()
+    for seed in positions:
+        game = midgame(9, 10, seed)
+        AI.minimax(game, 0, game.turn == (255, 255, 255))
+    results.put({**table.stats(), 'seconds': time.perf_counter() - start, 'corrupted': 0})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--ops', type=int, default=200000, help='operations per process')
+    parser.add_argument('--entries', type=int, default=2**16, help='entries in the table')
+    parser.add_argument('--keys', type=int, default=200000, help='amount of different keys')
+    parser.add_argument('--search', action='store_true', help='run minimax searches instead of random operations')
+    args = parser.parse_args()
+    table = TranspositionTable(args.entries)
+    results = Queue()
+    if args.search:
+        positions = list(range(args.processes))  # every process starts from a different position and then searches
+        workers = [Process(target=search, args=(table, positions[i:] + positions[:i], results))  # the others' ones
+                   for i in range(args.processes)]
+    else:
+        workers = [Process(target=stress, args=(table, seed, args.ops, args.keys, results))
+                   for seed in range(args.processes)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    stats = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - start
+    print(f'{"process":>8}{"seconds":>10}{"ops/s":>12}{"hit rate":>10}{"collisions":>12}{"corrupted":>11}')
+    for i, s in enumerate(stats):
+        ops = s['probes'] + s['stores']
+        print(f'{i:>8}{s["seconds"]:>10.2f}{ops / s["seconds"]:>12.0f}{s["hit_rate"]:>10.1%}{s["collisions"]:>12}'
+              f'{s["corrupted"]:>11}')
+    total = sum(s['probes'] + s['stores'] for s in stats)
+    print(f'total: {total / wall:.0f} ops/s over {args.processes} processes, table usage {table.usage():.1%}')
+    table.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,19 @@
 import pygame
 import pygame.gfxdraw
 import collections
+import struct
 import sys
 from quoridor.constants import *
 from quoridor.game import Game
+from quoridor.history import History
+from quoridor import cache
+from quoridor.instrumentation import STATS
+from quoridor.profiler import PROFILER
 from ai.algorithm import AI
+from ai.worker import AIWorker
+from ai.ponder import PonderingWorker
 from network.client import Player_Client
+from network.telemetry import Reporter
 from threading import Thread
 import time
 
@@ -17,14 +25,20 @@ class Main:
                pygame.image.load('Quoridor-Rules.png'), pygame.image.load('White wins.png'),
                pygame.image.load('Black wins.png')]  # list of all images shown throughout game.
 
-    def __init__(self, typ):
+    def __init__(self, typ, ponder=False, telemetry=None, analysis=None):
         pygame.init()
         self.WIN = pygame.display.set_mode((WIDTH, HEIGHT))  # creates pygame display as main window
         pygame.display.set_caption('Quoridor')
         self.game = Game(False)  # self.game is a game which isn't initiated yet
         self.type = typ  # type of game. 1: local, 2: online 3: vs ai
+        self.ponder = ponder  # True if the minimax ai thinks during the human's turn
+        self.telemetry = telemetry  # file the network telemetry is written to (None - no telemetry lines)
+        self.reporter = None  # writes the telemetry of the client while playing online
+        self.analysis = analysis  # file of the minimax moves of earlier sessions (None - no analysis cache)
         self.ai = AI()  # AI engine, set as default value
-        self.game_stack = []  # stack of all games
+        self.worker = AIWorker(self.ai)  # runs the AI in the background while the window keeps running
+        self.clock = pygame.time.Clock()  # limits the frame rate while the AI thinks so the search gets the CPU
+        self.history = None  # History of the moves of the game, used for undo
         self.winners = {BLACK:self.black_wins, WHITE:self.white_wins,'W':self.black_wins, 'B':self.white_wins}
         # key to function to save pointless if statements. 'W' calls to black wins and vice versa because it will be
         # called when that color forfeits.
@@ -52,12 +66,19 @@ class Main:
 
     def ai_move(self):
         """
-        Do move for AI
+        Do move for AI. Starts the search in the background and applies its result once it's ready
+
+        :return: True if the AI moved
         """
+        if not self.worker.ready():
+            if not self.worker.thinking():
+                self.worker.start(self.game)
+            return False
         temp = self.game.turns  # to save the amount of turns
-        self.game = self.ai.do(self.game)
+        self.game = self.worker.take()
         self.game.turns = temp + 1  # correct amount of turns
         self.game.select((0, 0))  # deselect piece
+        return True
 
     def wait(self):
         screen = self.SCREENS[0]  # opening screen
@@ -97,81 +118,117 @@ class Main:
         """each human player can undo once throughout game. When undo_clicked[2] = True, undo can't be clicked
          (first turn or if ctrl z is already pressed)"""
         while run:
+            PROFILER.frame()  # one iteration of the loop is one frame
             screen = self.SCREENS[self.type]  # 1 if local multiplayer, 3 if AI
             if not self.game.started:  # while game hasn't been initiated
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:  # close screen
-                        run = False
-                    if event.type == pygame.MOUSEBUTTONUP and self.type == 1:  # start local game when screen is clicked
-                        self.game.init()
-                        self.game_stack.append(Game())  # add initial game to stack for undo
-                    if self.type == 3:
-                        if event.type == pygame.KEYUP:  # set up AI based on number clicked
-                            typ = pygame.key.name(event.key)
-                            try:
-                                self.ai = AI(int(typ))
-                            except ValueError:  # a string or incorrect number was entered
-                                pass  # the ai is the default
+                with PROFILER.phase('events'):
+                    for event in pygame.event.get():
+                        if event.type == pygame.QUIT:  # close screen
+                            run = False
+                        if event.type == pygame.MOUSEBUTTONUP and self.type == 1:  # start local game on click
                             self.game.init()
-                            self.game_stack.append(Game())  # the first item in the game stack is the initial game
-                self.WIN.blit(screen, (0,0))
-                pygame.display.update()
+                            self.history = History(self.game)  # history starts from the initial game
+                        if self.type == 3:
+                            if event.type == pygame.KEYUP:  # set up AI based on number clicked
+                                typ = pygame.key.name(event.key)
+                                try:
+                                    self.ai = AI(int(typ), self.analysis)
+                                    self.analysis = self.ai.analysis  # read once, shared by the ais of later games
+                                except ValueError:  # a string or incorrect number was entered
+                                    pass  # the ai is the default
+                                if self.ponder and self.ai.type == 1:
+                                    self.worker = PonderingWorker(self.ai)
+                                else:
+                                    self.worker = AIWorker(self.ai)
+                                self.game.init()
+                                self.history = History(self.game)  # history starts from the initial game
+                with PROFILER.phase('render'):
+                    self.WIN.blit(screen, (0,0))
+                    pygame.display.update()
             else:
                 if self.game.turns > 13 and not self.game.checked_for_winner:  # check for winner only when turn starts
-                    win = self.game.winner()
+                    with PROFILER.phase('logic'):
+                        win = self.game.winner()
                     if win:  # and only if its technically possible for there to be a winner (14 turns)
                         self.winners[win]()
                         break
                     self.game.checked_for_winner = True
                 if self.type == 1 or self.game.turn==WHITE:  # if a human player is playing
-                    for event in pygame.event.get():
-                        if event.type == pygame.QUIT:  # if the game was closed
-                            self.winners[tuple(255-i for i in self.game.turn)]()  # display player who didn't quit
-                            run = False
+                    with PROFILER.phase('events'):
+                        for event in pygame.event.get():
+                            if event.type == pygame.QUIT:  # if the game was closed
+                                self.winners[tuple(255-i for i in self.game.turn)]()  # display player who didn't quit
+                                run = False
 
-                        if event.type == pygame.MOUSEBUTTONUP:  # select tile
-                            pos = pygame.mouse.get_pos()
-                            temp = self.game.turns
-                            self.game.select(pos)
-                            if self.game.turns > temp and any(undo_clicked[0:2]):  # if the turn has changed
-                                self.game_stack.append(self.game.clone())  # and undo hasn't been used by both players
-                                self.game_stack[-1].turns = self.game.turns
-                                undo_clicked[2] = False
+                            if event.type == pygame.MOUSEBUTTONUP:  # select tile
+                                PROFILER.clicked()
+                                pos = pygame.mouse.get_pos()
+                                temp = self.game.turns
+                                with PROFILER.phase('logic'):
+                                    self.game.select(pos)
+                                if self.game.turns > temp:  # if the turn has changed, record the move
+                                    PROFILER.moved()  # the next frame shows the move of the click
+                                    self.history.push(self.game.last_move, self.game)
+                                    undo_clicked[2] = False
 
-                        if event.type == pygame.KEYUP:
-                            if event.key == pygame.K_SPACE:  # lift wall
-                                [self.game.lift_wall, self.game.unlift][self.game.wall_selected['sel']]()  # lift if not
-                                # lifted, don't lift if lifted
-                            if event.key == pygame.K_f:  # flip wall
-                                self.game.flip()
-                            if event.key == pygame.K_z and self.game.turns > 0:
-                                undo_clicked[2] = False
+                            if event.type == pygame.KEYUP:
+                                if event.key == pygame.K_SPACE:  # lift wall
+                                    [self.game.lift_wall, self.game.unlift][self.game.wall_lifted]()  # lift if not
+                                    # lifted, don't lift if lifted
+                                if event.key == pygame.K_f:  # flip wall
+                                    self.game.flip()
+                                if event.key == pygame.K_z and self.game.turns > 0:
+                                    undo_clicked[2] = False
                     keys = pygame.key.get_pressed()
                     if keys[pygame.K_LCTRL] and keys[pygame.K_z] and \
                             undo_clicked[self.game.turn==BLACK] and not undo_clicked[2]:  # if ctrl z has been clicked
-                        self.game_stack.pop()  # and the current player can undo
-                        self.game = self.game_stack[-1]
+                        with PROFILER.phase('logic'):
+                            self.history.undo(self.game)  # and the current player can undo
                         undo_clicked[self.game.turn==WHITE] = 0
                         print(f'{"White" if self.game.turn == WHITE or self.type == 3 else "Black"} undid turn.')
                         undo_clicked[2] = True
                         if self.type == 3:  # undo black and white move in case of AI
-                            self.game_stack.pop()
-                            self.game = self.game_stack[-1]
+                            self.history.undo(self.game)
+                            self.worker.cancel()  # the pondered replies are of the position that was undone
 
                 elif run and self.type == 3:  # it's ai's turn
-                    self.ai_move()
-                    if undo_clicked[0]:
-                        self.game_stack.append(self.game.clone())
-                        self.game_stack[-1].turns = self.game.turns
+                    with PROFILER.phase('events'):
+                        for event in pygame.event.get():  # the window keeps responding while the ai thinks
+                            if event.type == pygame.QUIT:
+                                self.worker.cancel()
+                                self.black_wins()  # the human player (white) quit
+                                run = False
+                    keys = pygame.key.get_pressed()
+                    with PROFILER.phase('ai'):  # starting the search and taking its result, it runs in its thread
+                        if run and keys[pygame.K_LCTRL] and keys[pygame.K_z] and undo_clicked[0] and \
+                                not undo_clicked[2]:
+                            self.worker.cancel()  # undo the white move the ai is thinking about
+                            self.history.undo(self.game)
+                            undo_clicked[0] = 0
+                            print('White undid turn.')
+                            undo_clicked[2] = True
+                        elif run and self.ai_move():
+                            self.history.push(self.game.last_move, self.game)
+                            self.worker.ponder(self.game)  # think about the answers while the human plays
+                        else:
+                            with PROFILER.phase('idle'):  # the frame rate is limited while the ai thinks
+                                self.clock.tick(30)
 
                 if run:
-                    self.game.update(self.WIN, pygame.mouse.get_pos())  # always update the screen
+                    with PROFILER.phase('render'):
+                        self.game.update(self.WIN, pygame.mouse.get_pos(), thinking=self.worker.thinking())
+                        # always update the screen
+                    PROFILER.presented()
 
     def connect(self):
         """
         Create client object with main object and connect to server. If connection fails, catch exception.
         """
         self.client = Player_Client(self)  # self.client -> client object. client.main -> self
+        if self.telemetry is not None:
+            if self.reporter is None:
+                self.reporter = Reporter([], sink=self.telemetry).start()
+            self.reporter.telemetries[:] = [self.client.telemetry]  # only the connection of the current game
         try:
             self.client.con()  # connect to server
         except (ConnectionAbortedError, ConnectionRefusedError, TimeoutError):
@@ -190,6 +247,28 @@ class Main:
             except ConnectionAbortedError:  # the connection has been forced to close due to exception
                 return
 
+    def resync(self, position):
+        """
+        Compare the position the other player sent after their move to the local game, and use it if they differ
+
+        :param position: Hex of Game.to_bytes()
+        """
+        local = self.game.to_bytes()
+        try:
+            data = bytes.fromhex(position)
+        except ValueError:  # message was cut
+            return
+        if len(data) != len(local) or data[:2] != local[:2]:  # cut between two bytes, or not the size of this game
+            return
+        if data != local:
+            try:
+                game = Game.from_bytes(data)
+            except (ValueError, IndexError, struct.error):  # not a position of this board
+                return
+            print('Out of sync with the other player, resyncing.')
+            self.game = game
+            self.history = History(self.game)
+
     def multi(self):
         """
         Multiplayer Game.
@@ -219,6 +298,7 @@ class Main:
                     self.client.close()
             pygame.display.update()
         self.game.init()  # start game
+        self.history = History(self.game)  # moves of both players, kept to replay or resync the game
         run = True  # for game loop
         Thread(target=self.client_listen).start()  # start constant listening
         turns = {BLACK:'B', WHITE:'W'}  # (0,0,0):'B", (255,255,255):'W"
@@ -229,10 +309,12 @@ class Main:
         print(f"You are {'Black' if self.client.color=='B' else 'White'}.")  # prints on screen player's color
         wall_selected_multi = False  # boolean to draw wall on board while the wall is lifted
         while run:
+            PROFILER.frame()
             if not self.playing:  # if the other thread stopped
                 return
             if self.game.turns > 13 and not self.game.checked_for_winner:  # if it's possible for there to be a winner
-                win = self.game.winner()
+                with PROFILER.phase('logic'):
+                    win = self.game.winner()
                 if win:
                     self.winners[win]()
                     self.playing = False
@@ -240,55 +322,73 @@ class Main:
                     break
                 self.game.checked_for_winner = True  # there's no winner. wait until next move and don't check again
             if turns[self.game.turn] == self.client.color:  # if it's the player's turn
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:  # if X was clicked
-                        print('You forfeit.')
-                        self.client.send('Q')  # let other client know that game is over
-                        self.winners[self.client.color]()
-                        self.client.close()
-                        return
-                    if event.type == pygame.MOUSEBUTTONUP:  # screen was clicked
-                        ms = pygame.mouse.get_pos()
-                        legal = self.game.select(ms)
-                        if legal != 'illegal':  # if the move was legal
-                            st = f"S{ms[0]:3d},{ms[1]:3d}"  # send coordinates to other player, always length 8
-                            wall_selected_multi = False  # for updating screen
-                            self.client.send(st)
-                        else:
-                            self.client.send('L')
-                    if event.type == pygame.KEYUP:
-                        if event.key == pygame.K_SPACE:
-                            self.game.lift_wall()
-                            wall_selected_multi = True
-                            self.client.send('L')
-                        if event.key == pygame.K_f:
-                            self.game.flip()
-                            self.client.send('F')
+                with PROFILER.phase('events'):
+                    for event in pygame.event.get():
+                        if event.type == pygame.QUIT:  # if X was clicked
+                            print('You forfeit.')
+                            self.client.send('Q')  # let other client know that game is over
+                            self.winners[self.client.color]()
+                            self.client.close()
+                            return
+                        if event.type == pygame.MOUSEBUTTONUP:  # screen was clicked
+                            PROFILER.clicked()
+                            ms = pygame.mouse.get_pos()
+                            temp = self.game.turns
+                            with PROFILER.phase('logic'):
+                                legal = self.game.select(ms)
+                            if legal != 'illegal':  # if the move was legal
+                                st = f"S{ms[0]:3d},{ms[1]:3d}"  # send coordinates to other player, always length 8
+                                wall_selected_multi = False  # for updating screen
+                                self.client.send(st)
+                            else:
+                                self.client.send('L')
+                            if self.game.turns > temp:  # a move was done, send the position so the other player can
+                                PROFILER.moved()
+                                self.history.push(self.game.last_move, self.game)  # check that it's in sync
+                                self.client.send('R' + self.game.to_bytes().hex())
+                        if event.type == pygame.KEYUP:
+                            if event.key == pygame.K_SPACE:
+                                self.game.lift_wall()
+                                wall_selected_multi = True
+                                self.client.send('L')
+                            if event.key == pygame.K_f:
+                                self.game.flip()
+                                self.client.send('F')
             else:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        print('You forfeit.')
-                        self.client.send('Q')
-                        self.winners[self.client.color]()
-                        self.client.close()
-                        return
+                with PROFILER.phase('events'):
+                    for event in pygame.event.get():
+                        if event.type == pygame.QUIT:
+                            print('You forfeit.')
+                            self.client.send('Q')
+                            self.winners[self.client.color]()
+                            self.client.close()
+                            return
 
-            self.game.update(self.WIN, pygame.mouse.get_pos() if wall_selected_multi else None, self.client.color)
-            self.client.send('0')  # send stream of data at all times
-            if len(self.que) > 0:  # if the request queue has data
-                received = self.que.popleft()  # get earliest message
-                place = received.find('S')  # if message contains S, returns position of s, else return -1
-                if place != -1:  # if message contains S
-                    self.game.select((int(received[place+1:place+4]), int(received[place+5:place+8])))  # select at pos
-                if 'L' in received:  # if other player lifted wall
-                    self.game.lift_wall()
-                if 'F' in received:  # if other player flipped wall
-                    self.game.flip()
-                if 'Q' in received:
-                    self.playing = False
-                    print('The other player has left the game.')
-                    self.winners[{'B':BLACK, 'W':WHITE}[self.client.color]]()
-                    return
+            with PROFILER.phase('render'):
+                self.game.update(self.WIN, pygame.mouse.get_pos() if wall_selected_multi else None, self.client.color)
+            PROFILER.presented()
+            with PROFILER.phase('network'):  # messages of the other player
+                self.client.send('0')  # send stream of data at all times
+                if len(self.que) > 0:  # if the request queue has data
+                    received = self.que.popleft()  # get earliest message
+                    place = received.find('S')  # if message contains S, returns position of s, else return -1
+                    if place != -1:  # if message contains S
+                        temp = self.game.turns
+                        self.game.select((int(received[place+1:place+4]), int(received[place+5:place+8])))
+                        if self.game.turns > temp:
+                            self.history.push(self.game.last_move, self.game)
+                    if 'L' in received:  # if other player lifted wall
+                        self.game.lift_wall()
+                    if 'F' in received:  # if other player flipped wall
+                        self.game.flip()
+                    place = received.find('R')  # resync: the other player's position after their move
+                    if place != -1:
+                        self.resync(received[place+1:place+1+2*len(self.game.to_bytes())])
+                    if 'Q' in received:
+                        self.playing = False
+                        print('The other player has left the game.')
+                        self.winners[{'B':BLACK, 'W':WHITE}[self.client.color]]()
+                        return
         return 0
 
 
@@ -297,5 +397,28 @@ if __name__ == '__main__':
         x = int(sys.argv[1])
     except (IndexError, ValueError):
         x = 0
-    create = Main(x)
+    if '--stats' in sys.argv:  # export the engine counters of every ai move to engine_stats.jsonl
+        STATS.enable('engine_stats.jsonl')
+    telemetry = 'network_telemetry.jsonl' if '--telemetry' in sys.argv else None  # traffic of online games
+    analysis = 'analysis.sqlite3' if '--analysis' in sys.argv else None  # remember the minimax moves between runs
+    if '--weights' in sys.argv:  # evaluate with the weights written by ai.tuning
+        Game.load_weights('weights.json')
+    if '--profile' in sys.argv:  # frame times and click to move latency, written to profile_trace.json at the end
+        PROFILER.enable()
+    create = Main(x, '--ponder' in sys.argv, telemetry, analysis)  # --ponder: minimax ai thinks on the human's time
     create.main()
+    if create.reporter is not None:
+        create.reporter.close()
+        print(create.client.telemetry.summary())
+    if create.ai.analysis is not None:
+        create.ai.analysis.close()
+        print(create.ai.analysis.summary())
+    if isinstance(create.worker, PonderingWorker):
+        print(create.worker.summary())
+    if PROFILER.enabled:
+        print(PROFILER.summary())
+        PROFILER.write_trace('profile_trace.json')  # Chrome trace format
+    if STATS.enabled:
+        print(STATS.summary())
+        print(cache.summary())
+        STATS.disable()
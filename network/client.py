@@ -1,4 +1,5 @@
 import socket
+from network.telemetry import Telemetry
 
 
 class Player_Client:
@@ -6,21 +7,29 @@ class Player_Client:
     HOST = 'localhost'
     PORT = 49550
 
-    def __init__(self, game):
+    def __init__(self, game, host=HOST, port=PORT):
         self.main = game  # self.main.client = self
+        self.address = (host, port)  # address of the server
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.telemetry = Telemetry('client')  # bytes, messages, queue depth and ping round trips
 
     def close(self):
         self.socket.close()
 
     def con(self):  # connect to server
-        self.socket.connect((Player_Client.HOST, Player_Client.PORT))  # connect to host, server
+        self.socket.connect(self.address)  # connect to host, server
         self.color = self.socket.recv(8).decode('UTF-8')  # color of player received by server
         self.socket.recv(1024)  # wait for signal that the game started
         self.main.connected = True  # inform main that connection has been established
 
     def request(self):  # receive info from server through socket and append to main's queue
-        self.main.que.append(self.socket.recv(1000).decode('UTF-8'))
+        data = self.socket.recv(1000).decode('UTF-8')
+        self.telemetry.received(data, keepalive=data != '' and data.strip('0') == '')
+        self.main.que.append(self.telemetry.incoming(data))  # without pings and pongs
+        self.telemetry.gauge('queue', len(self.main.que))
 
     def send(self, info):  # send info to server through socket
+        keepalive = info == '0'
+        info = self.telemetry.outgoing(info)  # add pongs and pings
+        self.telemetry.sent(info, keepalive)
         self.socket.send(info.encode('UTF-8'))
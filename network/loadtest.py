@@ -0,0 +1,313 @@
+"""
+Load test of the multiplayer server on localhost.
+
+Starts one server process per game (network/server.py plays one game of two players) and two headless bot clients per
+game that speak the protocol of main.Main.multi: "hello!" after connecting, then every round one message - "S x,y"
+(select the tile at pixel x,y), "L" (lift a wall), "F" (flip it), "R" + hex of Game.to_bytes() after a move, "Q"
+(leave) or "0" (nothing happened). The server relays in rounds (one message of white, then one of black), so the bots
+send one message and wait for the other player's one.
+
+The bots play along their shortest path and place random walls (--policy path) or play AI.search (--policy minimax),
+at --rate rounds per second (0 - as fast as the server relays). Prints the connection setup times, the move latency
+(a bot sends a tile selection until the other bot receives it) and round trip (a bot sends a message until the other
+player's message of the round arrives) percentiles, throughput and the CPU time and memory of the servers (from
+/proc, Linux only). --json prints the same report as one JSON object, to compare runs.
+
+Usage: python -m network.loadtest [--games 8] [--policy path] [--rate 60] [--walls-rate 0.2] [--port 49550] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # keep the output (--json) clean
+from collections import deque
+from multiprocessing import Process, Queue
+from threading import Thread
+from quoridor.constants import *
+from quoridor.game import Game
+from network.client import Player_Client
+from network.server import Server
+from ai.algorithm import AI, Deadline
+
+
+class Bot:
+    """
+    Headless player of one side of a game
+    """
+    def __init__(self, host, port, config, sent, seed):
+        """
+        :param host: Address of the server
+        :param port: Port of the server
+        :param config: Dict of policy, rate, walls_rate, max_turns and think (seconds per minimax move)
+        :param sent: Dict of color -> deque of the times the tile selections of that color were sent (shared by the
+        two bots of a game, the receiver pops them to measure the move latency)
+        :param seed: Seed of the random walls
+        """
+        self.address = (host, port)
+        self.config = config
+        self.sent = sent
+        self.rng = random.Random(seed)
+        self.que = deque()  # messages of the server (filled by Player_Client.request)
+        self.connected = False
+        self.game = Game()
+        self.color = None
+        self.plan = deque()  # the messages of the move that is being sent (a move takes 2 or 3 rounds)
+        size = 2 * len(self.game.to_bytes())  # the position after a move is sent as hex of a fixed length
+        self.tokens = re.compile(rf'S[ \d]{{3}},[ \d]{{3}}|R[0-9a-f]{{{size}}}|[LFQ]')  # messages that do something
+        self.result = {'connect': None, 'setup': None, 'latency': [], 'round_trip': [], 'messages': 0, 'moves': 0,
+                       'desyncs': 0, 'end': None}
+
+    def connect(self):
+        """
+        Connect to the server, retrying while it hasn't started listening yet, and wait for the start of the game
+        """
+        start = time.perf_counter()
+        while True:
+            self.client = Player_Client(self, *self.address)
+            try:
+                self.client.socket.connect(self.client.address)
+                break
+            except ConnectionRefusedError:
+                self.client.close()
+                if time.perf_counter() - start > 10:
+                    raise
+                time.sleep(0.02)
+                start = time.perf_counter()  # only the successful attempt counts
+        self.result['connect'] = time.perf_counter() - start
+        self.client.send('hello!')  # like Main.multi
+        # Under load the color, the signal that the game started and the first message of the other player can come in
+        # one packet, so exactly one byte of each is read
+        self.color = self.client.socket.recv(1).decode('UTF-8')
+        self.client.socket.recv(1)  # wait for signal that the game started
+        self.connected = True
+        self.result['setup'] = time.perf_counter() - start
+
+    def think(self):
+        """
+        :return: List of the messages of the next move of the bot (lifts and clicks, the same as a human's)
+        """
+        game = self.game
+        me = game.turn == BLACK
+        move = None
+        if self.config['policy'] == 'minimax':
+            copy = game.clone()
+            copy.turns = game.turns
+            line = AI.search(copy, 2, Deadline(self.config['think']))[2]
+            move = line[0] if line else None
+        elif game.walls_remaining[me] and self.rng.random() < self.config['walls_rate']:
+            walls = game.board.free_slots()
+            wall = self.rng.choice(walls) if walls else None
+            if wall is not None and game.board.can_place(wall):
+                return ['L'] + ['F'] * (game.wall_dir != wall[1]) + [game.pixel(wall[0])]
+        if move is not None and move.wall is not None:
+            return ['L'] + ['F'] * (game.wall_dir != move.wall[1]) + [game.pixel(move.wall[0])]
+        start = game.board.pieces[me].pos
+        end = move.end if move is not None else game.board.goal_path(game.turn)[1]
+        return [game.pixel(start), game.pixel(end)]
+
+    def message(self):
+        """
+        Do the next step of the bot's move on its own game
+
+        :return: Message that tells the other player about it
+        """
+        game = self.game
+        if game.turn != {'W': WHITE, 'B': BLACK}[self.color] or game.winner() is not None:
+            return '0'
+        if game.turns >= self.config['max_turns']:
+            self.result['end'] = 'turns'
+            return 'Q'
+        if not self.plan:
+            self.plan.extend(self.think())
+        step = self.plan.popleft()
+        if step == 'L':
+            game.lift_wall()
+            return 'L'
+        if step == 'F':
+            game.flip()
+            return 'F'
+        turns, color = game.turns, game.turn
+        game.select(step)
+        self.sent[color].append(time.perf_counter())
+        message = f"S{step[0]:3d},{step[1]:3d}"
+        if game.turns > turns:  # the move is done, send the position like Main.multi
+            self.result['moves'] += 1
+            message += 'R' + game.to_bytes().hex()
+        return message
+
+    def receive(self, received):
+        """
+        Apply the other player's messages to the bot's game (like Main.multi). Several messages of the other player can
+        arrive together, since it may be a round ahead (black's hello! is its message of the first round)
+
+        :return: False if the game is over
+        """
+        game = self.game
+        for token in self.tokens.findall(received):
+            if token[0] == 'S':
+                self.result['latency'].append(time.perf_counter() - self.sent[game.turn].popleft())
+                game.select((int(token[1:4]), int(token[5:8])))
+            elif token == 'L':
+                game.lift_wall()
+            elif token == 'F':
+                game.flip()
+            elif token[0] == 'R':
+                self.result['desyncs'] += token[1:] != game.to_bytes().hex()
+            else:  # Q
+                self.result['end'] = 'turns'
+                return False
+        return True
+
+    def run(self):
+        self.connect()
+        silent = self.color == 'B'  # black's hello! is its message of the first round
+        delay = 1 / self.config['rate'] if self.config['rate'] else 0
+        message = None
+        end = time.perf_counter() + self.config['timeout']
+        while True:
+            start = time.perf_counter()
+            if start > end:
+                self.result['end'] = 'timeout'
+                break
+            if not silent:
+                message = self.message()
+                sent = time.perf_counter()  # after thinking
+                self.client.send(message)
+                self.result['messages'] += 1
+            self.client.request()
+            if not silent:
+                self.result['round_trip'].append(time.perf_counter() - sent)
+            silent = False
+            received = self.que.popleft()
+            if not self.receive(received) or message == 'Q':
+                break
+            if self.game.winner() is not None:  # the winner may close before the server relays its last message
+                self.result['end'] = 'won'
+                break
+            if not received:  # the server closed the connection
+                self.result['end'] = self.result['end'] or 'closed'
+                break
+            time.sleep(max(0.0, delay - (time.perf_counter() - start)))
+        self.client.close()
+
+
+def play(index, host, port, config, results):
+    """
+    Play one game between two bots (runs in its own process) and put the results of both in results
+    """
+    sent = {WHITE: deque(), BLACK: deque()}
+    bots = [Bot(host, port, config, sent, index * 2 + i) for i in range(2)]
+    threads = [Thread(target=bot.run, daemon=True) for bot in bots]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(config['timeout'])
+    results.put([bot.result for bot in bots])
+
+
+def proc_usage(pid):
+    """:return: (CPU seconds, resident memory in bytes) of process pid, None if it's unknown (not Linux, exited)"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/status') as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith('VmRSS'))
+    except (OSError, StopIteration):
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK'), rss
+
+
+def percentiles(values):
+    """:return: Dict of the 50th, 90th, 99th percentile and maximum of values in milliseconds"""
+    values = sorted(values)
+    if not values:
+        return {}
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': values[-1] * 1000}
+
+
+def run(games, host, port, config):
+    """
+    Run games at the same time, each on its own server (ports port, port+1, ...)
+
+    :return: Dict of the report
+    """
+    servers = [subprocess.Popen([sys.executable, '-m', 'network.server', '--host', host, '--port', str(port + i)],
+                                stdout=subprocess.DEVNULL) for i in range(games)]
+    results = Queue()
+    start = time.perf_counter()
+    players = [Process(target=play, args=(i, host, port + i, config, results)) for i in range(games)]
+    for player in players:
+        player.start()
+    usage = {}  # server pid -> last (CPU seconds, memory)
+    bots = []
+    while len(bots) < 2 * games:
+        for server in servers:
+            sample = proc_usage(server.pid)
+            if sample is not None:
+                cpu, rss = usage.get(server.pid, (0, 0))
+                usage[server.pid] = (max(cpu, sample[0]), max(rss, sample[1]))
+        while not results.empty():
+            bots.extend(results.get())
+        if not any(player.is_alive() for player in players) and results.empty():  # a game process crashed
+            break
+        time.sleep(0.05)
+    seconds = time.perf_counter() - start
+    for player in players:
+        player.join()
+    for server in servers:
+        if server.poll() is None:
+            server.kill()
+        server.wait()
+    messages = sum(bot['messages'] for bot in bots)
+    return {'games': games, 'seconds': seconds,
+            'ends': {end: [str(bot['end']) for bot in bots].count(end) for end in {str(bot['end']) for bot in bots}},
+            'desyncs': sum(bot['desyncs'] for bot in bots),
+            'connect_ms': percentiles([bot['connect'] for bot in bots if bot['connect'] is not None]),
+            'setup_ms': percentiles([bot['setup'] for bot in bots if bot['setup'] is not None]),
+            'latency_ms': percentiles([t for bot in bots for t in bot['latency']]),
+            'round_trip_ms': percentiles([t for bot in bots for t in bot['round_trip']]),
+            'messages_per_s': messages / seconds, 'moves_per_s': sum(bot['moves'] for bot in bots) / seconds,
+            'server_cpu_s': sum(cpu for cpu, _ in usage.values()) / len(usage) if usage else None,
+            'server_rss_mb': max(rss for _, rss in usage.values()) / 2**20 if usage else None}
+
+
+def report(r):
+    """:return: Text of the report of run()"""
+    lines = [f'{r["games"]} games in {r["seconds"]:.1f} s, how the bots ended: {r["ends"]}, desyncs: {r["desyncs"]}',
+             f'{"ms":<12}{"p50":>9}{"p90":>9}{"p99":>9}{"max":>9}']
+    for name in ('connect', 'setup', 'latency', 'round_trip'):
+        p = r[name + '_ms']
+        lines.append(f'{name:<12}' + ''.join(f'{p.get(q, float("nan")):>9.2f}' for q in ('p50', 'p90', 'p99', 'max')))
+    lines.append(f'throughput: {r["messages_per_s"]:.0f} messages/s, {r["moves_per_s"]:.1f} moves/s')
+    if r['server_cpu_s'] is not None:
+        lines.append(f'server: {r["server_cpu_s"]:.2f} CPU s per game '
+                     f'({r["server_cpu_s"] / r["seconds"]:.1%} of a core), max RSS {r["server_rss_mb"]:.1f} MB')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--games', type=int, default=8, help='games played at the same time')
+    parser.add_argument('--policy', choices=('path', 'minimax'), default='path', help='how the bots choose moves')
+    parser.add_argument('--rate', type=float, default=60, help='rounds per second of every bot (0 - no limit)')
+    parser.add_argument('--walls-rate', type=float, default=0.2, help='chance of a wall instead of a step (path)')
+    parser.add_argument('--think', type=float, default=1, help='seconds per move (minimax)')
+    parser.add_argument('--max-turns', type=int, default=200, help='the bots stop the game after these turns')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds a game may take')
+    parser.add_argument('--host', default=Server.HOST)
+    parser.add_argument('--port', type=int, default=Server.PORT, help='port of the first server')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args()
+    config = {'policy': args.policy, 'rate': args.rate, 'walls_rate': args.walls_rate, 'think': args.think,
+              'max_turns': args.max_turns, 'timeout': args.timeout}
+    result = run(args.games, args.host, args.port, config)
+    print(json.dumps(result) if args.json else report(result))
+
+
+if __name__ == '__main__':
+    main()
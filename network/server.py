@@ -1,5 +1,8 @@
+import argparse
 import socket
+import sys
 import time
+from network.telemetry import Telemetry, Reporter
 
 
 class PlayerOneLeft(Exception):  # special exception when player one leaves the game
@@ -11,9 +14,16 @@ class Server:
     HOST = 'localhost'
     PORT = 49550
 
-    def __init__(self):
+    def __init__(self, host=HOST, port=PORT, telemetries=None):
+        """
+        :param telemetries: List the Telemetry of both players is added to (for a Reporter), None if not needed
+        """
+        self.telemetry = (Telemetry('player1'), Telemetry('player2'))  # bytes and messages relayed from each player
+        if telemetries is not None:
+            telemetries.extend(self.telemetry)
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # ipv4, tcp
-        self.socket.bind((Server.HOST, Server.PORT))  # binding socket to address and port
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # restart right after the previous game
+        self.socket.bind((host, port))  # binding socket to address and port
         self.conn1 = self.conn2 = self.address1 = self.address2 = None
         self.connect()
 
@@ -39,18 +49,48 @@ class Server:
     def send(self):  # transfer information between the clients
         while True:
             try:
-                self.conn2.sendall(self.conn1.recv(1000))
-                self.conn1.sendall(self.conn2.recv(1000))
+                data = self.conn1.recv(1000)
+                if not data:  # player 1 closed the connection (recv would return b'' forever)
+                    break
+                self.relay(data, *self.telemetry)
+                self.conn2.sendall(data)
+                data = self.conn2.recv(1000)
+                if not data:
+                    break
+                self.relay(data, *reversed(self.telemetry))
+                self.conn1.sendall(data)
             except (ConnectionResetError, ConnectionAbortedError, OSError):  # if one of the players leaves,
                 # stop loop and close
-                self.socket.close()
-                return
+                break
+        self.socket.close()
+
+    @staticmethod
+    def relay(data, source, target):
+        """Count data that is relayed from the player of telemetry source to the player of target"""
+        keepalive = data.strip(b'0') == b''  # only "0" messages (several can arrive together)
+        source.received(data, keepalive)
+        target.sent(data, keepalive)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Quoridor server for one game of two players')
+    parser.add_argument('--host', default=Server.HOST)
+    parser.add_argument('--port', type=int, default=Server.PORT)
+    parser.add_argument('--telemetry', help='file the traffic of both players is written to as JSON lines')
+    parser.add_argument('--interval', type=float, default=10, help='seconds between telemetry lines')
+    parser.add_argument('--metrics-port', type=int, help='serve the current telemetry as JSON on this local port')
+    args = parser.parse_args()
+    telemetries = []
+    reporter = None
+    if args.telemetry or args.metrics_port:
+        reporter = Reporter(telemetries, args.interval, args.telemetry or sys.stderr, args.metrics_port).start()
     print('Server Initiated.')
     try:
-        server = Server()
+        server = Server(args.host, args.port, telemetries)
     except PlayerOneLeft:
         print('Server shutting down because a player left before the game began. Please start over.')
+    if reporter is not None:
+        reporter.close()
+        for telemetry in telemetries:
+            print(telemetry.summary())
     print('Server Closed.')
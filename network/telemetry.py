@@ -0,0 +1,189 @@
+import json
+import re
+import sys
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Event, Lock
+
+PING_EVERY = 5  # seconds between pings of a client
+PING = re.compile(r'([po])(\d+)')  # p<ms> ping, o<ms> pong. Lowercase, so old clients ignore them (see Main.multi)
+
+
+class Telemetry:
+    """
+    Counters and gauges of one connection: bytes and messages in each direction (keepalives "0" counted apart), depth
+    of the queue of received messages and the round trip times of pings.
+
+    A client adds a ping "p<ms>" (its own clock in milliseconds) to a message every PING_EVERY seconds. The other
+    client strips it from what it received and adds the pong "o<ms>" to its next message, so the round trip goes
+    through the server twice, the same way a move does.
+    """
+    def __init__(self, name):
+        """
+        :param name: Name of the connection in the summaries
+        """
+        self.name = name
+        self.counters = defaultdict(int)
+        self.gauges = {}  # name -> [last, max, sum, samples]
+        self.rtts = deque(maxlen=1000)  # seconds of the last round trips
+        self.pongs = deque()  # pongs to add to the next message
+        self.last_ping = time.perf_counter()
+        self.started = time.time()
+        self.lock = Lock()  # sending and receiving run in different threads
+
+    def sent(self, data, keepalive=False):
+        """
+        Count a message that was sent
+
+        :param data: The message (str or bytes)
+        :param keepalive: True if the message only keeps the stream going ("0")
+        """
+        with self.lock:
+            self.counters['messages_out'] += 1
+            self.counters['bytes_out'] += len(data)
+            if keepalive:
+                self.counters['keepalives_out'] += 1
+                self.counters['keepalive_bytes_out'] += len(data)
+
+    def received(self, data, keepalive=False):
+        """
+        Count a message that was received (one recv, which may hold several messages of the other side)
+        """
+        with self.lock:
+            self.counters['messages_in'] += 1
+            self.counters['bytes_in'] += len(data)
+            if keepalive:
+                self.counters['keepalives_in'] += 1
+                self.counters['keepalive_bytes_in'] += len(data)
+
+    def gauge(self, name, value):
+        """
+        Record the current value of gauge name (depth of a queue...)
+        """
+        with self.lock:
+            gauge = self.gauges.setdefault(name, [0, value, 0, 0])
+            gauge[0] = value
+            gauge[1] = max(gauge[1], value)
+            gauge[2] += value
+            gauge[3] += 1
+
+    def outgoing(self, info):
+        """
+        :param info: Message that is about to be sent
+        :return: The message with the pongs that are due and a ping if it's time for one
+        """
+        while self.pongs:
+            info += self.pongs.popleft()
+        now = time.perf_counter()
+        if now - self.last_ping >= PING_EVERY:
+            self.last_ping = now
+            info += f'p{int(now * 1000)}'
+        return info
+
+    def incoming(self, text):
+        """
+        :param text: Text that was received
+        :return: The text without pings and pongs. Pings are answered with the next message, pongs give a round trip
+        """
+        if 'p' not in text and 'o' not in text:
+            return text
+        now = time.perf_counter()
+        for kind, ms in PING.findall(text):
+            if kind == 'p':
+                self.pongs.append(f'o{ms}')
+            else:
+                with self.lock:
+                    self.rtts.append(now - int(ms) / 1000)
+        return PING.sub('', text)
+
+    def snapshot(self):
+        """:return: Dict of the counters, gauges (last, max, mean) and round trip percentiles (ms)"""
+        with self.lock:
+            rtts = sorted(self.rtts)
+            result = {'name': self.name, 'seconds': round(time.time() - self.started, 1), **self.counters}
+            for name, (last, most, total, samples) in self.gauges.items():
+                result[name] = {'last': last, 'max': most, 'mean': round(total / samples, 2)}
+        if rtts:
+            pick = lambda q: round(rtts[min(len(rtts) - 1, int(q * len(rtts)))] * 1000, 2)
+            result['rtt_ms'] = {'p50': pick(0.5), 'p90': pick(0.9), 'max': pick(1), 'samples': len(rtts)}
+        return result
+
+    def summary(self):
+        """:return: One line summary for the console"""
+        s = self.snapshot()
+        text = (f'{self.name}: {s.get("messages_out", 0)} messages / {s.get("bytes_out", 0)} bytes out '
+                f'({s.get("keepalive_bytes_out", 0)} bytes of keepalives), {s.get("messages_in", 0)} messages / '
+                f'{s.get("bytes_in", 0)} bytes in')
+        if 'queue' in s:
+            text += f', queue max {s["queue"]["max"]} mean {s["queue"]["mean"]}'
+        if 'rtt_ms' in s:
+            text += f', rtt p50 {s["rtt_ms"]["p50"]} ms p90 {s["rtt_ms"]["p90"]} ms'
+        return text
+
+
+class Reporter:
+    """
+    Writes the snapshots of some connections as JSON lines every interval seconds, and serves the current ones as JSON
+    on http://host:port/ (a local metrics endpoint) if a port is given
+    """
+    def __init__(self, telemetries, interval=10, sink=None, port=None, host='localhost'):
+        """
+        :param telemetries: List of Telemetry objects (a list, so connections can be added later)
+        :param interval: Seconds between lines
+        :param sink: Path or file object of the lines (None - stdout)
+        :param port: Port of the metrics endpoint (None - no endpoint)
+        """
+        self.telemetries = telemetries
+        self.interval = interval
+        self.opened = isinstance(sink, str)  # the sink is closed with the reporter only if it opened it
+        self.sink = open(sink, 'a') if self.opened else sink or sys.stdout
+        self.stop = Event()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.http = None
+        if port is not None:
+            reporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    body = json.dumps(reporter.snapshot()).encode('UTF-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):  # no line on the console for every request
+                    pass
+
+            self.http = ThreadingHTTPServer((host, port), Handler)
+            Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def snapshot(self):
+        return {'time': round(time.time(), 3), 'connections': [t.snapshot() for t in self.telemetries]}
+
+    def write(self):
+        """Write the current snapshot as one line"""
+        self.sink.write(json.dumps(self.snapshot()) + '\n')
+        self.sink.flush()
+
+    def _run(self):
+        while not self.stop.wait(self.interval):
+            self.write()
+
+    def close(self):
+        """
+        Stop the periodic lines (writing a last one) and the endpoint
+        """
+        if self.stop.is_set():
+            return
+        self.stop.set()
+        self.write()
+        if self.http is not None:
+            self.http.shutdown()
+        if self.opened:
+            self.sink.close()
@@ -1,37 +1,110 @@
 import pygame.gfxdraw
 from .pieces import *
+from .instrumentation import STATS
+from .geometry import geometry, MOVE_ORDER, SIDES, STEPS
+from . import cache
 from collections import defaultdict, deque
+from heapq import heappush, heappop
+
+_BACKGROUNDS = {}  # rows -> Surface of the static part of the board (see Board.background)
 
 
 class Board:
-    def __init__(self):
+    __slots__ = ('board', 'rows', 'tile_width', 'tile_height', 'starts', 'goals', 'geometry', 'wall_mask', 'free_mask',
+                 'owned', 'pieces')
+
+    def __init__(self, rows=ROWS):
+        """
+        :param rows: Amount of rows and columns of the board
+        """
         self.board = []
+        self.rows = rows
+        self.tile_width = WIDTH // rows  # Width of a tile on screen
+        self.tile_height = BOARD_HEIGHT // rows  # Height of a tile on screen
+        self.starts = (((rows-1)//2, rows-1), ((rows-1)//2, 0))  # Starting positions of white and black
+        self.goals = ({(i, 0) for i in range(rows)}, {(i, rows-1) for i in range(rows)})  # Top row, bottom row
+        self.geometry = geometry(rows)  # Precomputed tables of the board
+        self.wall_mask = 0  # Bit i is set if there's a wall in slot i (see Geometry.slots)
+        self.free_mask = self.geometry.all_slots  # Bit i is set if slot i doesn't conflict with any placed wall
         self.create_board()
-        self.pieces = (Pawn(WHITE, WHITE_START), Pawn(BLACK, BLACK_START))
+        tile = (self.tile_width, self.tile_height)
+        self.pieces = (Pawn(WHITE, self.starts[0], tile), Pawn(BLACK, self.starts[1], tile))
 
     def create_board(self):
         """
-        Creates Board as 2d list. Creates ROWS*ROWS board of tiles, adds white piece on bottom and black piece on top
+        Creates Board as 2d list. Creates rows*rows board of tiles, adds white piece on bottom and black piece on top
         """
-        self.board = [[{'occupied':False, 'pos':(j*TILE_WIDTH, MARGIN+i*TILE_HEIGHT),
-                        'walls':[False for _ in range(4)]} for i in range(ROWS)] for j in range(ROWS)]
-        self.board[WHITE_START[0]][WHITE_START[1]]['occupied'] = True
-        self.board[BLACK_START[0]][BLACK_START[1]]['occupied'] = True
+        self.board = [[{'occupied':False, 'pos':(j*self.tile_width, MARGIN+i*self.tile_height),
+                        'walls':[False for _ in range(4)]} for i in range(self.rows)] for j in range(self.rows)]
+        for x, y in self.starts:
+            self.board[x][y]['occupied'] = True
+        self.owned = set(range(self.rows))  # Columns of self.board that no other board shares (see clone)
 
     def __getitem__(self, item):
         return self.board[item]
 
     def clone(self):
-        a = Board()
-        for i in range(len(self.board)):
-            for j in range(len(self.board[i])):
-                a.board[i][j]['occupied'] = self.board[i][j]['occupied']
-                a.board[i][j]['pos'] = self.board[i][j]['pos']
-                walls = self.board[i][j]['walls']
-                a.board[i][j]['walls'] = [*walls]
+        """
+        Copy on write: the copy shares the columns of tiles with this board, and a column is only copied by the first
+        board that changes it (see column). A clone that changes nothing costs one list of column references
+
+        :return: Copy of the board
+        """
+        STATS.count('clones')
+        a = Board.__new__(Board)  # Don't build a new board of tiles
+        for name in Board.__slots__:
+            setattr(a, name, getattr(self, name))
+        a.board = [*self.board]
+        a.owned = set()
+        self.owned = set()  # The columns are shared now, so this board has to copy them before changing them too
         a.pieces = (self.pieces[0].clone(), self.pieces[1].clone())
         return a
 
+    def column(self, x):
+        """
+        :param x: Column of the board
+        :return: Column x of tiles that can be changed (copied first if another board shares it)
+        """
+        if x not in self.owned:
+            STATS.count('column_copies')
+            self.board[x] = [{'occupied': tile['occupied'], 'pos': tile['pos'], 'walls': [*tile['walls']]}
+                             for tile in self.board[x]]
+            self.owned.add(x)
+        return self.board[x]
+
+    def key(self):
+        """
+        :return: Hashable key of the position of the pawns and walls
+        """
+        return self.rows, self.pieces[0].pos, self.pieces[1].pos, self.wall_mask
+
+    def mirror_key(self):
+        """
+        :return: key() of the board mirrored left to right
+        """
+        last = self.rows - 1
+        (wx, wy), (bx, by) = self.pieces[0].pos, self.pieces[1].pos
+        return self.rows, (last - wx, wy), (last - bx, by), self.geometry.mirror_mask(self.wall_mask)
+
+    def canonical_key(self):
+        """
+        The board is symmetric left to right, so a position and its mirror image have the same moves mirrored, the
+        same shortest path lengths and the same value
+
+        :return: Tuple (key, mirrored): the smaller of key() and mirror_key() (the same for a position and its mirror
+        image), and True if it is the mirrored one
+        """
+        key, mirrored = self.key(), self.mirror_key()
+        return (mirrored, True) if mirrored < key else (key, False)
+
+    def symmetric(self):
+        """
+        :return: True if the board is its own mirror image (both pawns on the middle column and symmetric walls)
+        """
+        middle = self.rows - 1
+        return self.pieces[0].pos[0] * 2 == middle and self.pieces[1].pos[0] * 2 == middle and \
+            self.geometry.mirror_mask(self.wall_mask) == self.wall_mask
+
     def get_piece(self, pos):
         """:param pos: Row,col of tile
         :return: The piece that is in the tile. (0 if no piece is in tile)"""
@@ -41,25 +114,43 @@ class Board:
             return self.pieces[1]
         return 0
 
+    def background(self, win):
+        """
+        The parts of the board that never change are drawn once per size of the board and reused by every frame
+
+        :param win: Surface the background will be drawn on (the background gets its pixel format)
+        :return: Surface of the margins, the board and the outlines of the tiles
+        """
+        surface = _BACKGROUNDS.get(self.rows)
+        if surface is None:
+            surface = pygame.Surface((WIDTH, HEIGHT), 0, win)
+            pygame.draw.rect(surface, TAN, pygame.Rect(0, 0, WIDTH, MARGIN))  # Top margin
+            pygame.draw.rect(surface, BROWN, pygame.Rect(0, MARGIN, WIDTH, BOARD_HEIGHT))  # Board background
+            pygame.draw.rect(surface, TAN, pygame.Rect(0, MARGIN + BOARD_HEIGHT, WIDTH, MARGIN))  # Bottom margin
+            tw, th = self.tile_width, self.tile_height
+            for i in range(self.rows):
+                for j in range(self.rows):  # For every single tile on board
+                    rect = pygame.Rect(self.board[i][j]['pos'], (tw, th))  # Pygame rectangle of tile
+                    pygame.draw.rect(surface, TAN, rect, 4)
+            _BACKGROUNDS[self.rows] = surface
+        return surface
+
     def draw(self, win):
         """
         Draws board (and margins)
 
         :param win: Screen (window)
         """
-        pygame.draw.rect(win, TAN, pygame.Rect(0, 0, WIDTH, MARGIN))  # Top margin
-        pygame.draw.rect(win, BROWN, pygame.Rect(0, MARGIN, WIDTH, BOARD_HEIGHT))  # Board background
-        pygame.draw.rect(win, TAN, pygame.Rect(0, MARGIN + BOARD_HEIGHT, WIDTH, MARGIN))  # Bottom margin
-        for i in range(ROWS):
-            for j in range(ROWS):  # For every single tile on board
-                rect = pygame.Rect(self.board[i][j]['pos'], (TILE_WIDTH, TILE_HEIGHT))  # Pygame rectangle of tile
-                pygame.draw.rect(win, TAN, rect, 4)
+        win.blit(self.background(win), (0, 0))  # Margins and tiles
+        tw, th = self.tile_width, self.tile_height
+        for i in range(self.rows):
+            for j in range(self.rows):  # For every single tile on board
                 if self.board[i][j]['walls'][0]:  # If the item isn't False
-                    pygame.draw.line(win, RED, (i * TILE_WIDTH, j * TILE_HEIGHT + MARGIN - 1),
-                                     (i * TILE_WIDTH, (j + 1) * TILE_HEIGHT+MARGIN), WALL_WIDTH + 1)
+                    pygame.draw.line(win, RED, (i * tw, j * th + MARGIN - 1),
+                                     (i * tw, (j + 1) * th+MARGIN), WALL_WIDTH + 1)
                 if self.board[i][j]['walls'][1]:
-                    pygame.draw.line(win, RED, (i * TILE_WIDTH - 1, j * TILE_HEIGHT + MARGIN),
-                                     ((i + 1) * TILE_WIDTH, j * TILE_HEIGHT + MARGIN), WALL_WIDTH + 1)
+                    pygame.draw.line(win, RED, (i * tw - 1, j * th + MARGIN),
+                                     ((i + 1) * tw, j * th + MARGIN), WALL_WIDTH + 1)
         for pawn in self.pieces:
             pawn.draw(win)
 
@@ -70,8 +161,8 @@ class Board:
         :param piece: Moving piece
         :param pos: New position
         """
-        self.board[piece.pos[0]][piece.pos[1]]['occupied'] = False  # The tile the piece was in is no longer occupied
-        self.board[pos[0]][pos[1]]['occupied'] = True  # The tile the piece is moving to is now occupied.
+        self.column(piece.pos[0])[piece.pos[1]]['occupied'] = False  # The tile the piece was in is no longer occupied
+        self.column(pos[0])[pos[1]]['occupied'] = True  # The tile the piece is moving to is now occupied.
         piece.move(pos)
 
     def place_wall(self, wall):
@@ -80,17 +171,11 @@ class Board:
 
         :param wall: Tuple (pos, dir)
         """
-        x,y = wall[0]  # x:row, y:col
-        if wall[1] == 1:  # If wall is vertical
-            self.board[x][y]['walls'][0] = True
-            self.board[x-1][y]['walls'][2] = True
-            self.board[x][y+1]['walls'][0] = True
-            self.board[x-1][y+1]['walls'][2] = True
-        else:  # If wall is horizontal
-            self.board[x][y]['walls'][1] = True
-            self.board[x][y-1]['walls'][3] = True
-            self.board[x+1][y]['walls'][1] = True
-            self.board[x+1][y-1]['walls'][3] = True
+        slot = self.geometry.slot_index[wall]
+        for x, y, side in self.geometry.blocked[slot]:  # The 4 tile sides the wall blocks
+            self.column(x)[y]['walls'][side] = True
+        self.wall_mask |= 1 << slot
+        self.free_mask &= ~self.geometry.conflicts[slot]
 
     def unplace_wall(self, wall):
         """
@@ -98,17 +183,11 @@ class Board:
 
         :param wall: Tuple of (pos, dir)
         """
-        x,y = wall[0]  # row,col of top/left point of wall
-        if wall[1] == 1:
-            self.board[x][y]['walls'][0] = 0
-            self.board[x-1][y]['walls'][2] = 0
-            self.board[x][y+1]['walls'][0] = 0
-            self.board[x-1][y+1]['walls'][2] = 0
-        else:  # If wall is horizontal
-            self.board[x][y]['walls'][1] = 0
-            self.board[x][y-1]['walls'][3] = 0
-            self.board[x+1][y]['walls'][1] = 0
-            self.board[x+1][y-1]['walls'][3] = 0
+        slot = self.geometry.slot_index[wall]
+        for x, y, side in self.geometry.blocked[slot]:
+            self.column(x)[y]['walls'][side] = False
+        self.wall_mask &= ~(1 << slot)
+        self.free_mask = self.geometry.free_slots(self.wall_mask)  # Other walls may still block the conflicting slots
 
     def can_place_tech(self, wall):
         """
@@ -117,102 +196,170 @@ class Board:
         :param wall: Tuple -> pos, direction
         :return: True if wall can be placed, False if not (Doesn't place wall either case)
         """
-        x, y = wall[0]
-        if y > ROWS-1 or y < 0:
-            return False
-        if wall[1] == 1:
-            if x == 0 or x == ROWS or y >= ROWS-1 or y < 0:
-                return False
-            if self.board[x][y]['walls'][0] or self.board[x][y+1]['walls'][0]:  # If theres a wall in same col and pos
-                return False
-            if self.board[x-1][y+1]['walls'][1] and self.board[x][y+1]['walls'][1]:  # If wall is crossing another wall
-                return False
-        else:
-            if x >= ROWS-1 or x < 0 or y == 0 or y == ROWS:
-                return False
-            if self.board[x][y]['walls'][1] or self.board[x+1][y]['walls'][1]:  # If theres a wall in same row and pos
-                return False
-            if self.board[x+1][y-1]['walls'][0] and self.board[x+1][y]['walls'][0]:  # If wall is crossing another wall
-                return False
-        return True
+        slot = self.geometry.slot_index.get(wall)
+        return slot is not None and bool(self.free_mask >> slot & 1)
+
+    def free_slots(self):
+        """
+        :return: List of all walls (pos, dir) that can be placed technically, horizontal walls first
+        """
+        free, slots = self.free_mask, self.geometry.slots
+        return [slots[i] for i in range(len(slots)) if free >> i & 1]
 
     def can_place(self, wall):
         """
-        Checks if a wall can be placed at pos
+        Checks if a wall can be placed at pos. A wall that doesn't block a step of a pawn's shortest path leaves that
+        path open, so only the pawns whose path it cuts are searched for (see path_cuts and reaches)
 
         :param wall: Tuple -> (pos, dir) -> ((int,int), int)
         :return: Whether wall can be placed or not
         """
+        STATS.count('can_place')
         x = False
-        if self.can_place_tech(wall):  # If walls aren't intercepting, crossing each other
-            self.place_wall(wall)  # Place wall (only for sake of seeing if move is illegal
-            possible = self.possible_moves()  # Only needed for DFS function. Dict of all moves
-            x = self.DFS(WHITE, possible) and self.DFS(BLACK, possible)  # True if there is a path to end
-            self.unplace_wall(wall)  # Unplace wall (this function is only supposed to check if the wall can be placed)
+        with STATS.timer('legality'):
+            if self.can_place_tech(wall):  # If walls aren't intercepting, crossing each other
+                bit = 1 << self.geometry.slot_index[wall]
+                white, black = self.path_cuts()
+                x = True
+                if (white | black) & bit:  # The wall blocks a step of a shortest path
+                    self.place_wall(wall)  # Place wall (only for sake of seeing if move is illegal
+                    x = (not white & bit or self.reaches(WHITE)) and (not black & bit or self.reaches(BLACK))
+                    self.unplace_wall(wall)  # Unplace wall (this function only checks if the wall can be placed)
         return x  # If move is legal, return true else false
 
+    def path_cuts(self):
+        """
+        Cached masks of the wall slots that block a step of the shortest path of each pawn: a wall in none of them
+        leaves both paths open. Jumps are blocked by walls before and behind the other pawn, side steps by walls before
+        it and between it and the tile beside it
+
+        :return: Tuple (mask of white, mask of black), every slot for a pawn without a path
+        """
+        key = self.key()
+        cuts = cache.CUTS.get(key)
+        if cuts is None:
+            cuts = (self._path_cuts(self.goal_path(WHITE)), self._path_cuts(self.goal_path(BLACK)))
+            cache.CUTS.put(key, cuts)
+        return cuts
+
+    def _path_cuts(self, path):
+        if not isinstance(path, list):  # No path, every wall needs the search
+            return self.geometry.all_slots
+        blockers = self.geometry.blockers
+        mask = 0
+        for (x, y), (nx, ny) in zip(path, path[1:]):
+            dx, dy = nx - x, ny - y
+            if abs(dx) + abs(dy) == 1:  # Step to the next tile
+                mask |= blockers[(x, y, STEPS.index((dx, dy)))]
+            elif dx == 0 or dy == 0:  # Jump over the pawn in between
+                d = STEPS.index((dx // 2, dy // 2))
+                mask |= blockers[(x, y, d)] | blockers[(x + dx // 2, y + dy // 2, d)]
+            else:  # Diagonal move beside the pawn next to (x, y)
+                for px, py in ((nx, y), (x, ny)):  # Both if both tiles have pawns
+                    if self.board[px][py]['occupied']:
+                        mask |= blockers[(x, y, STEPS.index((px - x, py - y)))] | \
+                                blockers[(px, py, STEPS.index((nx - px, ny - py)))]
+        return mask
+
+    def reaches(self, color):
+        """
+        Best first search: is there a path from the pawn of color color to its goal row? The tiles with the fewest
+        rows left to the goal are tried first, so on an open board the search walks straight there, and it stops at
+        the first move onto the goal row. The moves are the same as in DFS (pawn_moves)
+
+        :param color: Color of the pawn
+        :return: True if there is a path, False if there isn't
+        """
+        STATS.count('reach')
+        start = self.pieces[color == BLACK].pos
+        goal = 0 if color == WHITE else self.rows - 1  # goal row
+        if start[1] == goal:
+            return True
+        seen = {start}
+        heap = [(abs(goal - start[1]), start)]  # (rows left, tile)
+        while heap:
+            node = heappop(heap)[1]
+            for neighbor in self.pawn_moves(node):
+                if neighbor[1] == goal:
+                    return True
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    heappush(heap, (abs(goal - neighbor[1]), neighbor))
+        return False
+
     def possible_moves(self):
+        """
+        :return: Graph of moves: default dict of pos -> set of positions a pawn in pos can move to. The graph is cached
+        and shared, it must not be changed
+        """
+        key = self.key()
+        moves = cache.MOVES.get(key)
+        if moves is None:
+            STATS.count('movegen')
+            with STATS.timer('movegen'):
+                moves = self._possible_moves()
+            cache.MOVES.put(key, moves)
+        return moves
+
+    def _possible_moves(self):
         moves = defaultdict(set)
-        for x in range(ROWS):
-            for y in range(ROWS):
-                walls = self.board[x][y]['walls']
-                if y > 0 and not walls[1]:  # Moving up -> No wall above and not on top row
-                    if self.board[x][y-1]['occupied']:  # If the tile above is occupied
-                        if y-1>0 and not self.board[x][y-1]['walls'][1]:  # If no wall (or border) over piece above
-                            moves[(x,y)].add((x, y-2))
-                        else:  # If there's a wall over the piece above
-                            if not self.board[x][y-1]['walls'][0] and x>0:  # If there's no wall left of piece above
-                                moves[(x,y)].add((x-1,y-1))
-                            if not self.board[x][y-1]['walls'][2] and x<ROWS-1:  # If no wall right of piece above
-                                moves[(x,y)].add((x+1,y-1))
-                    else:  # If the tile above is empty
-                        moves[(x,y)].add((x, y-1))
-                if x > 0 and not walls[0]:  # Moving left -> No wall on the left and not on first column
-                    if self.board[x-1][y]['occupied']:  # If the tile to the left is occupied
-                        if x-1>0 and not self.board[x-1][y]['walls'][0]:  # If there's no wall behind piece to the left
-                            moves[(x,y)].add((x-2, y))
-                        else:  # If there is a wall (or border) behind the piece to the left
-                            if not self.board[x-1][y]['walls'][1] and y>0:  # If there's no wall above piece to the left
-                                moves[(x,y)].add((x-1,y-1))
-                            if not self.board[x-1][y]['walls'][3] and y<ROWS-1:  # If no wall below piece to the left
-                                moves[(x,y)].add((x-1,y+1))
-                    else:  # If the tile to the left is empty
-                        moves[(x,y)].add((x-1, y))
-                if x < ROWS - 1 and not walls[2]:  # Moving right -> No wall on the right and not on last column
-                    if self.board[x+1][y]['occupied']:  # If the tile to the right is occupied
-                        if x+1<ROWS-1 and not self.board[x+1][y]['walls'][2]:  # If no wall behind piece to right
-                            moves[(x,y)].add((x+2, y))
-                        else:  # If there is a wall (or border) behind piece to right
-                            if not self.board[x+1][y]['walls'][1] and y>0:  # If there's no wall above piece to right
-                                moves[(x,y)].add((x+1,y-1))
-                            if not self.board[x+1][y]['walls'][3] and y<ROWS-1:  # If no wall below piece to right
-                                moves[(x,y)].add((x+1,y+1))
-                    else:  # If the tile to the right is empty
-                        moves[(x,y)].add((x+1, y))
-
-                if y < ROWS - 1 and not walls[3]:  # Moving down -> No wall beneath and not on bottom row
-                    if self.board[x][y+1]['occupied']:  # If the tile below is occupied
-                        if y+1<ROWS-1 and not self.board[x][y+1]['walls'][3]:  # If there's no wall under piece below
-                            moves[(x,y)].add((x, y+2))
-                        else:  # If there's a wall under the piece below
-                            if not self.board[x][y+1]['walls'][0] and x>0:  # If there's no wall left of piece below
-                                moves[(x,y)].add((x-1,y+1))
-                            if not self.board[x][y+1]['walls'][2] and x<ROWS-1:  # If no wall right of piece below
-                                moves[(x,y)].add((x+1,y+1))
-                    else:  # If the tile below is empty
-                        moves[(x,y)].add((x, y+1))
+        for x in range(self.rows):
+            for y in range(self.rows):
+                targets = self.pawn_moves((x, y))
+                if targets:
+                    moves[(x, y)] = targets
         return moves
 
-    def BFS_SP(self, color, moves):
+    def pawn_moves(self, pos):
+        """
+        Moves of a pawn in pos, computed for that tile only (possible_moves()[pos] without building the whole graph)
+
+        :param pos: Position of the pawn
+        :return: Set of positions the pawn can move to: the free tiles next to it, the tile behind the other pawn or,
+        if there's a wall (or border) behind it, the tiles beside the other pawn
+        """
+        neighbours = self.geometry.neighbours
+        walls = self.board[pos[0]][pos[1]]['walls']
+        near = neighbours[pos]
+        moves = set()
+        for d in MOVE_ORDER:  # up, left, right, down
+            if walls[d] or near[d] is None:  # Wall or border in direction d
+                continue
+            nx, ny = near[d]
+            tile = self.board[nx][ny]
+            if not tile['occupied']:  # If the tile in direction d is empty
+                moves.add(near[d])
+            elif not tile['walls'][d] and neighbours[near[d]][d] is not None:  # No wall behind the piece
+                moves.add(neighbours[near[d]][d])  # jump over it
+            else:  # If there's a wall (or border) behind the piece, move diagonally to its sides
+                for side in SIDES[d]:
+                    if not tile['walls'][side] and neighbours[near[d]][side] is not None:
+                        moves.add(neighbours[near[d]][side])
+        return moves
+
+    def neighbours(self, pos):
+        """
+        :param pos: Position of a tile
+        :return: List of the tiles next to pos that no wall separates from it, in MOVE_ORDER. Pawns are ignored (no
+        jumps), for searches in which the pawns don't matter, like distances to a goal row
+        """
+        walls = self.board[pos[0]][pos[1]]['walls']
+        near = self.geometry.neighbours[pos]
+        return [near[d] for d in MOVE_ORDER if not walls[d] and near[d] is not None]
+
+    def BFS_SP(self, color, moves=None):
         """
         Breadth First Search: Shortest path from start to goal.
 
         :param color: Color of piece
-        :param moves: Graph (default dict) of possible moves
+        :param moves: Graph (default dict) of possible moves (None - the moves of every tile are generated when the
+        search reaches it, see pawn_moves)
         :return: Shortest path or infinity if no path
         """
+        STATS.count('bfs')
+        targets = self.pawn_moves if moves is None else moves.__getitem__
         start = self.pieces[color==BLACK].pos  # start is the position of the pawn of color Color
-        goal = TOP_ROW if color==WHITE else BOTTOM_ROW
+        goal = self.goals[color==BLACK]
         seen = set()  # set of all edges (keys) already checked
         queue = deque()
         queue.append([start])  # queue is a queue of lists of the shortest paths
@@ -222,7 +369,7 @@ class Board:
             path = queue.popleft()  # one path is removed from the head of the queue
             node = path[-1]  # node = last edge in path
             if node not in seen:  # if node hasn't been explored yet, if it was explored, this couldn't be shortest path
-                neighbors = moves[node]  # neighbors -> list of all edges that node can reach
+                neighbors = targets(node)  # neighbors -> list of all edges that node can reach
                 for neighbor in neighbors:
                     new_path = [*path, neighbor]  # queue will append a new path for each of the neighbors of node
                     queue.append(new_path)
@@ -231,21 +378,39 @@ class Board:
                 seen.add(node)  # check given node as seen
         return float("Inf")  # If the queue was completely checked and emptied, there's no path
 
-    def DFS(self, color, moves):
+    def goal_path(self, color):
+        """
+        Cached BFS_SP on the moves of this board
+
+        :param color: Color of piece
+        :return: Shortest path of the piece to its goal or infinity if no path
+        """
+        key = (self.key(), color)
+        path = cache.PATHS.get(key)
+        if path is None:
+            path = self.BFS_SP(color)
+            cache.PATHS.put(key, path)
+        return path
+
+    def DFS(self, color, moves=None):
         """
         Depth first search - Find if there is a path from piece of color color to the goal
 
         :param color: Color of piece being checked
-        :param moves: Graph of moves
+        :param moves: Graph of moves (None - the moves of every tile are generated when the search reaches it)
         :return: True if there is a path, False if there isn't
         """
+        STATS.count('dfs')
+        targets = self.pawn_moves if moves is None else moves.__getitem__
         start = self.pieces[color == BLACK].pos  # start is the position of the piece of color 'color'
-        goal = TOP_ROW if color == WHITE else BOTTOM_ROW  # if piece is black, they need to get to bottom, vice versa
+        goal = self.goals[color == BLACK]  # if piece is black, they need to get to bottom, vice versa
         seen, stack = set(), [start]  # seen is set of visited positions, stack is the stack used to check
         while stack:  # while the stack isn't empty
             node = stack.pop()  # node is the last element of the stack, a pos on the board
+            if node in seen:  # pushed again before it was checked
+                continue
             seen.add(node)  # add current node to all nodes that have been checked
-            for neighbor in moves[node]:  # for every move that can be done at pos node
+            for neighbor in targets(node):  # for every move that can be done at pos node
                 if neighbor in goal:  # if neighbor is in the goal row
                     return True
                 if neighbor not in seen:  # if neighbor hasn't been checked yet
@@ -259,5 +424,5 @@ class Board:
         """
         if self.pieces[0].pos[1] == 0:  # if white piece is in top row
             return WHITE
-        if self.pieces[1].pos[1] == ROWS-1:  # if black piece is in bottom row
+        if self.pieces[1].pos[1] == self.rows-1:  # if black piece is in bottom row
             return BLACK
@@ -0,0 +1,102 @@
+import sys
+from collections import OrderedDict
+from threading import Lock
+from .instrumentation import STATS
+
+
+def graph_size(moves):
+    """:return: Approximate bytes used by a graph of moves (dict of sets of positions)"""
+    return sys.getsizeof(moves) + sum(sys.getsizeof(targets) for targets in moves.values())
+
+
+class LRUCache:
+    """
+    Bounded cache that forgets the least recently used entries once it has more than max_entries entries or their
+    estimated size is more than max_bytes. Keys are position keys (Board.key() / Game.key()).
+    """
+    def __init__(self, name, max_entries=100000, max_bytes=None, sizeof=sys.getsizeof):
+        """
+        :param name: Name of the cache in the statistics
+        :param max_entries: Maximum amount of entries
+        :param max_bytes: Maximum estimated size of all values (None - no limit)
+        :param sizeof: Function that estimates the size of a value in bytes
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.data = OrderedDict()  # key -> (value, size), least recently used first
+        self.bytes = 0  # estimated size of all values
+        self.hits = self.misses = self.evictions = 0
+        self.lock = Lock()  # the cache is shared by the window and the AI threads
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        """
+        :return: Value of key (default if it isn't cached)
+        """
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+        STATS.count('cache_hits')
+        return entry[0]
+
+    def put(self, key, value):
+        """
+        Cache value under key and evict the least recently used entries that don't fit
+        """
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        with self.lock:
+            if key in self.data:
+                self.bytes -= self.data.pop(key)[1]
+            self.data[key] = (value, size)
+            self.bytes += size
+            while len(self.data) > self.max_entries or self.max_bytes is not None and self.bytes > self.max_bytes:
+                self.bytes -= self.data.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def configure(self, max_entries=None, max_bytes=None):
+        """
+        Change the limits of the cache (None - keep the current limit). Entries that don't fit anymore are evicted on
+        the next put
+        """
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """:return: Dict of the size, hit rate and evictions of the cache"""
+        lookups = self.hits + self.misses
+        return {'name': self.name, 'entries': len(self.data), 'bytes': self.bytes, 'hits': self.hits,
+                'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions}
+
+
+# Caches shared by the whole engine (minimax, the simple AIs and the window)
+MOVES = LRUCache('moves', max_entries=20000, max_bytes=64 * 2**20, sizeof=graph_size)  # Board.key() -> moves graph
+PATHS = LRUCache('paths', max_entries=200000, max_bytes=32 * 2**20)  # (Board.key(), color) -> shortest path or inf
+EVALUATIONS = LRUCache('evaluations', max_entries=200000, max_bytes=16 * 2**20)  # Game.canonical_key() -> evaluate()
+CUTS = LRUCache('cuts', max_entries=200000, max_bytes=16 * 2**20)  # Board.key() -> Board.path_cuts()
+CACHES = (MOVES, PATHS, EVALUATIONS, CUTS)
+
+
+def summary():
+    """:return: Table of the statistics of all caches"""
+    lines = [f'{"cache":<14}{"entries":>10}{"MB":>8}{"hit rate":>10}{"evictions":>11}']
+    for cache in CACHES:
+        s = cache.stats()
+        lines.append(f'{s["name"]:<14}{s["entries"]:>10}{s["bytes"] / 2**20:>8.1f}{s["hit_rate"]:>10.1%}'
+                     f'{s["evictions"]:>11}')
+    return '\n'.join(lines)
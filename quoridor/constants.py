@@ -1,5 +1,7 @@
 import pygame.font
 from datetime import datetime
+from functools import wraps
+from .instrumentation import STATS
 pygame.font.init()
 
 # Sizes
@@ -41,7 +43,15 @@ LIGHT_PINK = (214, 105, 255)
 
 
 def timeit(func):
+    """
+    Time func. When the engine instrumentation is enabled the time is added to the phase func.__name__, otherwise it
+    is printed.
+    """
+    @wraps(func)
     def inner(*args, **kwargs):
+        if STATS.enabled:
+            with STATS.timer(func.__name__):
+                return func(*args, **kwargs)
         tim = datetime.now()
         x = func(*args, **kwargs)
         print(f'{func.__name__} executed in {datetime.now()-tim}')
@@ -1,31 +1,67 @@
+import json
+import struct
 from .board import Board
 from .pieces import *
+from .instrumentation import STATS
+from .profiler import PROFILER
+from .history import pawn_move, wall_move
+from . import cache
+
+
+HEADER = struct.Struct('<BBBBBBBH')  # rows, walls, white tile, black tile, walls remaining x2, turn, ply
+
+# Features of a position for evaluate, all from white's side (positive is good for white) and the same for a position
+# and its mirror image. Raise TypeError if a pawn has no path
+FEATURES = {
+    'path': lambda game: len(game.board.goal_path(BLACK)) - len(game.board.goal_path(WHITE)),  # shortest paths
+    'walls': lambda game: game.walls_remaining[0] - game.walls_remaining[1],  # walls left
+    'mobility': lambda game: len(game.board.pawn_moves(game.board.pieces[0].pos)) -
+                             len(game.board.pawn_moves(game.board.pieces[1].pos)),  # moves of the pawns
+    'rows': lambda game: game.rows - 1 - game.board.pieces[1].pos[1] - game.board.pieces[0].pos[1],  # rows to go
+    'turn': lambda game: 1 if game.turn == WHITE else -1,  # side to move
+}
+DEFAULT_WEIGHTS = {'path': 1.0, 'walls': 0.1}  # weights of the features in evaluate, the others weigh 0
 
 
 class Game:
     """
     Game class
     """
-    def __init__(self, init=True):
+    __slots__ = ('rows', 'walls', 'started', 'turns', 'checked_for_winner', 'selected', 'wall_lifted', 'wall_dir',
+                 'turn', 'board', 'valid_moves', 'walls_remaining', 'last_move')  # No __dict__, search creates many games
+    terms = tuple((weight, FEATURES[name]) for name, weight in DEFAULT_WEIGHTS.items())
+    # (weight, feature) of the features evaluate adds up, only the ones that don't weigh 0 (see set_weights)
+
+    def __init__(self, init=True, rows=ROWS, walls=WALLS):
+        """
+        :param init: Start the game right away
+        :param rows: Amount of rows and columns of the board
+        :param walls: Amount of walls each player starts with
+        """
+        self.rows = rows
+        self.walls = walls
         if init:
             self.init()
         else:
             self.started = False
 
-    def init(self):
+    def init(self, board=None):
         """
         Start game (or reset)
+
+        :param board: Board to play on (None - new board)
         """
         self.started = True
         self.turns = 0
         self.checked_for_winner = False
         self.selected = None  # No tile is selected
-        self.wall_selected = {'sel':False, 'dir':1}  # No wall is lifted
+        self.wall_lifted = False  # No wall is lifted
+        self.wall_dir = 1  # Direction of the lifted wall: Horizontal-0, Vertical-1
         self.turn = WHITE  # First turn is WHITE
-        self.board = Board()  # Create board
-        self.winner = lambda: self.board.winner()  # Returns winner (None if no one is winning)
+        self.board = Board(self.rows) if board is None else board  # Create board
         self.valid_moves = set()  # Set of valid moves for selected piece (currently empty because no piece is selected)
-        self.walls_remaining = [WALLS,WALLS]  # First is player 1, second is player 2. Walls left for each player
+        self.walls_remaining = [self.walls, self.walls]  # First is player 1, second is player 2. Walls left for each player
+        self.last_move = None  # Delta of the last move that was done (quoridor.history.Move)
 
     def clone(self):
         """
@@ -33,12 +69,96 @@ class Game:
 
         :return: Copy
         """
-        new_game = Game()
+        STATS.count('clones')
+        new_game = Game(init=False, rows=self.rows, walls=self.walls)
+        new_game.init(self.board.clone())  # Only the board of self is copied, not a new one built and thrown away
         new_game.turn = self.turn
-        new_game.board = self.board.clone()
         new_game.walls_remaining = [*self.walls_remaining]
         return new_game
 
+    def winner(self):
+        """
+        :return: Winner (None if no one is winning)
+        """
+        return self.board.winner()
+
+    def key(self):
+        """
+        :return: Hashable key of the position: pawns, walls, walls remaining and turn (not the amount of turns)
+        """
+        return (*self.board.key(), *self.walls_remaining, self.turn == BLACK)
+
+    def canonical_key(self):
+        """
+        :return: Tuple (key, mirrored): key() of the position or of its mirror image, whichever is smaller (see
+        Board.canonical_key), and True if it is the mirror image
+        """
+        key, mirrored = self.board.canonical_key()
+        return (*key, *self.walls_remaining, self.turn == BLACK), mirrored
+
+    def to_bytes(self, ply=True):
+        """
+        Packs the position: HEADER (9 bytes) followed by the bits of the wall slots (16 bytes on a 9*9 board).
+        Equal positions always give equal bytes.
+
+        :param ply: Include the amount of turns (False - 0 is written, for keys that ignore it)
+        :return: bytes
+        """
+        return self.pack(self.board.key(), self.turns if ply else 0)
+
+    def canonical_bytes(self):
+        """
+        :return: Tuple (bytes, mirrored): to_bytes() of the position or of its mirror image without the amount of
+        turns, whichever Board.canonical_key picks (the same for a position and its mirror image), and True if it is
+        the mirror image
+        """
+        key, mirrored = self.board.canonical_key()
+        return self.pack(key, 0), mirrored
+
+    def pack(self, board_key, ply):
+        """
+        :param board_key: Board.key() of the board that is packed (or its mirror image)
+        :param ply: Amount of turns that is written
+        :return: bytes like to_bytes()
+        """
+        rows, white, black, mask = board_key
+        geo = self.board.geometry
+        header = HEADER.pack(rows, self.walls, geo.cell_index[white], geo.cell_index[black], *self.walls_remaining,
+                             self.turn == BLACK, ply)
+        return header + mask.to_bytes((len(geo.slots) + 7) // 8, 'little')
+
+    @staticmethod
+    def from_bytes(data):
+        """
+        Raise ValueError if the pawns share a tile, walls cross or overlap or are off the board or a pawn has no path
+        to its goal, and IndexError if a tile is off the board
+
+        :param data: bytes from to_bytes()
+        :return: New game in the packed position
+        """
+        rows, walls, white, black, white_walls, black_walls, turn, ply = HEADER.unpack_from(data)
+        game = Game(rows=rows, walls=walls)
+        board = game.board
+        geo = board.geometry
+        if white == black:
+            raise ValueError('both pawns on one tile')
+        board.move(board.pieces[0], geo.cells[white])
+        board.move(board.pieces[1], geo.cells[black])
+        mask = int.from_bytes(data[HEADER.size:], 'little')
+        while mask:
+            low = mask & -mask
+            slot = low.bit_length() - 1
+            if not board.free_mask >> slot & 1:  # off the board, or conflicts with a wall placed before
+                raise ValueError(f'wall {slot} is off the board or crosses another wall')
+            board.place_wall(geo.slots[slot])
+            mask ^= low
+        if not board.DFS(WHITE) or not board.DFS(BLACK):
+            raise ValueError('a pawn has no path to its goal')
+        game.walls_remaining = [white_walls, black_walls]
+        game.turn = BLACK if turn else WHITE
+        game.turns = ply
+        return game
+
     def place(self, pos):
         """
         Place a wall at position pos on board
@@ -47,10 +167,11 @@ class Game:
         :return: True if wall is placed
         """
         x = self.turn == BLACK  # x=0/False if turn is white and 1/True if turn is black
-        if self.board.can_place((pos, self.wall_selected['dir'])):  # If the placement isn't intercepting another wall
-            self.board.place_wall((pos,self.wall_selected['dir']))  # Place the wall in pos
+        if self.board.can_place((pos, self.wall_dir)):  # If the placement isn't intercepting another wall
+            self.board.place_wall((pos,self.wall_dir))  # Place the wall in pos
             self.walls_remaining[x] -= 1
-            self.wall_selected['dir'] = 1
+            self.last_move = wall_move(x, (pos, self.wall_dir))
+            self.wall_dir = 1
             self.next_turn()
             return True  # Wall was successfully placed
         return False
@@ -59,14 +180,15 @@ class Game:
         x = self.turn == BLACK
         self.board.place_wall((pos, dir))
         self.walls_remaining[x] -= 1
+        self.last_move = wall_move(x, (pos, dir))
         self.next_turn()
 
     def flip(self):
         """
         Flip selected wall. Does nothing if no wall is selected
         """
-        if self.wall_selected['sel']:
-            self.wall_selected['dir'] = 1 - self.wall_selected['dir']
+        if self.wall_lifted:
+            self.wall_dir = 1 - self.wall_dir
 
     def select(self, pos):
         """
@@ -75,12 +197,13 @@ class Game:
         :param pos: Given x,y position of selected section
         :return: True if worked, False if not
         """
-        board_pos = (pos[0] // TILE_WIDTH, (pos[1] - MARGIN) // TILE_HEIGHT)
-        if self.wall_selected['sel']:  # If a wall is being placed by a human player
-            board_pos = (round(pos[0]/TILE_WIDTH), round((pos[1] - MARGIN) / TILE_HEIGHT))  # Closest position to mouse
+        tw, th = self.board.tile_width, self.board.tile_height
+        board_pos = (pos[0] // tw, (pos[1] - MARGIN) // th)
+        if self.wall_lifted:  # If a wall is being placed by a human player
+            board_pos = (round(pos[0]/tw), round((pos[1] - MARGIN) / th))  # Closest position to mouse
             placed = self.place(board_pos)
             if not placed:  # If failed to place a wall
-                self.wall_selected['sel'] = False
+                self.wall_lifted = False
                 print('Illegal Move')
                 return 'illegal'
             return True
@@ -92,13 +215,13 @@ class Game:
                 self.select(pos)  # Select the new tile that was clicked.
             return result
 
-        if board_pos[1] > ROWS-1 or board_pos[0] > ROWS-1:
+        if board_pos[1] > self.rows-1 or board_pos[0] > self.rows-1:
             return False  # If selected beyond range, return False
         piece = self.board.get_piece(board_pos)  # Piece at tile that was selected (if no piece, piece=0)
 
         if piece != 0 and piece.color == self.turn:
             self.selected = piece  # Next time the board is clicked, the select function will run on this piece
-            self.valid_moves = self.board.possible_moves()[(piece.pos[0], piece.pos[1])]  # Update valid moves
+            self.valid_moves = self.board.pawn_moves(piece.pos)  # Update valid moves
             return True  # The piece has been successfully selected
         return False  # No piece has been selected
 
@@ -109,11 +232,12 @@ class Game:
         :param pos: Position which the selected piece (self.selected) will be moving to
         :return: True if piece was able to move according to rules, false otherwise
         """
-        if pos[1]>ROWS-1 or pos[0]>ROWS-1:  # If pos is above or below the board
+        if pos[1]>self.rows-1 or pos[0]>self.rows-1:  # If pos is above or below the board
             return False  # Can't move the piece above the board or under, return false
 
         piece = self.board.get_piece(pos)  # Needs to be 0, if not then the piece cannot move to the given place
         if self.selected and piece == 0 and pos in self.valid_moves:
+            self.last_move = pawn_move(self.turn == BLACK, self.selected.pos, pos)
             self.board.move(self.selected, pos)  # Move the selected piece to the pos if it's a valid move
             self.next_turn()
         else:
@@ -125,11 +249,56 @@ class Game:
         Reset the selections and change the turn
         """
         self.valid_moves = set()  # There are no valid moves because no pawn has been selected
-        self.wall_selected['sel'] = False  # Unselect any walls when changing turns
+        self.wall_lifted = False  # Unselect any walls when changing turns
         self.turn=BLACK if self.turn==WHITE else WHITE
         self.turns += 1
         self.checked_for_winner = False
 
+    def apply(self, move):
+        """
+        Do a move (delta) without checking if it's legal. Used to redo and replay moves from a history.
+
+        :param move: quoridor.history.Move
+        """
+        self.selected = None
+        if move.wall is None:
+            self.board.move(self.board.pieces[move.piece], move.end)
+        else:
+            self.board.place_wall(move.wall)
+        self.walls_remaining[move.piece] += move.walls
+        self.turn = BLACK if move.piece == 0 else WHITE  # the other player moves next
+        self.turns += 1
+        self.last_move = move
+        self.valid_moves = set()
+        self.wall_lifted = False
+        self.checked_for_winner = False
+
+    def revert(self, move):
+        """
+        Undo a move (delta). move has to be the last move that was done in the game
+
+        :param move: quoridor.history.Move
+        """
+        self.selected = None
+        if move.wall is None:
+            self.board.move(self.board.pieces[move.piece], move.start)
+        else:
+            self.board.unplace_wall(move.wall)
+        self.walls_remaining[move.piece] -= move.walls
+        self.turn = BLACK if move.piece else WHITE  # the player that moved plays again
+        self.turns -= 1
+        self.last_move = None
+        self.valid_moves = set()
+        self.wall_lifted = False
+        self.checked_for_winner = False
+
+    def pixel(self, pos):
+        """
+        :param pos: Row, col of tile
+        :return: x,y position on screen of the top left corner of the tile (a click there selects the tile)
+        """
+        return pos[0] * self.board.tile_width, pos[1] * self.board.tile_height + MARGIN
+
     def draw_moves(self, win):
         """
         Draw all possible moves for selected pawn.
@@ -138,15 +307,16 @@ class Game:
         """
         for move in self.valid_moves:
             row, col = move
-            pygame.gfxdraw.aacircle(win, row*TILE_WIDTH + TILE_WIDTH // 2,
-                                    col*TILE_HEIGHT + TILE_HEIGHT // 2 + MARGIN, MOVE_RADIUS, GRAY)
+            tw, th = self.board.tile_width, self.board.tile_height
+            pygame.gfxdraw.aacircle(win, row*tw + tw // 2, col*th + th // 2 + MARGIN, tw // 7, GRAY)
 
-    def walls_left(self, win, color=None):
+    def walls_left(self, win, color=None, thinking=False):
         """
         Writes in margins how many walls are left for each player
 
         :param win: Game window
         :param color: If the game is multiplayer, color is the color of the client
+        :param thinking: True while the AI is thinking about its move
         """
         for i in range(2):
             n = FONT.render(f'{self.walls_remaining[i]} walls left.', True, BLACK)
@@ -160,7 +330,7 @@ class Game:
             w, h = n.get_size()
             win.blit(n, ((WIDTH - w) // 2, (MARGIN + BOARD_HEIGHT) * (1 - (color == 'B')) + (MARGIN - h) // 2 + 30))
         else:
-            n = SMALL_FONT.render("Your turn.", True, BLACK)
+            n = SMALL_FONT.render("Thinking..." if thinking else "Your turn.", True, BLACK)
             w, h = n.get_size()
             win.blit(n, ((WIDTH - w) // 2, (MARGIN + BOARD_HEIGHT) * (1 -(self.turn == BLACK)) +(MARGIN - h) // 2 + 30))
 
@@ -173,14 +343,14 @@ class Game:
         :return: Whether wall is lifted.
         """
         if self.selected:
-            self.select((ROWS,ROWS))  # If a piece was chosen, unselect the piece and select a wall instead.
+            self.select((self.rows,self.rows))  # If a piece was chosen, unselect the piece and select a wall instead.
         turn = self.turn == BLACK
         if self.walls_remaining[turn] == 0:
             return False  # If player 1 has no walls left, they can't lift another wall
-        self.wall_selected['sel'] = not self.wall_selected['sel']  # if wall is lifted, unlift. else, lift.
+        self.wall_lifted = not self.wall_lifted  # if wall is lifted, unlift. else, lift.
         return True  # function successfully completed
 
-    def update(self, win, pos=None, color=None):
+    def update(self, win, pos=None, color=None, thinking=False):
         """
         Every frame, the update function will run. This takes care of the graphics so that they truly remain correct
         throughout each frame
@@ -188,42 +358,82 @@ class Game:
         :param win: Window
         :param pos: Mouse position
         :param color: In the case of an online game, the color of the client.
+        :param thinking: True while the AI is thinking, shows "Thinking..." instead of "Your turn."
         """
-        self.board.draw(win)  # This will draw the tiles, walls and pawns
+        with PROFILER.phase('draw'):
+            self.board.draw(win)  # This will draw the tiles, walls and pawns
         self.draw_moves(win)  # This will draw the possible moves as long as there is a selected piece
-        self.walls_left(win, color)  # This updates in the margins that they will have the correct amount written
-        if self.wall_selected['sel']:  # If wall is being lifted, constantly make the wall follow the position of mouse
+        self.walls_left(win, color, thinking)  # This updates in the margins that they will have the correct amount written
+        if self.wall_lifted:  # If wall is being lifted, constantly make the wall follow the position of mouse
             if pos is not None:
-                pygame.draw.line(win, RED, (pos[0]-1, pos[1]-1), (pos[0]-1+WALL_HEIGHT*(1-self.wall_selected['dir']),
-                                                                  pos[1]-1+WALL_HEIGHT*(self.wall_selected['dir'])),
+                wall_height = 2 * self.board.tile_height  # Each wall is the height of 2 tiles
+                pygame.draw.line(win, RED, (pos[0]-1, pos[1]-1), (pos[0]-1+wall_height*(1-self.wall_dir),
+                                                                  pos[1]-1+wall_height*(self.wall_dir)),
                                  WALL_WIDTH+1)
-        pygame.display.update()
+        with PROFILER.phase('display'):
+            pygame.display.update()
 
     def evaluate(self):
         """
         Used for ai
 
         :return: The value of the current position (how good it is for the white player). White will want to
-        maximize this value while black will want to minimize it (minimax). Value composed of distance from
+        maximize this value while black will want to minimize it (minimax). Value composed of the FEATURES times their
+        weights (set_weights), by default the difference of the shortest paths plus a tenth of the walls left
+        """
+        STATS.count('leaves')
+        key = self.canonical_key()[0]  # a position and its mirror image have the same value
+        value = cache.EVALUATIONS.get(key)
+        if value is not None:
+            return value
+        with STATS.timer('eval'):
+            try:
+                value = sum(weight * feature(self) for weight, feature in Game.terms)
+            except TypeError:
+                value = float('inf')
+        cache.EVALUATIONS.put(key, value)
+        return value
+
+    def features(self):
+        """
+        :return: Tuple of the values of all FEATURES in this position. Raises TypeError if a pawn has no path
+        """
+        return tuple(feature(self) for feature in FEATURES.values())
+
+    @staticmethod
+    def set_weights(weights):
+        """
+        Change the weights of the features evaluate adds up (of all games) and forget the cached evaluations
+
+        :param weights: Dict of feature name (FEATURES) -> weight, missing features weigh 0
+        """
+        unknown = set(weights) - set(FEATURES)
+        if unknown:
+            raise ValueError(f'Unknown features: {", ".join(sorted(unknown))}')
+        Game.terms = tuple((weights[name], feature) for name, feature in FEATURES.items() if weights.get(name))
+        cache.EVALUATIONS.clear()
+
+    @staticmethod
+    def load_weights(path):
+        """
+        Use the weights of a file written by ai.tuning in evaluate
+
+        :param path: Path of the JSON file, its "weights" are a dict of feature name -> weight
         """
-        possible = self.board.possible_moves()
-        try:
-            return len(self.board.BFS_SP(BLACK, possible))-len(self.board.BFS_SP(WHITE,possible)) + \
-                   (self.walls_remaining[0]-self.walls_remaining[1])*0.1
-        except TypeError:
-            return float('inf')
+        with open(path) as f:
+            Game.set_weights(json.load(f)['weights'])
 
     def unlift(self):
         """
-        Stops lifting wall (sel = false)
+        Stops lifting wall
         """
-        self.wall_selected['sel'] = False
+        self.wall_lifted = False
 
     def make_horizontal(self):
         """
         Makes wall horizontal (dir = 0)
         """
-        self.wall_selected['dir'] = 0
+        self.wall_dir = 0
 
     def __repr__(self):
         return f"Game with board {self.board}. {'White' if self.turn==WHITE else 'Black'} turn."
@@ -254,7 +464,7 @@ class Game:
                     if self.wall_relevant((i,j), 0, self.turn):
                         walls.append(((i,j),0))
                     self.flip()
-            self.wall_selected['sel'] = False
+            self.wall_lifted = False
         return walls
             def wall_relevant(self, pos, dir, turn):
         x,y = pos
@@ -0,0 +1,117 @@
+LEFT, UP, RIGHT, DOWN = range(4)  # Directions, in the same order as the 'walls' list of every tile
+STEPS = ((-1, 0), (0, -1), (1, 0), (0, 1))  # (dx, dy) of a step in every direction
+SIDES = ((UP, DOWN), (LEFT, RIGHT), (UP, DOWN), (LEFT, RIGHT))  # The two directions perpendicular to each direction
+MOVE_ORDER = (UP, LEFT, RIGHT, DOWN)  # Order in which the directions of pawn moves are generated
+
+
+class Geometry:
+    """
+    Tables of a rows*rows board that never change during a game. Built once per board size (see geometry()).
+
+    Wall slots are numbered with all horizontal placements first, then all vertical ones, so bit i of a mask is slot i.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.cells = tuple((x, y) for x in range(rows) for y in range(rows))  # cell index -> (x, y)
+        self.cell_index = {pos: i for i, pos in enumerate(self.cells)}  # (x, y) -> cell index
+        self.neighbours = {pos: tuple(self._step(pos, d) for d in range(4)) for pos in self.cells}
+        # (x, y) -> neighbour in every direction, None if the step leaves the board
+
+        self.walls_horizontal = tuple((i, j) for i in range(rows - 1) for j in range(1, rows))  # all horizontal pos
+        self.walls_vertical = tuple((i, j) for i in range(1, rows) for j in range(rows - 1))  # all vertical pos
+        self.slots = tuple((pos, 0) for pos in self.walls_horizontal) + tuple((pos, 1) for pos in self.walls_vertical)
+        self.slot_index = {wall: i for i, wall in enumerate(self.slots)}  # (pos, dir) -> slot index
+        self.all_slots = (1 << len(self.slots)) - 1  # mask of every slot
+
+        self.blocked = tuple(self._blocked(wall) for wall in self.slots)
+        # slot -> the 4 (x, y, direction) flags the wall sets, two on each side of the wall
+        self.blockers = {(x, y, d): 0 for x, y in self.cells for d in range(4)}
+        # (x, y, direction) -> mask of the slots whose wall blocks that side of the tile
+        for slot, sides in enumerate(self.blocked):
+            for side in sides:
+                self.blockers[side] |= 1 << slot
+        self.conflicts = tuple(self._conflicts(wall) for wall in self.slots)
+        # slot -> mask of slots that can't be placed together with it (itself, overlapping and crossing walls)
+
+        self.mirror_cells = tuple(self.cell_index[self.mirror_pos(pos)] for pos in self.cells)
+        # cell index -> index of the cell mirrored left to right
+        self.mirror_slots = tuple(self.slot_index[self.mirror_wall(wall)] for wall in self.slots)
+        # slot -> slot of the wall mirrored left to right
+
+    def _step(self, pos, d):
+        x, y = pos[0] + STEPS[d][0], pos[1] + STEPS[d][1]
+        if 0 <= x < self.rows and 0 <= y < self.rows:
+            return x, y
+        return None
+
+    @staticmethod
+    def _blocked(wall):
+        (x, y), d = wall
+        if d == 1:  # vertical wall: left side of (x,y), (x,y+1) and right side of (x-1,y), (x-1,y+1)
+            return (x, y, LEFT), (x - 1, y, RIGHT), (x, y + 1, LEFT), (x - 1, y + 1, RIGHT)
+        # horizontal wall: top side of (x,y), (x+1,y) and bottom side of (x,y-1), (x+1,y-1)
+        return (x, y, UP), (x, y - 1, DOWN), (x + 1, y, UP), (x + 1, y - 1, DOWN)
+
+    def _conflicts(self, wall):
+        (x, y), d = wall
+        if d == 1:  # same column one tile up or down, or the horizontal wall crossing it in the middle
+            others = (((x, y - 1), 1), wall, ((x, y + 1), 1), ((x - 1, y + 1), 0))
+        else:  # same row one tile left or right, or the vertical wall crossing it in the middle
+            others = (((x - 1, y), 0), wall, ((x + 1, y), 0), ((x + 1, y - 1), 1))
+        mask = 0
+        for other in others:
+            if other in self.slot_index:
+                mask |= 1 << self.slot_index[other]
+        return mask
+
+    def mirror_pos(self, pos):
+        """:return: Tile pos mirrored left to right"""
+        return self.rows - 1 - pos[0], pos[1]
+
+    def mirror_wall(self, wall):
+        """:return: Wall (pos, dir) mirrored left to right"""
+        (x, y), d = wall
+        if d == 1:  # between columns x - 1 and x
+            return (self.rows - x, y), 1
+        return (self.rows - 2 - x, y), 0  # over columns x and x + 1
+
+    def mirror_mask(self, mask):
+        """
+        :param mask: Mask of slots
+        :return: Mask of the mirrored slots. The slots are numbered column by column, so mirroring reverses the order
+        of the columns of both the horizontal and the vertical slots
+        """
+        width = self.rows - 1  # slots per column
+        column = (1 << width) - 1
+        half = width * width  # amount of horizontal slots
+        mirrored = 0
+        for i in range(width):
+            j = width - 1 - i
+            mirrored |= (mask >> i * width & column) << j * width
+            mirrored |= (mask >> half + i * width & column) << half + j * width
+        return mirrored
+
+    def free_slots(self, placed):
+        """
+        :param placed: Mask of the slots that have walls
+        :return: Mask of the slots that don't conflict with any placed wall
+        """
+        free = self.all_slots
+        while placed:
+            low = placed & -placed  # lowest placed slot
+            free &= ~self.conflicts[low.bit_length() - 1]
+            placed ^= low
+        return free
+
+
+_GEOMETRIES = {}  # rows -> Geometry
+
+
+def geometry(rows):
+    """
+    :param rows: Size of the board
+    :return: The (shared) Geometry of a rows*rows board
+    """
+    if rows not in _GEOMETRIES:
+        _GEOMETRIES[rows] = Geometry(rows)
+    return _GEOMETRIES[rows]
@@ -0,0 +1,200 @@
+from collections import namedtuple
+from .constants import BLACK
+from .geometry import geometry
+
+# Delta of one turn.
+# piece: Index of the player that moved (0 - white, 1 - black)
+# start, end: Position of the pawn before and after the move (None if a wall was placed)
+# wall: Tuple (pos, dir) of the placed wall (None if the pawn moved)
+# walls: Change in the amount of walls remaining for the player (-1 if a wall was placed, 0 otherwise)
+Move = namedtuple('Move', ['piece', 'start', 'end', 'wall', 'walls'])
+
+
+def pawn_move(piece, start, end):
+    """:return: Move of the pawn of player piece from start to end"""
+    return Move(int(piece), start, end, None, 0)
+
+
+def wall_move(piece, wall):
+    """:return: Move of player piece placing wall (pos, dir)"""
+    return Move(int(piece), None, None, wall, -1)
+
+
+NO_MOVE = 0xFFFF  # code of no move
+WALL_CODES = 0x4000  # code of wall slot i is WALL_CODES + i, codes of pawn moves are the index of the target cell
+
+
+def move_code(move, rows):
+    """
+    :param move: Move (or None)
+    :param rows: Size of the board
+    :return: The move as a 16 bit number
+    """
+    if move is None:
+        return NO_MOVE
+    if move.wall is None:
+        return geometry(rows).cell_index[move.end]
+    return WALL_CODES + geometry(rows).slot_index[move.wall]
+
+
+def mirror_code(code, rows):
+    """
+    :param code: Number from move_code()
+    :param rows: Size of the board
+    :return: Code of the same move mirrored left to right (see Board.canonical_key)
+    """
+    if code == NO_MOVE:
+        return NO_MOVE
+    geo = geometry(rows)
+    if code >= WALL_CODES:
+        return WALL_CODES + geo.mirror_slots[code - WALL_CODES]
+    return geo.mirror_cells[code]
+
+
+def code_move(code, game):
+    """
+    :param code: Number from move_code()
+    :param game: Game in which the move is played (by the player whose turn it is)
+    :return: The Move (None if code is NO_MOVE)
+    """
+    if code == NO_MOVE:
+        return None
+    x = game.turn == BLACK
+    geo = geometry(game.rows)
+    if code >= WALL_CODES:
+        return wall_move(x, geo.slots[code - WALL_CODES])
+    return pawn_move(x, game.board.pieces[x].pos, geo.cells[code])
+
+
+def move_text(move):
+    """
+    :param move: Move
+    :return: Move in text: the column as a letter and the row as a number from 1 of the pawn's new tile (e8), or of the
+    wall's pos followed by h or v (d3h)
+    """
+    if move.wall is None:
+        x, y = move.end
+        return f'{chr(ord("a") + x)}{y + 1}'
+    (x, y), d = move.wall
+    return f'{chr(ord("a") + x)}{y + 1}{"hv"[d]}'
+
+
+def parse_move(text, game):
+    """
+    :param text: Move in the format of move_text()
+    :param game: Game in which the move is played (by the player whose turn it is)
+    :return: The Move. Raises ValueError if text isn't a move (doesn't check if the move is legal)
+    """
+    text = text.strip().lower()
+    d = None
+    if text[-1:] in ('h', 'v'):
+        d = 'hv'.index(text[-1])
+        text = text[:-1]
+    if len(text) < 2 or not 'a' <= text[0] <= 'z' or not text[1:].isdigit():
+        raise ValueError(f'Not a move: {text}')
+    pos = (ord(text[0]) - ord('a'), int(text[1:]) - 1)
+    x = game.turn == BLACK
+    if d is None:
+        return pawn_move(x, game.board.pieces[x].pos, pos)
+    return wall_move(x, (pos, d))
+
+
+class History:
+    """
+    Moves of a game, stored as deltas. Undo and redo apply the deltas backwards and forwards on the game itself, and
+    every SNAPSHOT_EVERY plies a copy of the game is saved so any ply can be reached without replaying the whole game.
+    """
+
+    SNAPSHOT_EVERY = 16
+
+    def __init__(self, game):
+        """
+        :param game: Game at ply 0
+        """
+        self.moves = []  # list of all deltas. The moves after self.ply have been undone and can be redone
+        self.ply = 0  # amount of moves that are currently applied
+        self.snapshots = {0: self.snapshot(game)}  # ply -> copy of the game at that ply
+
+    def __len__(self):
+        return self.ply
+
+    @staticmethod
+    def snapshot(game):
+        """:return: Copy of game (including the amount of turns)"""
+        copy = game.clone()
+        copy.turns = game.turns
+        return copy
+
+    def push(self, move, game=None):
+        """
+        Record a move that was just done. Any moves that were undone are lost.
+
+        :param move: Move (delta) that was done
+        :param game: The game after the move, used to save a snapshot when needed
+        """
+        if self.ply < len(self.moves):  # a new move after an undo removes the redo moves and their snapshots
+            del self.moves[self.ply:]
+            self.snapshots = {ply: snap for ply, snap in self.snapshots.items() if ply <= self.ply}
+        self.moves.append(move)
+        self.ply += 1
+        if game is not None and self.ply % History.SNAPSHOT_EVERY == 0:
+            self.snapshots[self.ply] = self.snapshot(game)
+
+    def undo(self, game):
+        """
+        Undo the last move on game
+
+        :return: The move that was undone (None if there are no moves)
+        """
+        if self.ply == 0:
+            return None
+        self.ply -= 1
+        move = self.moves[self.ply]
+        game.revert(move)
+        return move
+
+    def redo(self, game):
+        """
+        Redo the last move that was undone on game
+
+        :return: The move that was redone (None if there is nothing to redo)
+        """
+        if self.ply == len(self.moves):
+            return None
+        move = self.moves[self.ply]
+        game.apply(move)
+        self.ply += 1
+        return move
+
+    def game_at(self, ply):
+        """
+        :param ply: Amount of moves from the start of the game
+        :return: New game at ply, made from the closest snapshot before it
+        """
+        if not 0 <= ply <= len(self.moves):
+            raise IndexError(ply)
+        start = max(p for p in self.snapshots if p <= ply)
+        game = self.snapshot(self.snapshots[start])
+        for move in self.moves[start:ply]:
+            game.apply(move)
+        return game
+
+    def jump(self, ply):
+        """
+        Move the current ply to ply (the moves after it can still be redone)
+
+        :return: The game at ply
+        """
+        game = self.game_at(ply)
+        self.ply = ply
+        return game
+
+    def replay(self):
+        """
+        Generator of the game after every ply, starting from ply 0 (each game is a new object)
+        """
+        game = self.snapshot(self.snapshots[0])
+        yield self.snapshot(game)
+        for move in self.moves[:self.ply]:
+            game.apply(move)
+            yield self.snapshot(game)
@@ -0,0 +1,127 @@
+import json
+import time
+from collections import defaultdict
+
+
+class _NullTimer:
+    """
+    Timer that does nothing. Returned by Instrumentation.timer when instrumentation is disabled so the hot paths only
+    pay for one method call.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Timer:
+    def __init__(self, timers, name):
+        self.timers = timers  # dict of phase -> seconds of the Instrumentation object
+        self.name = name  # name of the phase being timed
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timers[self.name] += time.perf_counter() - self.start
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Instrumentation:
+    """
+    Counters and phase timers for the engine. Disabled by default, in which case count() and timer() return
+    immediately. When enabled, the counters of every move are exported with end_move() as one JSON line (if a sink was
+    given) and added to the totals used by summary().
+
+    Timers are inclusive: a phase that calls another timed phase (eval -> movegen) contains its time as well.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.sink = None  # file object that receives one JSON line per move (None - don't export lines)
+        self.counters = defaultdict(int)  # counters of the current move
+        self.timers = defaultdict(float)  # seconds per phase of the current move
+        self.totals = defaultdict(int)  # counters of all moves
+        self.total_timers = defaultdict(float)  # seconds per phase of all moves
+        self.moves = 0  # amount of moves exported
+
+    def enable(self, sink=None):
+        """
+        Start collecting
+
+        :param sink: Path or file object to write the JSON lines to. None if only the summary is needed
+        """
+        if isinstance(sink, str):
+            sink = open(sink, 'a')
+        self.sink = sink
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stop collecting and close the sink
+        """
+        self.enabled = False
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+
+    def count(self, name, n=1):
+        """
+        Add n to counter name (nodes, leaves, can_place, bfs, dfs, clones, cache_hits...)
+        """
+        if self.enabled:
+            self.counters[name] += n
+
+    def timer(self, name):
+        """
+        :param name: Name of the phase (search, movegen, legality, eval...)
+        :return: Context manager that adds the time spent inside of it to the phase
+        """
+        if self.enabled:
+            return _Timer(self.timers, name)
+        return _NULL_TIMER
+
+    def end_move(self, label, **info):
+        """
+        Close the current move: export its counters and timers and start counting from 0.
+
+        :param label: What made the move (name of the ai function)
+        :param info: Extra fields for the JSON line
+        :return: The record of the move (None if disabled)
+        """
+        if not self.enabled:
+            return None
+        self.moves += 1
+        record = {'move': self.moves, 'label': label, **info, 'counters': dict(self.counters),
+                  'timers': {name: round(sec, 6) for name, sec in self.timers.items()}}
+        for name, n in self.counters.items():
+            self.totals[name] += n
+        for name, sec in self.timers.items():
+            self.total_timers[name] += sec
+        if self.sink is not None:
+            self.sink.write(json.dumps(record) + '\n')
+            self.sink.flush()
+        self.counters.clear()
+        self.timers.clear()
+        return record
+
+    def summary(self):
+        """
+        :return: Table of the totals and per-move averages of every counter and timer
+        """
+        moves = max(self.moves, 1)
+        lines = [f'{"name":<16}{"total":>14}{"per move":>14}']
+        for name in sorted(self.totals):
+            lines.append(f'{name:<16}{self.totals[name]:>14}{self.totals[name] / moves:>14.1f}')
+        for name in sorted(self.total_timers):
+            sec = self.total_timers[name]
+            lines.append(f'{name + " (s)":<16}{sec:>14.3f}{sec / moves:>14.4f}')
+        return '\n'.join(lines)
+
+
+STATS = Instrumentation()  # Instrumentation used by the whole engine
@@ -4,38 +4,40 @@ from .constants import *
 
 
 class Pawn:
-    def __init__(self, color, pos):
+    __slots__ = ('color', 'pos', 'tile')  # No __dict__, search creates many pawns
+
+    def __init__(self, color, pos, tile=(TILE_WIDTH, TILE_HEIGHT)):
         self.color = color  # Color: (R,G,B)
         self.pos = pos  # Pos: (row, column)
-        self.x = self.y = 0  # Real location of piece
-        self.calc_pos()  # Initiating self.x and self.y
+        self.tile = tile  # (width, height) of a tile on screen
 
     def __repr__(self):
         return f"{'Black' if self.color==BLACK else 'White'} pawn at {self.pos}"
 
     def clone(self):
-        a = Pawn(self.color, self.pos)
+        a = Pawn(self.color, self.pos, self.tile)
         return a
 
-    def calc_pos(self):
-        """x,y will be equal to real x,y position on screen"""
-        self.x = self.pos[0]*TILE_WIDTH + TILE_WIDTH // 2
-        self.y = self.pos[1]*TILE_HEIGHT + TILE_HEIGHT//2 + MARGIN
+    def center(self):
+        """:return: Real x,y position of the piece on screen (only needed when drawing)"""
+        return self.pos[0]*self.tile[0] + self.tile[0] // 2, self.pos[1]*self.tile[1] + self.tile[1]//2 + MARGIN
 
     def move(self, new_pos):
         """Move piece from self.pos to new_pos"""
         self.pos = new_pos
-        self.calc_pos()
 
     def draw(self, win):
         """Draw piece on win"""
-        pygame.gfxdraw.filled_circle(win, self.x, self.y, PAWN_RADIUS, self.color)
+        x, y = self.center()
+        pygame.gfxdraw.filled_circle(win, x, y, self.tile[0]//3, self.color)
 
     def __str__(self):
         return f"Pawn at ({self.pos[0]}, {self.pos[1]})"
 
 
 class Wall:
+    __slots__ = ('color', 'pos', 'dir', 'placed', 'lifted')
+
     def __init__(self, dir, color):
         """Creates wall
 
@@ -45,7 +47,6 @@ class Wall:
         self.color = color
         self.pos = ((0,0),(0,2))
         self.dir = dir
-        self.x1 = self.x2 = self.y1 = self.y2 = 0
         self.placed = False  # Will be true when the wall is placed on the board and can no longer be moved.
         self.lifted = False  # Will be true when the wall is selected (when the player presses space)
         self.find_pos((0, 0))  # Will find the pos of the second point of the wall.
@@ -55,7 +56,6 @@ class Wall:
         a.placed = self.placed
         a.lifted = self.lifted
         a.pos = self.pos
-        a.calc_pos()
         return a
 
     def find_pos(self, first_pos):
@@ -73,19 +73,13 @@ class Wall:
                 self.pos = (first_pos, (first_pos[0]+WALL_HEIGHT, first_pos[1]))
             else:  # self.pos will be [(top x, top y), (bottom x, bottom y)] (top x == bottom x)
                 self.pos = (first_pos, (first_pos[0], first_pos[1]+WALL_HEIGHT))
-        self.calc_pos()
-
-    def calc_pos(self):
-        if self.placed:  # if wall is placed x1,x2,y1,y2 will be the real x,y values of pos
-            self.x1 = self.pos[0][0] * TILE_WIDTH
-            self.x2 = self.pos[1][0] * TILE_WIDTH
-            self.y1 = self.pos[0][1] * TILE_HEIGHT + MARGIN
-            self.y2 = self.pos[1][1] * TILE_HEIGHT + MARGIN
-        else:  # if wall isn't placed, x1,x2,y1,y2 will be equal to pos
-            self.x1 = self.pos[0][0]
-            self.x2 = self.pos[1][0]
-            self.y1 = self.pos[0][1]
-            self.y2 = self.pos[1][1]
+
+    def ends(self):
+        """:return: x1, y1, x2, y2 - real x,y positions of the two ends of the wall on screen (only needed when drawing)"""
+        if self.placed:  # pos is in tiles
+            return (self.pos[0][0] * TILE_WIDTH, self.pos[0][1] * TILE_HEIGHT + MARGIN,
+                    self.pos[1][0] * TILE_WIDTH, self.pos[1][1] * TILE_HEIGHT + MARGIN)
+        return self.pos[0][0], self.pos[0][1], self.pos[1][0], self.pos[1][1]  # pos is already x,y on screen
 
     def flip(self):
         """Flip wall (change direction)"""
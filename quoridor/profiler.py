@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from .instrumentation import _NULL_TIMER
+
+FRAME_BUCKETS = (4, 8, 16.7, 33.3, 50, 100, 250)  # upper bounds (ms) of the bars of the frame time histogram
+
+
+class _Span:
+    def __init__(self, profiler, name, frame):
+        self.profiler = profiler
+        self.name = name
+        self.frame = frame  # True if the time is a phase of the current frame (main thread)
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start, self.frame)
+        return False
+
+
+def percentile(values, fraction):
+    """:return: The value below which fraction of the sorted list values are (0 if it's empty)"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class FrameProfiler:
+    """
+    Frame times of the window, split into phases (events, logic, ai, network, render and its parts draw and display),
+    and the latency from a click to the frame that shows the move it made. Disabled by default, in which case phase()
+    and span() return a timer that does nothing.
+
+    Every phase and span is also kept as a trace event, written at the end in the Chrome trace format (chrome://tracing
+    or ui.perfetto.dev), so single slow frames can be looked at next to the AI searching in its thread. Phases are
+    inclusive like the timers of Instrumentation: render contains draw and display.
+    """
+    def __init__(self, max_events=200000, max_frames=100000):
+        """
+        :param max_events: Most trace events kept (the oldest are dropped)
+        :param max_frames: Most frames kept for the statistics
+        """
+        self.enabled = False
+        self.origin = time.perf_counter()  # time 0 of the trace
+        self.events = deque(maxlen=max_events)  # (name, thread id, start, seconds, category)
+        self.frames = deque(maxlen=max_frames)  # (seconds, {phase: seconds}) of every finished frame
+        self.frame_start = None  # start of the current frame (None - no frame started)
+        self.phases = defaultdict(float)  # seconds per phase of the current frame
+        self.spans = defaultdict(list)  # name -> seconds of the spans of other threads (search, ponder)
+        self.latencies = deque(maxlen=max_frames)  # seconds from a click to the frame that showed its move
+        self.click = None  # time of the last click that didn't show a move yet
+        self.moved_at = None  # time of the click whose move will be shown by the next frame
+        self.threads = {}  # thread id -> name
+        self.lock = threading.Lock()  # the AI threads add spans
+
+    def enable(self):
+        self.enabled = True
+        self.origin = time.perf_counter()
+
+    def frame(self):
+        """
+        Start a frame (called at the top of every iteration of the game loop). The previous frame ends here
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            seconds = now - self.frame_start
+            self.frames.append((seconds, dict(self.phases)))
+            self._event('frame', threading.get_ident(), self.frame_start, seconds, 'frame')
+        self.frame_start = now
+        self.phases.clear()
+
+    def phase(self, name):
+        """
+        :param name: Phase of the current frame (events, logic, ai, network, render, draw, display)
+        :return: Context manager that adds the time spent inside of it to the phase
+        """
+        if self.enabled:
+            return _Span(self, name, True)
+        return _NULL_TIMER
+
+    def span(self, name):
+        """
+        :param name: Work done outside of the frames, in another thread (search, ponder)
+        :return: Context manager that records it as a trace event
+        """
+        if self.enabled:
+            return _Span(self, name, False)
+        return _NULL_TIMER
+
+    def record(self, name, start, seconds, frame):
+        thread = threading.get_ident()
+        with self.lock:
+            if frame:
+                self.phases[name] += seconds
+            else:
+                self.spans[name].append(seconds)
+            self._event(name, thread, start, seconds, 'phase' if frame else 'span')
+
+    def _event(self, name, thread, start, seconds, category):
+        if thread not in self.threads:
+            self.threads[thread] = threading.current_thread().name
+        self.events.append((name, thread, start, seconds, category))
+
+    def clicked(self):
+        """
+        The player clicked (the click may make a move)
+        """
+        if self.enabled:
+            self.click = time.perf_counter()
+
+    def moved(self):
+        """
+        The last click made a move, the next presented() frame shows it
+        """
+        if self.enabled and self.click is not None:
+            self.moved_at, self.click = self.click, None
+
+    def presented(self):
+        """
+        A frame was put on the screen (after pygame.display.update)
+        """
+        if not self.enabled or self.moved_at is None:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            self.latencies.append(now - self.moved_at)
+            self.threads[0] = 'input latency'  # a row of its own in the trace
+            self._event('click to move', 0, self.moved_at, now - self.moved_at, 'latency')
+        self.moved_at = None
+
+    @staticmethod
+    def _stats(values):
+        """:return: ' mean .. p50 .. p95 .. p99 .. max ..' of a list of seconds, in ms"""
+        values = sorted(values)
+        mean = sum(values) / len(values) if values else 0.0
+        return (f'{mean * 1e3:>9.2f}{percentile(values, 0.5) * 1e3:>9.2f}{percentile(values, 0.95) * 1e3:>9.2f}'
+                f'{percentile(values, 0.99) * 1e3:>9.2f}{(values[-1] if values else 0) * 1e3:>9.2f}')
+
+    def summary(self):
+        """
+        :return: Table of the frame and phase times, histogram of the frame times and the click to move latencies
+        """
+        frames = [seconds for seconds, _ in self.frames]
+        total = sum(frames)
+        lines = [f'{len(frames)} frames in {total:.1f} s ({len(frames) / total if total else 0:.1f} fps)',
+                 f'{"ms":<16}{"mean":>9}{"p50":>9}{"p95":>9}{"p99":>9}{"max":>9}{"share":>8}',
+                 f'{"frame":<16}{self._stats(frames)}{1:>8.0%}']
+        names = sorted({name for _, phases in self.frames for name in phases})
+        for name in names:
+            times = [phases.get(name, 0.0) for _, phases in self.frames]
+            lines.append(f'{name:<16}{self._stats(times)}{sum(times) / total if total else 0:>8.0%}')
+        for name, times in sorted(self.spans.items()):
+            lines.append(f'{name + " (thread)":<16}{self._stats(times)}{"":>8}')
+        if self.latencies:
+            lines.append(f'{"click to move":<16}{self._stats(self.latencies)}{"":>8}')
+        lines.append('frame time histogram')
+        counts = [0] * (len(FRAME_BUCKETS) + 1)
+        for seconds in frames:
+            counts[sum(seconds * 1e3 >= bound for bound in FRAME_BUCKETS)] += 1
+        width = max(counts) if frames else 1
+        for i, n in enumerate(counts):
+            label = f'< {FRAME_BUCKETS[i]} ms' if i < len(FRAME_BUCKETS) else f'>= {FRAME_BUCKETS[-1]} ms'
+            lines.append(f'{label:>12} {n:>8} {"#" * round(40 * n / width)}')
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        """
+        Write the trace events as Chrome trace JSON (complete events, times in microseconds)
+
+        :param path: Path of the file
+        """
+        pid = os.getpid()
+        with self.lock:
+            events = [{'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': thread,
+                       'ts': round((start - self.origin) * 1e6, 1), 'dur': round(seconds * 1e6, 1)}
+                      for name, thread, start, seconds, category in self.events]
+            events += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread, 'args': {'name': name}}
+                       for thread, name in self.threads.items()]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+PROFILER = FrameProfiler()  # FrameProfiler of the window (main.py --profile)
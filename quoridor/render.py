@@ -0,0 +1,180 @@
+"""
+Headless rendering of recorded games to images.
+
+Reads one game per line from a file or stdin, like ai.batch: the moves from the start of the game separated by spaces
+(quoridor.history.move_text). Every position of every game is drawn off-screen the way the window draws it
+(Board.draw and the walls left in the margins) and saved as a PNG per position, out/<game>/<ply>.png, or with --sheet
+as one contact sheet per game, out/<game>.png, of small pictures of all of its positions. Games are rendered by a pool
+of worker processes, and the frames per second per core are printed at the end.
+
+Usage: python -m quoridor.render [input] [--out frames] [--sheet] [--columns 8] [--scale 0.25] [--workers 4]
+"""
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # nothing is shown, the frames are drawn on Surfaces in memory
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+import argparse
+import sys
+import time
+from multiprocessing import Pool
+import pygame
+from .constants import *
+from .game import Game
+from ai.batch import play
+
+_config = {}  # settings of the worker process (set by init_worker)
+
+
+class Renderer:
+    """
+    Draws positions on a Surface that is never shown. The static part of the board is drawn once (Board.background)
+    and the rendered texts are cached, so a frame costs the walls, the pawns and two blits of text.
+    """
+    def __init__(self, scale=1.0):
+        """
+        :param scale: Size of the images relative to the window
+        """
+        self.surface = pygame.Surface((WIDTH, HEIGHT))
+        self.size = (round(WIDTH * scale), round(HEIGHT * scale))  # size of the images
+        self.texts = {}  # (text, small font) -> rendered Surface
+
+    def text(self, text, small=False):
+        """:return: Surface of text rendered in FONT (SMALL_FONT if small)"""
+        surface = self.texts.get((text, small))
+        if surface is None:
+            surface = (SMALL_FONT if small else FONT).render(text, True, BLACK)
+            self.texts[(text, small)] = surface
+        return surface
+
+    def render(self, game, caption=None):
+        """
+        Draw the position like Game.update does (without the possible moves and the lifted wall)
+
+        :param game: Game to draw
+        :param caption: Text written in the top left corner (None - no text)
+        :return: Surface of the frame in the size of the images (only valid until the next render)
+        """
+        game.board.draw(self.surface)
+        for i in range(2):  # walls left in the center of the margin of each player, like Game.walls_left
+            n = self.text(f'{game.walls_remaining[i]} walls left.')
+            w, h = n.get_size()
+            self.surface.blit(n, ((WIDTH - w) // 2, (MARGIN + BOARD_HEIGHT) * (1 - i) + (MARGIN - h) // 2))
+        n = self.text('To move.', True)
+        w, h = n.get_size()
+        y = (MARGIN + BOARD_HEIGHT) * (1 - (game.turn == BLACK)) + (MARGIN - h) // 2 + 30  # under the walls left
+        self.surface.blit(n, ((WIDTH - w) // 2, y))
+        if caption:
+            self.surface.blit(self.text(caption, True), (5, 5))
+        if self.size == self.surface.get_size():
+            return self.surface
+        return pygame.transform.smoothscale(self.surface, self.size)
+
+
+def positions(line, rows=ROWS, walls=WALLS):
+    """
+    :param line: Moves from the start of the game separated by spaces
+    :return: Generator of (ply, text of the move that was played or None at the start, game after it). Raises
+    ValueError if a move is illegal
+    """
+    game = Game(rows=rows, walls=walls)
+    yield 0, None, game
+    for ply, text in enumerate(line.split(), 1):
+        play(game, text)
+        yield ply, text, game
+
+
+def init_worker(config):
+    _config.update(config)
+
+
+def render_game(index, line):
+    """
+    Render all positions of one game (runs in a worker process)
+
+    :return: Tuple (index, frames, seconds spent drawing, seconds spent saving, error or None)
+    """
+    renderer = _config.get('renderer')
+    if renderer is None:
+        renderer = _config['renderer'] = Renderer(_config['scale'] if _config['sheet'] else 1.0)
+    drawing = saving = 0.0
+    frames = []
+    error = None
+    try:
+        for ply, text, game in positions(line, _config['rows'], _config['walls']):
+            start = time.perf_counter()
+            frame = renderer.render(game, f'{ply}. {text}' if text else 'start')
+            frames.append(frame.copy() if _config['sheet'] else None)  # the sheet is put together at the end
+            drawing += time.perf_counter() - start
+            if not _config['sheet']:
+                start = time.perf_counter()
+                folder = os.path.join(_config['out'], f'{index:05d}')
+                os.makedirs(folder, exist_ok=True)
+                pygame.image.save(frame, os.path.join(folder, f'{ply:03d}.png'))
+                saving += time.perf_counter() - start
+    except (ValueError, IndexError, KeyError) as e:
+        error = str(e)  # the sheet still shows the positions up to the illegal move
+    if _config['sheet'] and frames:
+        start = time.perf_counter()
+        w, h = frames[0].get_size()
+        columns = min(_config['columns'], len(frames))
+        sheet = pygame.Surface((columns * w, (len(frames) + columns - 1) // columns * h))
+        sheet.fill(TAN)
+        for i, frame in enumerate(frames):
+            sheet.blit(frame, (i % columns * w, i // columns * h))
+        drawing += time.perf_counter() - start
+        start = time.perf_counter()
+        os.makedirs(_config['out'], exist_ok=True)
+        pygame.image.save(sheet, os.path.join(_config['out'], f'{index:05d}.png'))
+        saving += time.perf_counter() - start
+    return index, len(frames), drawing, saving, error
+
+
+def run(lines, workers, config):
+    """
+    Render every game of lines and print the throughput
+
+    :param lines: Iterable of input lines (read lazily)
+    :param workers: Amount of worker processes
+    :param config: Dict of rows, walls, out (folder), sheet, columns and scale
+    """
+    start = time.perf_counter()
+    games = frames = 0
+    drawing = saving = 0.0
+    with Pool(workers, initializer=init_worker, initargs=(config,)) as pool:
+        for index, n, draw, save, error in pool.imap(_render_game, enumerate(lines), chunksize=4):
+            if error:
+                print(f'game {index}: {error}', file=sys.stderr)
+            games += 1
+            frames += n
+            drawing += draw
+            saving += save
+    seconds = time.perf_counter() - start
+    busy = drawing + saving  # seconds of work of all workers together
+    print(f'{games} games, {frames} frames in {seconds:.2f} s: {frames / seconds if seconds else 0:.0f} frames/s, '
+          f'{frames / busy if busy else 0:.0f} frames/s per core ({drawing:.2f} s drawing, {saving:.2f} s saving '
+          f'the images, {workers} workers)')
+
+
+def _render_game(args):
+    return render_game(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('input', nargs='?', help='file of move lists (default: stdin)')
+    parser.add_argument('--out', default='frames', help='folder the images are written to')
+    parser.add_argument('--sheet', action='store_true', help='one contact sheet per game instead of a PNG per position')
+    parser.add_argument('--columns', type=int, default=8, help='positions per row of a contact sheet')
+    parser.add_argument('--scale', type=float, default=0.25, help='size of the positions on a contact sheet')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--rows', type=int, default=ROWS, help='size of the board')
+    parser.add_argument('--walls', type=int, default=WALLS, help='walls per player')
+    args = parser.parse_args()
+    config = {'rows': args.rows, 'walls': args.walls, 'out': args.out, 'sheet': args.sheet, 'columns': args.columns,
+              'scale': args.scale}
+    lines = open(args.input) if args.input else sys.stdin
+    with lines:
+        run((line.rstrip('\n') for line in lines), args.workers, config)
+
+
+if __name__ == '__main__':
+    main()